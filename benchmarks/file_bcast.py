@@ -0,0 +1,91 @@
+"""Benchmark broadcasting a file through memory maps.
+
+Run with: mpiexec -n 4 python benchmarks/file_bcast.py [NBYTES] [DIR]
+
+Rank 0 writes a file of NBYTES (default 1 GiB) random bytes in DIR
+(default the temporary directory) and broadcasts it to a file on every
+other process, first with bcast_file and then by reading the whole file
+into memory, broadcasting it and writing it out. The table shows the
+time and the peak resident memory (the maximum over processes) after
+each method. Peak resident memory never decreases, so the methods are
+run in order of increasing expected memory use.
+"""
+
+import os
+import sys
+import shutil
+import resource
+import tempfile
+from array import array
+
+import yapympi.base as mpi
+from yapympi.cmpi import lib
+from yapympi.mmapfile import bcast_file
+from yapympi.timing import Timer
+
+
+def peak_rss(comm=lib.MPI_COMM_WORLD):
+    """Return the maximum over processes of the peak resident memory in MiB."""
+    rss = array("d", [resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024])
+    out = array("d", [0.0])
+    mpi.allreduce(rss, out, lib.MPI_MAX, comm)
+    return out[0]
+
+
+def read_and_bcast(path, out_path, root=0):
+    """Broadcast a file by reading it into memory."""
+    size = array("q", [0])
+    if mpi.comm_rank() == root:
+        with open(path, "rb") as f:
+            data = f.read()
+        size[0] = len(data)
+        mpi.bcast(size, root)
+        mpi.bcast(data, root)
+    else:
+        mpi.bcast(size, root)
+        data = bytearray(size[0])
+        mpi.bcast(data, root)
+        with open(out_path, "wb") as f:
+            f.write(data)
+
+
+def main():
+    mpi.init()
+    rank = mpi.comm_rank()
+    nbytes = int(sys.argv[1]) if len(sys.argv) > 1 else 1 << 30
+    parent = sys.argv[2] if len(sys.argv) > 2 else None
+
+    name = bytearray(4096)
+    if rank == 0:
+        name[:] = tempfile.mkdtemp(dir=parent).encode().ljust(len(name), b"\0")
+    mpi.bcast(name, 0)
+    tmpdir = name.rstrip(b"\0").decode()
+    path = os.path.join(tmpdir, "input")
+    out_path = os.path.join(tmpdir, "output-%d" % rank)
+
+    if rank == 0:
+        chunk = 1 << 24
+        with open(path, "wb") as f:
+            for start in range(0, nbytes, chunk):
+                f.write(os.urandom(min(chunk, nbytes - start)))
+
+    baseline = peak_rss()
+    if rank == 0:
+        print("File size: %.1f MiB, peak RSS before: %.1f MiB" % (nbytes / 2**20, baseline))
+        print("%16s%12s%16s" % ("method", "time (s)", "peak RSS (MiB)"), flush=True)
+
+    for method, bcast in [("bcast_file", bcast_file), ("read and bcast", read_and_bcast)]:
+        with Timer(barrier=True) as t:
+            bcast(path, out_path, 0)
+        rss = peak_rss()
+        if rank == 0:
+            print("%16s%12.3f%16.1f" % (method, t.max, rss), flush=True)
+
+    mpi.barrier()
+    if rank == 0:
+        shutil.rmtree(tmpdir)
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark flat and node aware collectives.
+
+Run with: mpiexec -n 8 python benchmarks/hierarchical_collectives.py
+
+On a single machine all ranks share one node, so the node aware
+variants are run with emulated nodes of 1, 2, 4, ... consecutive ranks
+(HierarchicalComm's ranks_per_node) and compared with the flat MPI
+collectives. Times are the maximum over ranks of the best of NREPEATS.
+"""
+
+from array import array
+
+import yapympi.base as mpi
+from yapympi.hierarchical import HierarchicalComm
+from yapympi.timing import Timer, reduce_times
+
+SIZES = [1 << 10, 1 << 16, 1 << 20]
+NREPEATS = 10
+
+
+def best_time(fn):
+    """Return the max over ranks of the best time of fn."""
+    best = float("inf")
+    for _ in range(NREPEATS):
+        with Timer(barrier=True, reduce=False) as t:
+            fn()
+        best = min(best, t.elapsed)
+    return reduce_times(best)[1]
+
+
+def bench(name, nbytes, flat, hierarchical):
+    """Print times of the flat and hierarchical variants of a collective."""
+    rank, size = mpi.comm_rank(), mpi.comm_size()
+
+    t_flat = best_time(flat)
+    row = ["%-10s %10d %12.6f" % (name, nbytes, t_flat)]
+    rpn = 1
+    while rpn <= size:
+        hcomm = HierarchicalComm(ranks_per_node=rpn)
+        row.append("%12.6f" % best_time(lambda: hierarchical(hcomm)))
+        hcomm.free()
+        rpn *= 2
+
+    if rank == 0:
+        print(" ".join(row), flush=True)
+
+
+def main():
+    mpi.init()
+    rank, size = mpi.comm_rank(), mpi.comm_size()
+
+    if rank == 0:
+        header = ["%-10s %10s %12s" % ("collective", "bytes", "flat")]
+        rpn = 1
+        while rpn <= size:
+            header.append("%12s" % ("rpn=%d" % rpn))
+            rpn *= 2
+        print(" ".join(header), flush=True)
+
+    for nbytes in SIZES:
+        buf = bytearray(nbytes)
+        bench("bcast", nbytes, lambda: mpi.bcast(buf, 0), lambda h: h.bcast(buf, 0))
+
+        n = nbytes // 8
+        sendbuf = array("d", [1.0]) * n
+        recvbuf = array("d", [0.0]) * n
+        bench(
+            "allreduce",
+            nbytes,
+            lambda: mpi.allreduce(sendbuf, recvbuf),
+            lambda h: h.allreduce(sendbuf, recvbuf),
+        )
+
+        block = bytearray(max(nbytes // size, 1))
+        gathered = bytearray(len(block) * size)
+        bench(
+            "allgather",
+            nbytes,
+            lambda: mpi.allgather(block, gathered),
+            lambda h: h.allgather(block, gathered),
+        )
+
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Benchmark the import time of the package and its submodules.
+
+Run with: python benchmarks/import_time.py [module ...]
+
+Each module is imported in a fresh interpreter with ``python -X importtime``,
+NREPEATS times. The table shows the best cumulative import time of the
+module and of the yapympi modules and heavy dependencies it loaded, so a
+regression of the lazy imports shows up as new rows.
+"""
+
+import sys
+from subprocess import run
+
+MODULES = ["yapympi", "yapympi.base", "yapympi.profiling", "yapympi.compression"]
+NREPEATS = 5
+
+
+def import_times(module):
+    """Return the cumulative import time in microseconds of each loaded module."""
+    cmd = [sys.executable, "-X", "importtime", "-c", "import %s" % module]
+    cp = run(cmd, check=True, capture_output=True, text=True)
+    times = {}
+    for line in cp.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def best_import_times(module):
+    """Return the best cumulative import times of NREPEATS runs."""
+    best = {}
+    for _ in range(NREPEATS):
+        for name, elapsed in import_times(module).items():
+            best[name] = min(elapsed, best.get(name, elapsed))
+    return best
+
+
+def main():
+    modules = sys.argv[1:] or MODULES
+    for module in modules:
+        best = best_import_times(module)
+        print("import %s: %.3f ms" % (module, best.get(module, 0) / 1000))
+        for name in sorted(best):
+            if name != module and name.split(".")[0] in ("yapympi", "cffi", "numpy"):
+                print("    %-32s %10.3f ms" % (name, best[name] / 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Benchmark the native request and status helpers against pure Python.
+
+Run with: mpiexec -n 1 python benchmarks/native_helpers.py
+
+Compares, for n requests:
+
+- testsome: MPI_Testsome, a list of indices and RequestArray.remove
+  in Python, against RequestArray.testsome_remove. Half of the requests
+  (every other one, so the array has holes) complete in each call.
+- irecv_batch: one MPI_Irecv call per buffer from Python, against the
+  single call of irecv_batch.
+- get_counts: one MPI_Get_count call per status from Python, against
+  the single call of status.get_counts.
+
+Receives from MPI_PROC_NULL complete at once, so the table shows the
+overhead of the bindings in microseconds per call, not of communication.
+"""
+
+import yapympi.base as mpi
+from yapympi.cmpi import ffi, lib
+from yapympi.request_array import RequestArray
+from yapympi.status import get_counts
+
+SIZES = [16, 256, 4096]
+NITERS = 200
+
+
+def python_testsome(array, outcount):
+    """Completion loop of RequestManager.test before the native helper."""
+    ret = lib.MPI_Testsome(array.size, array.requests, outcount, array.indices, array.statuses)
+    mpi.check_error(ret)
+    indices = [array.indices[i] for i in range(max(outcount[0], 0))]
+    return array.remove(indices)
+
+
+def native_testsome(array, _):
+    ret, handles = array.testsome_remove()
+    mpi.check_error(ret)
+    return handles
+
+
+def python_irecv_batch(bufs, source, tag, array):
+    """irecv_batch before the native helper."""
+    start = array.size
+    request_p = array.reserve(len(bufs))
+    for i, buf in enumerate(bufs):
+        cbuf = ffi.from_buffer("char[]", buf, require_writable=True)
+        array.buffers[start + i] = cbuf
+        ret = lib.MPI_Irecv(cbuf, len(cbuf), lib.MPI_BYTE, source, tag, lib.MPI_COMM_WORLD, request_p + i)
+        mpi.check_error(ret)
+
+
+def native_irecv_batch(bufs, source, tag, array):
+    mpi.irecv_batch(bufs, source, tag, requests=array)
+
+
+def python_get_counts(statuses, n):
+    """get_counts before the native helper."""
+    cnt = ffi.new("int*")
+    counts = []
+    for i in range(n):
+        mpi.check_error(lib.MPI_Get_count(statuses + i, lib.MPI_BYTE, cnt))
+        counts.append(cnt[0])
+    return counts
+
+
+def native_get_counts(statuses, n):
+    return get_counts(statuses, n)
+
+
+def time_testsome(testsome, n):
+    """Time one call completing n of 2n requests."""
+    rank = mpi.comm_rank()
+    array = RequestArray(2 * n)
+    outcount = ffi.new("int*")
+    bufs = [bytearray(8) for _ in range(n)]
+    total = 0.0
+    for _ in range(NITERS):
+        for buf in bufs:
+            mpi.irecv(buf, lib.MPI_PROC_NULL, 0, request=array.add())
+            mpi.irecv(buf, rank, 1, request=array.add(None, buf))
+
+        start = mpi.wtime()
+        handles = testsome(array, outcount)
+        total += mpi.wtime() - start
+        assert len(handles) == n and len(array) == n
+
+        for buf in bufs:
+            mpi.send(buf, rank, 1)
+        mpi.waitall(array)
+        array.clear()
+    return total / NITERS
+
+
+def time_irecv_batch(irecv_batch, n):
+    """Time posting n receives."""
+    array = RequestArray(n)
+    bufs = [bytearray(8) for _ in range(n)]
+    total = 0.0
+    for _ in range(NITERS):
+        start = mpi.wtime()
+        irecv_batch(bufs, lib.MPI_PROC_NULL, 0, array)
+        total += mpi.wtime() - start
+        mpi.waitall(array)
+        array.clear()
+    return total / NITERS
+
+
+def time_get_counts(counts, n):
+    """Time extracting the counts of n statuses."""
+    array = RequestArray(n)
+    mpi.irecv_batch([bytearray(8) for _ in range(n)], lib.MPI_PROC_NULL, 0, requests=array)
+    statuses = ffi.new("MPI_Status[]", n)
+    mpi.waitall(array, statuses)
+    start = mpi.wtime()
+    for _ in range(NITERS):
+        counts(statuses, n)
+    return (mpi.wtime() - start) / NITERS
+
+
+def main():
+    mpi.init()
+    rank = mpi.comm_rank()
+
+    benchmarks = [
+        ("testsome", time_testsome, python_testsome, native_testsome),
+        ("irecv_batch", time_irecv_batch, python_irecv_batch, native_irecv_batch),
+        ("get_counts", time_get_counts, python_get_counts, native_get_counts),
+    ]
+    if rank == 0:
+        print("%12s%8s%12s%12s%10s" % ("operation", "n", "python", "native", "speedup"), flush=True)
+    for name, bench, python, native in benchmarks:
+        for n in SIZES:
+            t_python = bench(python, n)
+            t_native = bench(native, n)
+            if rank == 0:
+                print(
+                    "%12s%8d%12.2f%12.2f%10.2f"
+                    % (name, n, t_python * 1e6, t_native * 1e6, t_python / t_native),
+                    flush=True,
+                )
+
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
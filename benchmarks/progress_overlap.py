@@ -0,0 +1,95 @@
+"""Benchmark compute/communication overlap with the progress engine.
+
+Run with: mpiexec -n 2 python benchmarks/progress_overlap.py
+
+Rank 0 sends a large message to rank 1 and both ranks then compute
+for a fixed time before waiting for the transfer to finish.
+Without a progress engine large (rendezvous protocol) transfers
+typically only progress inside the final wait, so the total time is
+close to compute + transfer. With the engine it approaches
+max(compute, transfer).
+"""
+
+import time
+import threading
+
+import yapympi.base as mpi
+from yapympi.cmpi import lib
+from yapympi.request_manager import RequestManager, ProgressEngine
+from yapympi.timing import Timer
+
+NBYTES = 64 << 20
+COMPUTE_SECONDS = 0.5
+NREPEATS = 3
+
+
+def compute(seconds):
+    """Busy loop in Python for the given time."""
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(100))
+    return total
+
+
+def post(rm, rank, buf):
+    """Post the transfer on the request manager."""
+    if rank == 0:
+        rm.send(buf, dest=1, tag=0)
+    else:
+        rm.recv(buf, source=0, tag=0)
+
+
+def run_once(rank, buf, use_engine):
+    """Return the max over ranks of the time for one post + compute + wait cycle."""
+    rm = RequestManager(1)
+    finished = threading.Event()
+
+    with Timer(barrier=True) as t:
+        if use_engine:
+            with ProgressEngine(rm, lambda h, s: finished.set()):
+                post(rm, rank, buf)
+                compute(COMPUTE_SECONDS)
+                finished.wait()
+        else:
+            post(rm, rank, buf)
+            compute(COMPUTE_SECONDS)
+            while rm.test()[0] is None:
+                pass
+    return t.max
+
+
+def main():
+    provided = mpi.init_thread(lib.MPI_THREAD_MULTIPLE)
+    rank = mpi.comm_rank()
+    if provided != lib.MPI_THREAD_MULTIPLE:
+        if rank == 0:
+            print("MPI_THREAD_MULTIPLE not available")
+        mpi.finalize()
+        return
+
+    buf = bytearray(NBYTES)
+
+    # Measure the bare transfer time
+    rm = RequestManager(1)
+    with Timer(barrier=True) as t:
+        post(rm, rank, buf)
+        while rm.test()[0] is None:
+            pass
+    transfer = t.max
+
+    without = min(run_once(rank, buf, False) for _ in range(NREPEATS))
+    with_engine = min(run_once(rank, buf, True) for _ in range(NREPEATS))
+
+    if rank == 0:
+        print("message size:         %d bytes" % NBYTES)
+        print("transfer only:        %.3f s" % transfer)
+        print("compute only:         %.3f s" % COMPUTE_SECONDS)
+        print("without engine:       %.3f s" % without)
+        print("with progress engine: %.3f s" % with_engine)
+
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
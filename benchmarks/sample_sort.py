@@ -0,0 +1,79 @@
+"""Benchmark distributed sample sort and hash shuffle.
+
+Run with: mpiexec -n 8 python benchmarks/sample_sort.py [NKEYS]
+
+NKEYS (default 10**8) random int64 keys are split evenly over the ranks.
+Prints the total time of sample_sort and of each of its phases (local
+sort, splitter selection, exchange and merge, timed by running the
+phases one at a time), the time of hash_shuffle, and the imbalance
+(max / mean local size) of the output. Times are the maximum over ranks.
+"""
+
+import sys
+
+import numpy as np
+
+import yapympi.base as mpi
+from yapympi.cmpi import lib
+from yapympi import shuffle
+from yapympi.timing import Timer, reduce_times
+
+
+def max_over_ranks(value):
+    """Return the maximum of value over all ranks."""
+    return reduce_times(value)[1]
+
+
+def timed(fn, *args, **kwargs):
+    """Return the result of fn and the max over ranks of its run time."""
+    with Timer(barrier=True) as t:
+        result = fn(*args, **kwargs)
+    return result, t.max
+
+
+def sample_sort_phases(keys, oversample=64):
+    """Run the phases of shuffle.sample_sort; return their times."""
+    size = mpi.comm_size()
+    local, t_local = timed(np.sort, keys, kind="stable")
+    splitters, t_splitters = timed(shuffle._splitters, local, oversample, lib.MPI_COMM_WORLD)
+    if len(splitters):
+        bounds = np.searchsorted(local, splitters, side="right")
+        sendcounts = np.diff(np.concatenate(([0], bounds, [len(local)]))).astype(np.intc)
+    else:
+        sendcounts = np.zeros(size, dtype=np.intc)
+    out, t_exchange = timed(shuffle._exchange_sorted, local, sendcounts, lib.MPI_COMM_WORLD)
+    _, t_merge = timed(np.sort, out, kind="stable")
+    return [("local sort", t_local), ("splitters", t_splitters), ("exchange", t_exchange), ("merge", t_merge)]
+
+
+def main():
+    mpi.init()
+    rank, size = mpi.comm_rank(), mpi.comm_size()
+
+    nkeys = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10 ** 8
+    n = nkeys // size + (1 if rank < nkeys % size else 0)
+    keys = np.random.default_rng(rank).integers(0, 2 ** 62, n, dtype=np.int64)
+
+    phases = sample_sort_phases(keys)
+    out, t_sort = timed(shuffle.sample_sort, keys)
+    mean = nkeys / size
+    imbalance = max_over_ranks(len(out)) / mean
+    del out
+
+    out, t_hash = timed(shuffle.hash_shuffle, keys)
+    hash_imbalance = max_over_ranks(len(out)) / mean
+    del out
+
+    if rank == 0:
+        print("keys %d ranks %d" % (nkeys, size))
+        print("%-22s %10.3f s  imbalance %.3f" % ("sample_sort", t_sort, imbalance))
+        for name, t in phases:
+            print("%-22s %10.3f s" % ("  " + name, t))
+        print("%-22s %10.3f s  imbalance %.3f" % ("hash_shuffle", t_hash, hash_imbalance))
+        print("%-22s %10.1f Mkeys/s" % ("sort throughput", nkeys / t_sort / 1e6))
+
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
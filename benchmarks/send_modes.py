@@ -0,0 +1,71 @@
+"""Benchmark the latency of the point to point send modes.
+
+Run with: mpiexec -n 2 python benchmarks/send_modes.py
+
+Ping-pong between ranks 0 and 1 with standard (send), synchronous
+(ssend), ready (rsend) and buffered (bsend) sends. Every receive is
+posted with irecv before the peer sends to it, so ready sends are
+valid and all modes see the same receive pattern. The table shows half
+of the average round trip time in microseconds.
+"""
+
+import yapympi.base as mpi
+from yapympi.cmpi import lib
+
+SIZES = [0, 64, 1 << 10, 1 << 14, 1 << 18]
+NITERS = 2000
+NWARMUP = 100
+MODES = ["send", "ssend", "rsend", "bsend"]
+
+
+def pingpong(send, rank, nbytes, niters):
+    """Return the average one way latency of niters round trips."""
+    peer = 1 - rank
+    sendbuf = bytearray(nbytes)
+    recvbuf = bytearray(nbytes)
+
+    req = mpi.irecv(recvbuf, peer, 0)
+    mpi.barrier()
+    start = mpi.wtime()
+    for _ in range(niters):
+        if rank == 0:
+            send(sendbuf, peer, 0)
+            mpi.wait(req)
+            req = mpi.irecv(recvbuf, peer, 0)
+        else:
+            mpi.wait(req)
+            req = mpi.irecv(recvbuf, peer, 0)
+            send(sendbuf, peer, 0)
+    elapsed = mpi.wtime() - start
+
+    # Match the last pre-posted receives
+    mpi.barrier()
+    mpi.rsend(sendbuf, peer, 0)
+    mpi.wait(req)
+    return elapsed / niters / 2
+
+
+def main():
+    mpi.init()
+    rank, size = mpi.comm_rank(), mpi.comm_size()
+    assert size == 2, "Run with 2 processes"
+
+    mpi.buffer_attach(2 * (max(SIZES) + lib.MPI_BSEND_OVERHEAD))
+
+    if rank == 0:
+        print("%10s" % "bytes" + "".join("%12s" % m for m in MODES), flush=True)
+    for nbytes in SIZES:
+        row = []
+        for mode in MODES:
+            send = getattr(mpi, mode)
+            pingpong(send, rank, nbytes, NWARMUP)
+            row.append(pingpong(send, rank, nbytes, NITERS) * 1e6)
+        if rank == 0:
+            print("%10d" % nbytes + "".join("%12.2f" % t for t in row), flush=True)
+
+    mpi.buffer_detach()
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
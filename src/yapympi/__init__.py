@@ -0,0 +1,55 @@
+"""Yet Another Python MPI Library.
+
+Importing the package is cheap: the cffi module and the submodules are
+only loaded the first time they are used. The functions of
+:mod:`yapympi.base` are available directly from the package, e.g.
+``yapympi.init()``, and the submodules as attributes, e.g.
+``yapympi.profiling``.
+
+Functions of :mod:`yapympi.base` are looked up on every access,
+so they see the wrappers installed by :mod:`yapympi.profiling`.
+"""
+
+import importlib
+
+_SUBMODULES = {
+    "base",
+    "error",
+    "status",
+    "request_array",
+    "request_manager",
+    "partitioned",
+    "hierarchical",
+    "distarray",
+    "executor",
+    "shuffle",
+    "workstealing",
+    "sparse",
+    "timing",
+    "profiling",
+    "tracing",
+    "commmatrix",
+    "activemessage",
+    "compression",
+    "mmapfile",
+}
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module("." + name, __name__)
+
+    if not name.startswith("_"):
+        base = importlib.import_module(".base", __name__)
+        try:
+            return getattr(base, name)
+        except AttributeError:
+            pass
+
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    base = importlib.import_module(".base", __name__)
+    names = [n for n in vars(base) if not n.startswith("_")]
+    return sorted(set(globals()) | _SUBMODULES | set(names))
@@ -0,0 +1,344 @@
+"""Active messages: per tag handlers and remote procedure calls.
+
+Instead of receiving with MPI_ANY_TAG and branching on the tag of each
+message, handlers are registered per tag and are run when a message
+with that tag arrives. A message is a small header (handler tag, kind
+and call id) followed by the payload.
+
+Receives are pre-posted: for each of several size classes a ring of
+depth buffers is kept posted, so messages land directly in a posted
+buffer instead of being copied out of MPI's unexpected message queue.
+A message goes to the smallest class it fits in. Every class has its
+own MPI tag, so a message never matches a buffer that is too small.
+Larger messages are probed for and received into a buffer of their
+exact size.
+
+progress tests all requests of the underlying RequestManager at once,
+runs the handlers of all completed receives as a batch and reposts
+each buffer after its handler returns. call sends a message whose
+handler's return value is sent back; the returned Future is resolved by
+progress when the reply arrives.
+
+The layer uses a private communicator split from the one it is given
+and must be driven from a single thread.
+"""
+
+import time
+import bisect
+import struct
+import itertools
+from array import array
+from collections import deque
+from concurrent.futures import Future
+
+from .cmpi import ffi, lib
+from . import base
+from .error import MPITimeoutError
+from .request_manager import RequestManager
+
+# MPI tag of messages larger than the largest size class;
+# size class i uses tag 1 + i
+LARGE_TAG = 0
+
+_MESSAGE = 0
+_CALL = 1
+_REPLY = 2
+_ERROR = 3
+
+# Handler tag, kind and call id
+_HEADER = struct.Struct("=iiq")
+
+
+class RemoteError(RuntimeError):
+    """Exception raised by the handler of a remote procedure call."""
+
+
+class ActiveMessages:
+    """Tag dispatched message handlers over the processes of a communicator.
+
+    Example::
+
+        am = ActiveMessages()
+        am.register(ADD, lambda source, payload: bytes([sum(payload)]))
+        future = am.call((rank + 1) % size, ADD, bytes([1, 2]))
+        assert am.wait(future) == bytes([3])
+        am.free()
+
+    A handler is called as handler(source, payload), where payload is a
+    memoryview of the received buffer that is only valid until the
+    handler returns. For calls, the handler's return value (an object
+    supporting buffer interface, or None) is sent back as the reply and
+    an exception it raises is raised by the caller's future as a
+    RemoteError.
+
+    Attributes
+    ----------
+    comm : MPI_Comm
+        Private communicator
+    rank : int
+        Rank in comm
+    size : int
+        Size of comm
+    size_classes : list of int
+        Buffer size of each class of pre-posted receives,
+        including the message header
+    handlers : dict
+        Handler of each tag
+    nsent : int
+        Number of messages sent
+    nreceived : int
+        Number of messages dispatched
+    """
+
+    def __init__(self, comm=lib.MPI_COMM_WORLD, size_classes=(256, 4096, 65536), depth=8, max_sends=64):
+        """Initialize.
+
+        This is a collective operation on comm.
+
+        Parameters
+        ----------
+        comm : MPI_Comm
+            Communicator
+        size_classes : sequence of int
+            Buffer size of each class of pre-posted receives
+        depth : int
+            Number of pre-posted receives of each class
+        max_sends : int
+            Maximum number of outstanding sends;
+            further sends make progress until one completes
+        """
+        self.size_classes = sorted(int(size) for size in size_classes)
+        if not self.size_classes or self.size_classes[0] <= _HEADER.size:
+            raise ValueError("Size classes must be larger than the %d byte header" % _HEADER.size)
+
+        self.comm = base.comm_split(comm, 0, base.comm_rank(comm))
+        self.rank = base.comm_rank(self.comm)
+        self.size = base.comm_size(self.comm)
+        self.max_sends = max(int(max_sends), 1)
+        self.handlers = {}
+        self.nsent = 0
+        self.nreceived = 0
+
+        nrecvs = len(self.size_classes) * depth
+        self._manager = RequestManager(nrecvs + self.max_sends, self.comm)
+        self._nsends = 0
+        self._ready = deque()
+        self._calls = {}
+        self._call_ids = itertools.count()
+        self._status = ffi.new("MPI_Status*")
+
+        self._buffers = [[bytearray(size) for _ in range(depth)] for size in self.size_classes]
+        for cls in range(len(self.size_classes)):
+            for slot in range(depth):
+                self._post(cls, slot)
+
+    def _post(self, cls, slot):
+        """Post the receive of a buffer of a size class."""
+        self._manager.recv(self._buffers[cls][slot], lib.MPI_ANY_SOURCE, 1 + cls, (cls, slot))
+
+    def register(self, tag, handler):
+        """Register the handler of a tag.
+
+        Parameters
+        ----------
+        tag : int
+            Message tag
+        handler : callable
+            Called as handler(source, payload) for every message with tag
+        """
+        self.handlers[tag] = handler
+
+    def handler(self, tag):
+        """Return a decorator registering a function as the handler of a tag."""
+
+        def decorator(fn):
+            self.register(tag, fn)
+            return fn
+
+        return decorator
+
+    def send(self, dest, tag, payload=b""):
+        """Send an active message.
+
+        Parameters
+        ----------
+        dest : int
+            Rank of destination
+        tag : int
+            Tag of the handler to run on dest
+        payload : bytes or any object supporting buffer interface
+            Message payload
+        """
+        self._send(dest, tag, _MESSAGE, 0, payload)
+
+    def call(self, dest, tag, payload=b""):
+        """Run the handler of a tag on another process and get its result.
+
+        Parameters
+        ----------
+        dest : int
+            Rank of destination
+        tag : int
+            Tag of the handler to run on dest
+        payload : bytes or any object supporting buffer interface
+            Request payload
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Future of the reply payload (bytes);
+            resolved by progress when the reply arrives
+        """
+        call_id = next(self._call_ids)
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self._calls[call_id] = future
+        self._send(dest, tag, _CALL, call_id, payload)
+        return future
+
+    def _send(self, dest, tag, kind, call_id, payload):
+        """Send a message with a header."""
+        payload = memoryview(payload).cast("B")
+        nbytes = _HEADER.size + payload.nbytes
+        message = bytearray(nbytes)
+        _HEADER.pack_into(message, 0, tag, kind, call_id)
+        message[_HEADER.size :] = payload
+
+        cls = bisect.bisect_left(self.size_classes, nbytes)
+        wire_tag = LARGE_TAG if cls == len(self.size_classes) else 1 + cls
+
+        while self._nsends == self.max_sends:
+            if not self.progress():
+                time.sleep(0)
+        self._manager.send(message, dest, wire_tag)
+        self._nsends += 1
+        self.nsent += 1
+
+    def progress(self):
+        """Run the handlers of all messages that have arrived.
+
+        Returns
+        -------
+        count : int
+            Number of messages dispatched
+        """
+        handles, statuses = self._manager.test()
+        if handles is not None:
+            for handle, status in zip(handles, statuses):
+                if handle is None:
+                    self._nsends -= 1
+                else:
+                    self._ready.append((handle, status.source, status.count))
+
+        count = 0
+        while self._ready:
+            (cls, slot), source, nbytes = self._ready.popleft()
+            try:
+                self._dispatch(source, memoryview(self._buffers[cls][slot])[:nbytes])
+            finally:
+                self._post(cls, slot)
+            count += 1
+
+        status = self._status
+        while base.iprobe(lib.MPI_ANY_SOURCE, LARGE_TAG, self.comm, status)[0]:
+            buf = bytearray(base.get_count(status))
+            base.recv(buf, status.MPI_SOURCE, LARGE_TAG, self.comm)
+            self._dispatch(status.MPI_SOURCE, memoryview(buf))
+            count += 1
+
+        return count
+
+    def _dispatch(self, source, message):
+        """Run the handler of a message or resolve the future of a reply."""
+        self.nreceived += 1
+        tag, kind, call_id = _HEADER.unpack_from(message)
+        payload = message[_HEADER.size :]
+
+        if kind == _REPLY:
+            self._calls.pop(call_id).set_result(bytes(payload))
+            return
+        if kind == _ERROR:
+            self._calls.pop(call_id).set_exception(RemoteError(bytes(payload).decode()))
+            return
+
+        handler = self.handlers.get(tag)
+        if kind == _MESSAGE:
+            if handler is None:
+                raise ValueError("No active message handler for tag %d" % tag)
+            handler(source, payload)
+            return
+
+        try:
+            if handler is None:
+                raise ValueError("No active message handler for tag %d" % tag)
+            result = handler(source, payload)
+        except Exception as e:  # pylint: disable=broad-except
+            self._send(source, tag, _ERROR, call_id, ("%s: %s" % (type(e).__name__, e)).encode())
+        else:
+            self._send(source, tag, _REPLY, call_id, b"" if result is None else result)
+
+    def wait(self, future, timeout=None, interval=0.0):
+        """Make progress until a future of call is resolved.
+
+        Parameters
+        ----------
+        future : concurrent.futures.Future
+            Future returned by call
+        timeout : float or None
+            Maximum time to wait in seconds; None waits forever
+        interval : float
+            Time in seconds to sleep when no message arrived
+
+        Returns
+        -------
+        reply : bytes
+            Reply payload
+
+        Raises
+        ------
+        RemoteError
+            If the remote handler raised an exception
+        MPITimeoutError
+            If the reply did not arrive within timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not future.done():
+            if self.progress():
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                raise MPITimeoutError(timeout)
+            time.sleep(interval)
+        return future.result()
+
+    def free(self):
+        """Deliver all messages, release the receives and the communicator.
+
+        This is a collective operation on the private communicator.
+
+        Processes keep making progress in a nonblocking barrier until all
+        of them have called free, so no more messages are sent except by
+        handlers. They then sum the numbers of messages sent and
+        dispatched with allreduce until the sums are equal and unchanged
+        since the previous round. Then no message is in flight and no
+        handler can send another one, so the pre-posted receives can be
+        cancelled.
+        """
+        barrier = base.ibarrier(self.comm)
+        while not base.test(barrier)[0]:
+            if not self.progress():
+                time.sleep(0)
+
+        totals = array("q", [0, 0])
+        previous = None
+        while True:
+            self.progress()
+            base.allreduce(array("q", [self.nsent, self.nreceived]), totals, lib.MPI_SUM, self.comm)
+            current = tuple(totals)
+            if current[0] == current[1] and current == previous:
+                break
+            previous = current
+
+        while self._nsends:
+            self.progress()
+        self._manager.cancel_all()
+        base.comm_free(self.comm)
@@ -1,78 +1,139 @@
-"""A Simple MPI interface."""
+"""A Simple MPI interface.
 
-from .cmpi import ffi, lib
-
-
-class MPIErrorBase(RuntimeError):
-    """Base class of MPI Error objects."""
-
-
-class MPIError(MPIErrorBase):
-    """MPI runtime error.
-
-    Attributes
-    ----------
-    errcode : int
-        A MPI error code
-    errstr : str
-        String representation of the error code
-    """
-
-    def __init__(self, errcode):
-        self.errcode = errcode
-        self.errorstr = error_string(self.errcode)
-
-    def __str__(self):
-        return "MPI Error: %d: %s" % (self.errcode, self.errorstr)
-
-
-class MPIStatusErrors(MPIErrorBase):
-    """MPI runtime error in status.
-
-    Attributes
-    ----------
-    erridxs : list of int
-        List of indices where error occured
-    errcodes : list of int
-        List of MPI error codes
-    errstrs : list of str
-        List of string representations of the error codes
-    """
-
-    def __init__(self, erridxs, errcodes):
-        self.erridxs = erridxs
-        self.errcodes = errcodes
-        self.errstrs = [error_string(c) for c in self.errcodes]
+The wrappers call MPI through a cffi module compiled in API mode,
+which releases the GIL for the duration of every call into MPI.
+Blocking calls such as recv, wait* and barrier therefore do not stop
+other Python threads. Those threads may only call MPI themselves if
+the thread level returned by init_thread allows it.
+"""
 
-    def __str__(self):
-        x = zip(self.erridxs, self.errcodes, self.errstrs)
-        x = ["Index: %d; Error: %d: %s" % row for row in x]
-        x = "\n".join(x)
+import sys
+import time
+import operator
+import itertools
 
-        return "MPI Status Errors: %d errors\n%s" % (len(self.errcodes), x)
-
-
-def error_string(errorcode):
-    """Return a string for a given error code.
-
-    Parameters
-    ----------
-    errorcode : int
-        A MPI error code
-
-    Returns
-    -------
-    error_str : str
-        Text that corresponds to the errorcode
-    """
-    string = ffi.new("char[]", lib.MPI_MAX_ERROR_STRING)
-    resultlen = ffi.new("int*")
-    ret = lib.MPI_Error_string(errorcode, string, resultlen)
-    if ret != lib.MPI_SUCCESS:
-        return "Unknown MPI Error: %d" % errorcode
-    error_str = ffi.string(string, resultlen[0])
-    error_str = error_str.decode("ascii")
-    return error_str
+from .cmpi import ffi, lib
+from .error import MPIErrorBase, MPIError, MPIStatusErrors, MPITimeoutError, error_string, error_class
+from .error import (
+    MPIArgumentError,
+    MPIRankError,
+    MPICommError,
+    MPIRequestError,
+    MPITruncateError,
+    MPIPendingError,
+    MPINoMemoryError,
+    MPIUnsupportedError,
+    MPIInternalError,
+)
+from .request_array import RequestArray, as_request_array
+from .partitioned import PartitionedRequest
+
+__all__ = [
+    "MPIErrorBase",
+    "MPIError",
+    "MPIStatusErrors",
+    "MPITimeoutError",
+    "error_string",
+    "error_class",
+    "MPIArgumentError",
+    "MPIRankError",
+    "MPICommError",
+    "MPIRequestError",
+    "MPITruncateError",
+    "MPIPendingError",
+    "MPINoMemoryError",
+    "MPIUnsupportedError",
+    "MPIInternalError",
+    "RequestArray",
+    "as_request_array",
+    "PartitionedRequest",
+    "HAVE_ISENDRECV",
+    "check_error",
+    "check_error_in_status",
+    "list_to_array",
+    "get_count",
+    "init",
+    "init_thread",
+    "query_thread",
+    "is_thread_main",
+    "initialized",
+    "finalized",
+    "finalize",
+    "abort",
+    "comm_set_errhandler",
+    "comm_set_fatal_errhandler",
+    "comm_set_nonfatal_errhandler",
+    "comm_rank",
+    "comm_size",
+    "get_processor_name",
+    "wtime",
+    "wtick",
+    "comm_dup",
+    "comm_split",
+    "comm_split_type",
+    "comm_free",
+    "translate_ranks",
+    "comm_create_keyval",
+    "comm_set_attr",
+    "comm_get_attr",
+    "comm_delete_attr",
+    "type_size",
+    "buffer_datatype",
+    "send",
+    "ssend",
+    "rsend",
+    "bsend",
+    "buffer_attach",
+    "buffer_detach",
+    "recv",
+    "sendrecv",
+    "sendrecv_replace",
+    "barrier",
+    "ibarrier",
+    "probe",
+    "iprobe",
+    "isend",
+    "issend",
+    "irsend",
+    "ibsend",
+    "irecv",
+    "isendrecv",
+    "isendrecv_replace",
+    "isend_batch",
+    "irecv_batch",
+    "split_buffer",
+    "wait",
+    "test",
+    "cancel",
+    "request_free",
+    "send_init",
+    "recv_init",
+    "start",
+    "startall",
+    "waitany",
+    "waitall",
+    "waitsome",
+    "testany",
+    "testall",
+    "testsome",
+    "bcast",
+    "ibcast",
+    "psend_init",
+    "precv_init",
+    "pready",
+    "parrived",
+    "reduce",
+    "allreduce",
+    "gather",
+    "gatherv",
+    "scatterv",
+    "allgather",
+    "allgatherv",
+    "alltoall",
+    "alltoallv",
+]
+
+HAVE_ISENDRECV = bool(lib.YAPYMPI_HAVE_ISENDRECV)
 
 
 def check_error(retcode):
@@ -118,10 +179,11 @@ def check_error_in_status(retcode, statuses):
             if statuses[idx].MPI_ERROR != lib.MPI_SUCCESS:
                 erridxs.append(idx)
                 errcodes.append(statuses[idx].MPI_ERROR)
-        raise MPIStatusErrors(erridxs, errcodes)
+        raise MPIStatusErrors(errcodes, erridxs=erridxs)
 
     raise MPIError(retcode)
 
+
 def list_to_array(ctype, objs):
     """Create an array of ctype[] form a list of ctype*.
 
@@ -142,6 +204,7 @@ def list_to_array(ctype, objs):
         arr[i] = o[0]
     return arr
 
+
 def get_count(status, datatype=lib.MPI_BYTE):
     """Get the number of "top level" elements.
 
@@ -169,6 +232,84 @@ def init():
     check_error(ret)
 
 
+def init_thread(required=lib.MPI_THREAD_MULTIPLE):
+    """Initialize the MPI execution environment with thread support.
+
+    Parameters
+    ----------
+    required : int
+        Desired level of thread support
+        (MPI_THREAD_SINGLE, MPI_THREAD_FUNNELED,
+        MPI_THREAD_SERIALIZED or MPI_THREAD_MULTIPLE)
+
+    Returns
+    -------
+    provided : int
+        Provided level of thread support,
+        which may be lower than the required level.
+    """
+    provided = ffi.new("int*")
+    ret = lib.MPI_Init_thread(ffi.NULL, ffi.NULL, required, provided)
+    check_error(ret)
+    return provided[0]
+
+
+def query_thread():
+    """Return the level of thread support provided by the MPI library.
+
+    Returns
+    -------
+    provided : int
+        Provided level of thread support
+    """
+    provided = ffi.new("int*")
+    ret = lib.MPI_Query_thread(provided)
+    check_error(ret)
+    return provided[0]
+
+
+def is_thread_main():
+    """Check if the calling thread is the thread that initialized MPI.
+
+    Returns
+    -------
+    flag : bool
+        True if the calling thread is the main thread
+    """
+    flag = ffi.new("int*")
+    ret = lib.MPI_Is_thread_main(flag)
+    check_error(ret)
+    return bool(flag[0])
+
+
+def initialized():
+    """Check if MPI has been initialized.
+
+    Returns
+    -------
+    flag : bool
+        True if init or init_thread has been called
+    """
+    flag = ffi.new("int*")
+    ret = lib.MPI_Initialized(flag)
+    check_error(ret)
+    return bool(flag[0])
+
+
+def finalized():
+    """Check if MPI has been finalized.
+
+    Returns
+    -------
+    flag : bool
+        True if finalize has been called
+    """
+    flag = ffi.new("int*")
+    ret = lib.MPI_Finalized(flag)
+    check_error(ret)
+    return bool(flag[0])
+
+
 def finalize():
     """Terminate the MPI execution environment."""
     ret = lib.MPI_Finalize()
@@ -284,286 +425,1543 @@ def get_processor_name():
     return proc_name
 
 
-def send(buf, dest, tag, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE):
-    """Perform a blocking send.
+def wtime():
+    """Return the elapsed time on the calling process.
 
-    Parameters
-    ----------
-    buf : bytes or any object supporting buffer interface
-        The send buffer
-    dest : int
-        Rank of destination
-    tag : int
-        Message tag
-    comm : MPI_Comm
-        Communicator
-    datatype : MPI_Datatype
-        Datatype of each send buffer element
+    Returns
+    -------
+    time : float
+        Time in seconds since an arbitrary time in the past.
+        Clocks of different processes are not synchronized;
+        see yapympi.timing.
     """
-    if isinstance(buf, bytes):
-        cbuf = ffi.new("char[]", buf)
-    else:
-        cbuf = ffi.from_buffer("char[]", buf)
-    count = len(cbuf)
+    return lib.MPI_Wtime()
 
-    ret = lib.MPI_Send(cbuf, count, datatype, dest, tag, comm)
-    check_error(ret)
 
+def wtick():
+    """Return the resolution of wtime.
 
-def recv(
-    buf,
-    source=lib.MPI_ANY_SOURCE,
-    tag=lib.MPI_ANY_TAG,
-    comm=lib.MPI_COMM_WORLD,
-    datatype=lib.MPI_BYTE,
-    status=None,
-):
-    """Perform a blocking receive for a message.
+    Returns
+    -------
+    tick : float
+        Seconds between successive clock ticks
+    """
+    return lib.MPI_Wtick()
+
+
+def comm_dup(comm=lib.MPI_COMM_WORLD):
+    """Duplicate a communicator.
+
+    Messages on the new communicator never match messages on comm,
+    so libraries can use it for their own traffic.
 
     Parameters
     ----------
-    buf : a writable object supporting buffer interface
-        The receive buffer
-    source : int
-        Rank of source
-    tag : int
-        Message tag
     comm : MPI_Comm
         Communicator
-    datatype : MPI_Datatype
-        Datatype of each receive buffer element
-    status : MPI_Status*
-        Status object
-        If status is None a new status object is created.
 
     Returns
     -------
-    status : MPI_Status*
-        Status object
+    newcomm : MPI_Comm
+        New communicator with the same group as comm
     """
-    cbuf = ffi.from_buffer("char[]", buf, require_writable=True)
-    count = len(cbuf)
-    if status is None:
-        status = ffi.new("MPI_Status*")
-    ret = lib.MPI_Recv(cbuf, count, datatype, source, tag, comm, status)
+    newcomm = ffi.new("MPI_Comm*")
+    ret = lib.MPI_Comm_dup(comm, newcomm)
     check_error(ret)
-    return status
+    return newcomm[0]
 
 
-def barrier(comm=lib.MPI_COMM_WORLD):
-    """Blocks until all processes in the communicator have reached this routine.
+def comm_split(comm=lib.MPI_COMM_WORLD, color=0, key=0):
+    """Create new communicators based on colors and keys.
 
     Parameters
     ----------
     comm : MPI_Comm
         Communicator
+    color : int
+        Control of subset assignment; MPI_UNDEFINED to not join any subset
+    key : int
+        Control of rank assignment
+
+    Returns
+    -------
+    newcomm : MPI_Comm
+        New communicator, or MPI_COMM_NULL if color was MPI_UNDEFINED
     """
-    ret = lib.MPI_Barrier(comm)
+    newcomm = ffi.new("MPI_Comm*")
+    ret = lib.MPI_Comm_split(comm, color, key, newcomm)
     check_error(ret)
+    return newcomm[0]
 
 
-def isend(buf, dest, tag, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE, request=None):
-    """Begin a nonblocking send.
+def comm_split_type(comm=lib.MPI_COMM_WORLD, split_type=lib.MPI_COMM_TYPE_SHARED, key=0):
+    """Split a communicator by type, e.g. by shared memory node.
 
     Parameters
     ----------
-    buf : bytes or any object supporting buffer interface
-        The send buffer
-    dest : int
-        Rank of destination
-    tag : int
-        Message tag
     comm : MPI_Comm
         Communicator
-    datatype : MPI_Datatype
-        Datatype of each send buffer element
-    request : MPI_Request*
-        Communication request
-        If request is None a new request object is created.
+    split_type : int
+        Type of processes to be grouped together
+    key : int
+        Control of rank assignment
 
     Returns
     -------
-    request : MPI_Request*
-        Communication request
+    newcomm : MPI_Comm
+        New communicator
     """
-    if isinstance(buf, bytes):
-        cbuf = ffi.new("char[]", buf)
-    else:
-        cbuf = ffi.from_buffer("char[]", buf)
-    count = len(cbuf)
-    if request is None:
-        request = ffi.new("MPI_Request*")
-
-    ret = lib.MPI_Isend(cbuf, count, datatype, dest, tag, comm, request)
+    newcomm = ffi.new("MPI_Comm*")
+    ret = lib.MPI_Comm_split_type(comm, split_type, key, lib.MPI_INFO_NULL, newcomm)
     check_error(ret)
-
-    return request
+    return newcomm[0]
 
 
-def irecv(
-    buf,
-    source=lib.MPI_ANY_SOURCE,
-    tag=lib.MPI_ANY_TAG,
-    comm=lib.MPI_COMM_WORLD,
-    datatype=lib.MPI_BYTE,
-    request=None,
-):
-    """Begin a nonblocking receive.
+def comm_free(comm):
+    """Mark a communicator for deallocation.
 
     Parameters
     ----------
-    buf : a writable object supporting buffer interface
-        The receive buffer
-    source : int
-        Rank of source
-    tag : int
-        Message tag
     comm : MPI_Comm
         Communicator
-    datatype : MPI_Datatype
-        Datatype of each receive buffer element
-    request : MPI_Request*
-        Communication request
-        If request is None a new request object is created.
-
-    Returns
-    -------
-    request : MPI_Request*
-        Communication request
     """
-    cbuf = ffi.from_buffer("char[]", buf, require_writable=True)
-    count = len(cbuf)
-    if request is None:
-        request = ffi.new("MPI_Request*")
-    ret = lib.MPI_Irecv(cbuf, count, datatype, source, tag, comm, request)
+    comm_p = ffi.new("MPI_Comm*", comm)
+    ret = lib.MPI_Comm_free(comm_p)
     check_error(ret)
-    return request
 
 
-def wait(request, status=None):
-    """Wait for an MPI request to complete.
+def translate_ranks(ranks, comm, target=lib.MPI_COMM_WORLD):
+    """Translate ranks in a communicator to ranks in another one.
 
     Parameters
     ----------
-    request : MPI_Request*
-        Communication request
-    status : MPI_Status*
-        Status object
-        If status is None a new status object is created.
+    ranks : sequence of int
+        Ranks in comm
+    comm : MPI_Comm
+        Communicator of ranks
+    target : MPI_Comm
+        Communicator to translate the ranks to
 
     Returns
     -------
-    status : MPI_Status*
-        Status object
+    ranks : list of int
+        Rank in target of the process with each rank in comm,
+        MPI_UNDEFINED if it is not in target.
+        MPI_PROC_NULL is translated to itself.
     """
-    if status is None:
-        status = ffi.new("MPI_Status*")
-    ret = lib.MPI_Wait(request, status)
-    check_error(ret)
-    return status
-
-
-def test(request, status=None):
-    """Test for the completion of a request.
+    n = len(ranks)
+    group_p = ffi.new("MPI_Group*")
+    target_group_p = ffi.new("MPI_Group*")
+    check_error(lib.MPI_Comm_group(comm, group_p))
+    try:
+        check_error(lib.MPI_Comm_group(target, target_group_p))
+        try:
+            result = ffi.new("int[]", n)
+            ret = lib.MPI_Group_translate_ranks(group_p[0], n, ffi.new("int[]", ranks), target_group_p[0], result)
+            check_error(ret)
+        finally:
+            lib.MPI_Group_free(target_group_p)
+    finally:
+        lib.MPI_Group_free(group_p)
+    return list(result)
+
+
+# Python objects cached on communicators, by the token stored in MPI
+_ATTRIBUTES = {}
+_ATTRIBUTE_TOKENS = itertools.count(1)
+# Function called with each object dropped by MPI, by attribute key
+_DELETE_FUNCTIONS = {}
+
+
+@ffi.def_extern(error=lib.MPI_ERR_OTHER)
+def yapympi_delete_attr(comm, keyval, attribute_val, extra_state):  # pylint: disable=unused-argument
+    """Drop the object of an attribute deleted by MPI."""
+    value = _ATTRIBUTES.pop(int(ffi.cast("intptr_t", attribute_val)), None)
+    delete_fn = _DELETE_FUNCTIONS.get(keyval)
+    if value is not None and delete_fn is not None:
+        try:
+            delete_fn(value)
+        except MPIError as e:
+            return e.errcode
+    return lib.MPI_SUCCESS
+
+
+def comm_create_keyval(delete_fn=None):
+    """Create a key for caching Python objects on communicators.
+
+    The objects are not copied to duplicates of a communicator and are
+    dropped when the communicator is freed, so a new communicator never
+    sees the objects of a freed one.
 
     Parameters
     ----------
-    request: MPI_Request*
-        Communication request
-    status : MPI_Status*
-        Status object
-        If status is None a new status object is created.
+    delete_fn : callable or None
+        Function called with each object when it is dropped: when its
+        communicator is freed, or the attribute is replaced or deleted.
+        It may make MPI calls, e.g. to free communicators it holds.
 
     Returns
     -------
-    flag : bool
-        True if operation completed
-    status : MPI_Status*
-        Status object
+    keyval : int
+        Attribute key
     """
-    flag = ffi.new("int*")
-    if status is None:
-        status = ffi.new("MPI_Status*")
-    ret = lib.MPI_Test(request, flag, status)
+    keyval = ffi.new("int*")
+    ret = lib.yapympi_comm_create_keyval(keyval)
     check_error(ret)
-    return flag[0], status
+    if delete_fn is not None:
+        _DELETE_FUNCTIONS[keyval[0]] = delete_fn
+    return keyval[0]
 
 
-def cancel(request):
-    """Cancel a communication request.
+def comm_set_attr(comm, keyval, value):
+    """Cache a Python object on a communicator.
 
     Parameters
     ----------
-    request : MPI_Request*
-        Communication request
+    comm : MPI_Comm
+        Communicator
+    keyval : int
+        Attribute key from comm_create_keyval
+    value : object
+        Object to cache; replaces the previous one
     """
-    ret = lib.MPI_Cancel(request)
+    token = next(_ATTRIBUTE_TOKENS)
+    _ATTRIBUTES[token] = value
+    ret = lib.MPI_Comm_set_attr(comm, keyval, ffi.cast("void*", token))
+    if ret != lib.MPI_SUCCESS:
+        del _ATTRIBUTES[token]
     check_error(ret)
 
 
-def waitany(requests, status=None):
-    """Wait for any specified MPI Request to complete.
+def comm_get_attr(comm, keyval, default=None):
+    """Return the Python object cached on a communicator.
 
     Parameters
     ----------
-    requests : MPI_Request[]
-        Array of requests
-    status : MPI_Status*
-        Status object
-        If status is None a new status object is created.
+    comm : MPI_Comm
+        Communicator
+    keyval : int
+        Attribute key from comm_create_keyval
+    default : object
+        Value returned if no object is cached
 
     Returns
     -------
-    indx : int
-        Index of handle for operation that completed (integer).
-        In the range 0 to len(requests) -1.
-    status : MPI_Status*
-        Status object.
+    value : object
+        The cached object, or default
     """
-    indx = ffi.new("int*")
-    if status is None:
-        status = ffi.new("MPI_Status*")
-    count = len(requests)
-    ret = lib.MPI_Waitany(count, requests, indx, status)
+    value_p = ffi.new("void**")
+    flag = ffi.new("int*")
+    ret = lib.MPI_Comm_get_attr(comm, keyval, value_p, flag)
     check_error(ret)
-    return indx[0], status
+    if not flag[0]:
+        return default
+    return _ATTRIBUTES.get(int(ffi.cast("intptr_t", value_p[0])), default)
 
 
-def waitall(requests, statuses=None):
-    """Wait for all given MPI Requests to complete.
+def comm_delete_attr(comm, keyval):
+    """Remove the Python object cached on a communicator, if any.
 
     Parameters
     ----------
-    requests : MPI_Request[]
-        Array of requests
-    statuses : MPI_Status[]
-        Array of status objects
-        If statuses is None an array of statues object will be created.
-
-    Returns
-    -------
-    statuses : list of MPI_Status*
+    comm : MPI_Comm
+        Communicator
+    keyval : int
+        Attribute key from comm_create_keyval
+    """
+    value_p = ffi.new("void**")
+    flag = ffi.new("int*")
+    ret = lib.MPI_Comm_get_attr(comm, keyval, value_p, flag)
+    check_error(ret)
+    if flag[0]:
+        ret = lib.MPI_Comm_delete_attr(comm, keyval)
+        check_error(ret)
+
+
+def type_size(datatype):
+    """Return the number of bytes occupied by entries in the datatype.
+
+    Parameters
+    ----------
+    datatype : MPI_Datatype
+        Datatype
+
+    Returns
+    -------
+    size : int
+        Datatype size in bytes
+    """
+    size = ffi.new("int*")
+    ret = lib.MPI_Type_size(datatype, size)
+    check_error(ret)
+    return size[0]
+
+
+# Buffer protocol format characters and their MPI datatypes
+_FORMAT_DATATYPES = {
+    "B": lib.MPI_BYTE,
+    "c": lib.MPI_CHAR,
+    "b": lib.MPI_SIGNED_CHAR,
+    "h": lib.MPI_SHORT,
+    "H": lib.MPI_UNSIGNED_SHORT,
+    "i": lib.MPI_INT,
+    "I": lib.MPI_UNSIGNED,
+    "l": lib.MPI_LONG,
+    "L": lib.MPI_UNSIGNED_LONG,
+    "q": lib.MPI_LONG_LONG,
+    "Q": lib.MPI_UNSIGNED_LONG_LONG,
+    "f": lib.MPI_FLOAT,
+    "d": lib.MPI_DOUBLE,
+}
+
+
+def buffer_datatype(buf):
+    """Return the MPI datatype matching the elements of a buffer.
+
+    Parameters
+    ----------
+    buf : bytes or any object supporting buffer interface
+        The buffer, e.g. a bytearray or a NumPy array
+
+    Returns
+    -------
+    datatype : MPI_Datatype
+        The matching predefined datatype
+    """
+    fmt = memoryview(buf).format.lstrip("@=")
+    native = "<" if sys.byteorder == "little" else ">"
+    if fmt[:1] == native:
+        fmt = fmt[1:]
+    try:
+        return _FORMAT_DATATYPES[fmt]
+    except KeyError:
+        raise ValueError("No MPI datatype for buffer format %r" % fmt) from None
+
+
+def _element_count(nbytes, size):
+    """Return the number of elements of size bytes in nbytes bytes."""
+    if nbytes % size:
+        raise ValueError("Buffer size %d is not a multiple of the datatype size %d" % (nbytes, size))
+    return nbytes // size
+
+
+def _buffer_count(cbuf, datatype):
+    """Return the number of datatype elements in cbuf."""
+    if datatype == lib.MPI_BYTE:
+        return len(cbuf)
+    return _element_count(len(cbuf), type_size(datatype))
+
+
+def _send_buffer(buf, datatype, size=None):
+    """Return the cdata and number of datatype elements of a send buffer.
+
+    bytes are copied into a char array, whose terminating NUL is sent
+    with MPI_BYTE but is not counted for other datatypes. size is the
+    size of datatype in bytes, if already known.
+    """
+    if isinstance(buf, bytes):
+        cbuf = ffi.new("char[]", buf)
+        nbytes = len(buf)
+    else:
+        cbuf = ffi.from_buffer("char[]", buf)
+        nbytes = len(cbuf)
+    if datatype == lib.MPI_BYTE:
+        return cbuf, len(cbuf)
+    if size is None:
+        size = type_size(datatype)
+    return cbuf, _element_count(nbytes, size)
+
+
+def send(buf, dest, tag, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE):
+    """Perform a blocking send.
+
+    Parameters
+    ----------
+    buf : bytes or any object supporting buffer interface
+        The send buffer
+    dest : int
+        Rank of destination
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each send buffer element
+    """
+    cbuf, count = _send_buffer(buf, datatype)
+
+    ret = lib.MPI_Send(cbuf, count, datatype, dest, tag, comm)
+    check_error(ret)
+
+
+def ssend(buf, dest, tag, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE):
+    """Perform a blocking synchronous send.
+
+    Returns only after the matching receive has started.
+
+    Parameters
+    ----------
+    buf : object supporting buffer interface
+        The send buffer
+    dest : int
+        Rank of destination
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each send buffer element
+    """
+    cbuf = ffi.from_buffer("char[]", buf)
+    count = _buffer_count(cbuf, datatype)
+
+    ret = lib.MPI_Ssend(cbuf, count, datatype, dest, tag, comm)
+    check_error(ret)
+
+
+def rsend(buf, dest, tag, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE):
+    """Perform a blocking ready send.
+
+    The matching receive must already be posted; the send can then skip
+    the handshake with the receiver. Otherwise the result is undefined.
+
+    Parameters
+    ----------
+    buf : object supporting buffer interface
+        The send buffer
+    dest : int
+        Rank of destination
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each send buffer element
+    """
+    cbuf = ffi.from_buffer("char[]", buf)
+    count = _buffer_count(cbuf, datatype)
+
+    ret = lib.MPI_Rsend(cbuf, count, datatype, dest, tag, comm)
+    check_error(ret)
+
+
+def bsend(buf, dest, tag, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE):
+    """Perform a blocking buffered send.
+
+    The message is copied into the buffer attached with buffer_attach,
+    so the call returns without waiting for the receiver.
+
+    Parameters
+    ----------
+    buf : object supporting buffer interface
+        The send buffer
+    dest : int
+        Rank of destination
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each send buffer element
+    """
+    cbuf = ffi.from_buffer("char[]", buf)
+    count = _buffer_count(cbuf, datatype)
+
+    ret = lib.MPI_Bsend(cbuf, count, datatype, dest, tag, comm)
+    check_error(ret)
+
+
+_ATTACHED_BUFFER = None
+
+
+def buffer_attach(size):
+    """Attach a buffer for buffered sends.
+
+    Only one buffer can be attached at a time.
+
+    Parameters
+    ----------
+    size : int
+        Size of the buffer in bytes.
+        Each pending buffered message needs its size plus
+        MPI_BSEND_OVERHEAD bytes.
+    """
+    global _ATTACHED_BUFFER  # pylint: disable=global-statement
+
+    buf = ffi.new("char[]", size)
+    ret = lib.MPI_Buffer_attach(buf, size)
+    check_error(ret)
+    _ATTACHED_BUFFER = buf
+
+
+def buffer_detach():
+    """Detach the buffer attached with buffer_attach.
+
+    Blocks until all messages in the buffer have been sent.
+
+    Returns
+    -------
+    size : int
+        Size of the detached buffer in bytes
+    """
+    global _ATTACHED_BUFFER  # pylint: disable=global-statement
+
+    addr = ffi.new("void**")
+    size = ffi.new("int*")
+    ret = lib.MPI_Buffer_detach(addr, size)
+    check_error(ret)
+    _ATTACHED_BUFFER = None
+    return size[0]
+
+
+def recv(
+    buf,
+    source=lib.MPI_ANY_SOURCE,
+    tag=lib.MPI_ANY_TAG,
+    comm=lib.MPI_COMM_WORLD,
+    datatype=lib.MPI_BYTE,
+    status=None,
+):
+    """Perform a blocking receive for a message.
+
+    Parameters
+    ----------
+    buf : a writable object supporting buffer interface
+        The receive buffer
+    source : int
+        Rank of source
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each receive buffer element
+    status : MPI_Status*
+        Status object
+        If status is None a new status object is created.
+
+    Returns
+    -------
+    status : MPI_Status*
+        Status object
+    """
+    cbuf = ffi.from_buffer("char[]", buf, require_writable=True)
+    count = _buffer_count(cbuf, datatype)
+    if status is None:
+        status = ffi.new("MPI_Status*")
+    ret = lib.MPI_Recv(cbuf, count, datatype, source, tag, comm, status)
+    check_error(ret)
+    return status
+
+
+def sendrecv(
+    sendbuf,
+    dest,
+    sendtag,
+    recvbuf,
+    source=lib.MPI_ANY_SOURCE,
+    recvtag=lib.MPI_ANY_TAG,
+    comm=lib.MPI_COMM_WORLD,
+    datatype=lib.MPI_BYTE,
+    status=None,
+):
+    """Send a message and receive a message in one call.
+
+    Unlike a send followed by a receive, this can not deadlock in
+    ring and shift patterns where every process sends and receives.
+
+    Parameters
+    ----------
+    sendbuf : object supporting buffer interface
+        The send buffer
+    dest : int
+        Rank of destination
+    sendtag : int
+        Tag of the sent message
+    recvbuf : a writable object supporting buffer interface
+        The receive buffer
+    source : int
+        Rank of source
+    recvtag : int
+        Tag of the received message
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each buffer element
+    status : MPI_Status*
+        Status object
+        If status is None a new status object is created.
+
+    Returns
+    -------
+    status : MPI_Status*
+        Status object of the receive
+    """
+    csendbuf = ffi.from_buffer("char[]", sendbuf)
+    crecvbuf = ffi.from_buffer("char[]", recvbuf, require_writable=True)
+    sendcount = _buffer_count(csendbuf, datatype)
+    recvcount = _buffer_count(crecvbuf, datatype)
+    if status is None:
+        status = ffi.new("MPI_Status*")
+
+    ret = lib.MPI_Sendrecv(
+        csendbuf, sendcount, datatype, dest, sendtag,
+        crecvbuf, recvcount, datatype, source, recvtag,
+        comm, status,
+    )
+    check_error(ret)
+    return status
+
+
+def sendrecv_replace(
+    buf,
+    dest,
+    sendtag,
+    source=lib.MPI_ANY_SOURCE,
+    recvtag=lib.MPI_ANY_TAG,
+    comm=lib.MPI_COMM_WORLD,
+    datatype=lib.MPI_BYTE,
+    status=None,
+):
+    """Send the contents of a buffer and replace them with a received message.
+
+    Parameters
+    ----------
+    buf : a writable object supporting buffer interface
+        The send and receive buffer
+    dest : int
+        Rank of destination
+    sendtag : int
+        Tag of the sent message
+    source : int
+        Rank of source
+    recvtag : int
+        Tag of the received message
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each buffer element
+    status : MPI_Status*
+        Status object
+        If status is None a new status object is created.
+
+    Returns
+    -------
+    status : MPI_Status*
+        Status object of the receive
+    """
+    cbuf = ffi.from_buffer("char[]", buf, require_writable=True)
+    count = _buffer_count(cbuf, datatype)
+    if status is None:
+        status = ffi.new("MPI_Status*")
+
+    ret = lib.MPI_Sendrecv_replace(cbuf, count, datatype, dest, sendtag, source, recvtag, comm, status)
+    check_error(ret)
+    return status
+
+
+def barrier(comm=lib.MPI_COMM_WORLD):
+    """Blocks until all processes in the communicator have reached this routine.
+
+    Parameters
+    ----------
+    comm : MPI_Comm
+        Communicator
+    """
+    ret = lib.MPI_Barrier(comm)
+    check_error(ret)
+
+
+def ibarrier(comm=lib.MPI_COMM_WORLD, request=None):
+    """Begin a nonblocking barrier.
+
+    The request completes when all processes in the communicator
+    have called ibarrier.
+
+    Parameters
+    ----------
+    comm : MPI_Comm
+        Communicator
+    request : MPI_Request*
+        Communication request
+        If request is None a new request object is created.
+
+    Returns
+    -------
+    request : MPI_Request*
+        Communication request
+    """
+    if request is None:
+        request = ffi.new("MPI_Request*")
+    ret = lib.MPI_Ibarrier(comm, request)
+    check_error(ret)
+    return request
+
+
+def probe(source=lib.MPI_ANY_SOURCE, tag=lib.MPI_ANY_TAG, comm=lib.MPI_COMM_WORLD, status=None):
+    """Block until a matching message is available, without receiving it.
+
+    Parameters
+    ----------
+    source : int
+        Rank of source
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    status : MPI_Status*
+        Status object
+        If status is None a new status object is created.
+
+    Returns
+    -------
+    status : MPI_Status*
+        Status object of the matched message
+    """
+    if status is None:
+        status = ffi.new("MPI_Status*")
+    ret = lib.MPI_Probe(source, tag, comm, status)
+    check_error(ret)
+    return status
+
+
+def iprobe(source=lib.MPI_ANY_SOURCE, tag=lib.MPI_ANY_TAG, comm=lib.MPI_COMM_WORLD, status=None):
+    """Test if a matching message is available, without receiving it.
+
+    Parameters
+    ----------
+    source : int
+        Rank of source
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    status : MPI_Status*
+        Status object
+        If status is None a new status object is created.
+
+    Returns
+    -------
+    flag : bool
+        True if a matching message is available
+    status : MPI_Status*
+        Status object of the matched message
+    """
+    flag = ffi.new("int*")
+    if status is None:
+        status = ffi.new("MPI_Status*")
+    ret = lib.MPI_Iprobe(source, tag, comm, flag, status)
+    check_error(ret)
+    return flag[0], status
+
+
+def isend(buf, dest, tag, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE, request=None):
+    """Begin a nonblocking send.
+
+    Parameters
+    ----------
+    buf : bytes or any object supporting buffer interface
+        The send buffer
+    dest : int
+        Rank of destination
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each send buffer element
+    request : MPI_Request*
+        Communication request
+        If request is None a new request object is created.
+
+    Returns
+    -------
+    request : MPI_Request*
+        Communication request
+    """
+    cbuf, count = _send_buffer(buf, datatype)
+    if request is None:
+        request = ffi.new("MPI_Request*")
+
+    ret = lib.MPI_Isend(cbuf, count, datatype, dest, tag, comm, request)
+    check_error(ret)
+
+    return request
+
+
+def issend(buf, dest, tag, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE, request=None):
+    """Begin a nonblocking synchronous send.
+
+    The request completes only after the matching receive has started.
+    The buffer must stay alive until the request completes.
+
+    Parameters
+    ----------
+    buf : object supporting buffer interface
+        The send buffer
+    dest : int
+        Rank of destination
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each send buffer element
+    request : MPI_Request*
+        Communication request
+        If request is None a new request object is created.
+
+    Returns
+    -------
+    request : MPI_Request*
+        Communication request
+    """
+    cbuf = ffi.from_buffer("char[]", buf)
+    count = _buffer_count(cbuf, datatype)
+    if request is None:
+        request = ffi.new("MPI_Request*")
+
+    ret = lib.MPI_Issend(cbuf, count, datatype, dest, tag, comm, request)
+    check_error(ret)
+
+    return request
+
+
+def irsend(buf, dest, tag, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE, request=None):
+    """Begin a nonblocking ready send.
+
+    The matching receive must already be posted.
+    The buffer must stay alive until the request completes.
+
+    Parameters
+    ----------
+    buf : object supporting buffer interface
+        The send buffer
+    dest : int
+        Rank of destination
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each send buffer element
+    request : MPI_Request*
+        Communication request
+        If request is None a new request object is created.
+
+    Returns
+    -------
+    request : MPI_Request*
+        Communication request
+    """
+    cbuf = ffi.from_buffer("char[]", buf)
+    count = _buffer_count(cbuf, datatype)
+    if request is None:
+        request = ffi.new("MPI_Request*")
+
+    ret = lib.MPI_Irsend(cbuf, count, datatype, dest, tag, comm, request)
+    check_error(ret)
+
+    return request
+
+
+def ibsend(buf, dest, tag, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE, request=None):
+    """Begin a nonblocking buffered send.
+
+    The message is copied into the buffer attached with buffer_attach.
+
+    Parameters
+    ----------
+    buf : object supporting buffer interface
+        The send buffer
+    dest : int
+        Rank of destination
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each send buffer element
+    request : MPI_Request*
+        Communication request
+        If request is None a new request object is created.
+
+    Returns
+    -------
+    request : MPI_Request*
+        Communication request
+    """
+    cbuf = ffi.from_buffer("char[]", buf)
+    count = _buffer_count(cbuf, datatype)
+    if request is None:
+        request = ffi.new("MPI_Request*")
+
+    ret = lib.MPI_Ibsend(cbuf, count, datatype, dest, tag, comm, request)
+    check_error(ret)
+
+    return request
+
+
+def irecv(
+    buf,
+    source=lib.MPI_ANY_SOURCE,
+    tag=lib.MPI_ANY_TAG,
+    comm=lib.MPI_COMM_WORLD,
+    datatype=lib.MPI_BYTE,
+    request=None,
+):
+    """Begin a nonblocking receive.
+
+    Parameters
+    ----------
+    buf : a writable object supporting buffer interface
+        The receive buffer
+    source : int
+        Rank of source
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each receive buffer element
+    request : MPI_Request*
+        Communication request
+        If request is None a new request object is created.
+
+    Returns
+    -------
+    request : MPI_Request*
+        Communication request
+    """
+    cbuf = ffi.from_buffer("char[]", buf, require_writable=True)
+    count = _buffer_count(cbuf, datatype)
+    if request is None:
+        request = ffi.new("MPI_Request*")
+    ret = lib.MPI_Irecv(cbuf, count, datatype, source, tag, comm, request)
+    check_error(ret)
+    return request
+
+
+def isendrecv(
+    sendbuf,
+    dest,
+    sendtag,
+    recvbuf,
+    source=lib.MPI_ANY_SOURCE,
+    recvtag=lib.MPI_ANY_TAG,
+    comm=lib.MPI_COMM_WORLD,
+    datatype=lib.MPI_BYTE,
+    requests=None,
+):
+    """Begin a nonblocking combined send and receive.
+
+    Uses MPI_Isendrecv when the MPI library supports it (MPI-4),
+    and an isend plus an irecv otherwise. Complete the returned
+    requests with waitall or testall.
+
+    Parameters
+    ----------
+    sendbuf : object supporting buffer interface
+        The send buffer
+    dest : int
+        Rank of destination
+    sendtag : int
+        Tag of the sent message
+    recvbuf : a writable object supporting buffer interface
+        The receive buffer
+    source : int
+        Rank of source
+    recvtag : int
+        Tag of the received message
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each buffer element
+    requests : RequestArray or None
+        Array the requests are added to.
+        If requests is None a new array is created.
+
+    Returns
+    -------
+    requests : RequestArray
+        The array holding the requests
+    """
+    if requests is None:
+        requests = RequestArray(2)
+    csendbuf = ffi.from_buffer("char[]", sendbuf)
+    crecvbuf = ffi.from_buffer("char[]", recvbuf, require_writable=True)
+    sendcount = _buffer_count(csendbuf, datatype)
+    recvcount = _buffer_count(crecvbuf, datatype)
+
+    if HAVE_ISENDRECV:
+        request = requests.add(None, (sendbuf, recvbuf))
+        ret = lib.yapympi_Isendrecv(
+            csendbuf, sendcount, datatype, dest, sendtag,
+            crecvbuf, recvcount, datatype, source, recvtag,
+            comm, request,
+        )
+        check_error(ret)
+        return requests
+
+    ret = lib.MPI_Irecv(crecvbuf, recvcount, datatype, source, recvtag, comm, requests.add(None, recvbuf))
+    check_error(ret)
+    ret = lib.MPI_Isend(csendbuf, sendcount, datatype, dest, sendtag, comm, requests.add(None, sendbuf))
+    check_error(ret)
+    return requests
+
+
+def isendrecv_replace(
+    buf,
+    dest,
+    sendtag,
+    source=lib.MPI_ANY_SOURCE,
+    recvtag=lib.MPI_ANY_TAG,
+    comm=lib.MPI_COMM_WORLD,
+    datatype=lib.MPI_BYTE,
+    requests=None,
+):
+    """Begin a nonblocking send of a buffer that is replaced by a received message.
+
+    Uses MPI_Isendrecv_replace when the MPI library supports it (MPI-4).
+    Otherwise the buffer is copied, and the copy is sent with isend while
+    irecv receives into the buffer. Complete the returned requests with
+    waitall or testall.
+
+    Parameters
+    ----------
+    buf : a writable object supporting buffer interface
+        The send and receive buffer
+    dest : int
+        Rank of destination
+    sendtag : int
+        Tag of the sent message
+    source : int
+        Rank of source
+    recvtag : int
+        Tag of the received message
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each buffer element
+    requests : RequestArray or None
+        Array the requests are added to.
+        If requests is None a new array is created.
+
+    Returns
+    -------
+    requests : RequestArray
+        The array holding the requests
+    """
+    if requests is None:
+        requests = RequestArray(2)
+    cbuf = ffi.from_buffer("char[]", buf, require_writable=True)
+    count = _buffer_count(cbuf, datatype)
+
+    if HAVE_ISENDRECV:
+        request = requests.add(None, buf)
+        ret = lib.yapympi_Isendrecv_replace(
+            cbuf, count, datatype, dest, sendtag, source, recvtag, comm, request
+        )
+        check_error(ret)
+        return requests
+
+    copy = ffi.new("char[]", len(cbuf))
+    ffi.memmove(copy, cbuf, len(cbuf))
+    ret = lib.MPI_Irecv(cbuf, count, datatype, source, recvtag, comm, requests.add(None, buf))
+    check_error(ret)
+    ret = lib.MPI_Isend(copy, count, datatype, dest, sendtag, comm, requests.add(None, copy))
+    check_error(ret)
+    return requests
+
+
+def _batch_arg(value, n):
+    """Return a list of n ints from an integer or a sequence of integers."""
+    try:
+        return [operator.index(value)] * n
+    except TypeError:
+        pass
+    value = [operator.index(v) for v in value]
+    if len(value) != n:
+        raise ValueError("Expected %d values; got %d" % (n, len(value)))
+    return value
+
+
+def isend_batch(
+    bufs,
+    dests,
+    tags,
+    comm=lib.MPI_COMM_WORLD,
+    datatype=lib.MPI_BYTE,
+    requests=None,
+    handles=None,
+):
+    """Begin nonblocking sends of many buffers in one call.
+
+    Parameters
+    ----------
+    bufs : sequence of bytes or objects supporting buffer interface
+        The send buffers, e.g. memoryview slices of one large buffer
+    dests : int or sequence of int
+        Rank of destination, for all or for each buffer
+    tags : int or sequence of int
+        Message tag, for all or for each buffer
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each send buffer element
+    requests : RequestArray
+        Array to post the requests into.
+        If requests is None a new array with capacity len(bufs) is created.
+    handles : sequence or None
+        Handle of each request, stored in the request array
+
+    Returns
+    -------
+    requests : RequestArray
+        Array of communication requests, which keeps the buffers alive
+        until the requests are removed
+
+    Raises
+    ------
+    MPIError
+        If posting a request fails. The requests posted before the
+        failure stay in the array and must still be completed;
+        the others are not added to it.
+    """
+    n = len(bufs)
+    dests = _batch_arg(dests, n)
+    tags = _batch_arg(tags, n)
+    # Invalid buffers are rejected before any slot is reserved
+    elsize = 1 if datatype == lib.MPI_BYTE else type_size(datatype)
+    sendbufs = [_send_buffer(buf, datatype, elsize) for buf in bufs]
+    cbufs = [cbuf for cbuf, _ in sendbufs]
+    counts = [count for _, count in sendbufs]
+
+    if requests is None:
+        requests = RequestArray(n)
+    start = requests.size
+    request_p = requests.reserve(n, handles)
+    posted = ffi.new("int*")
+    requests.buffers[start:] = cbufs
+
+    ret = lib.yapympi_isend_batch(
+        n,
+        ffi.new("void*[]", cbufs),
+        ffi.new("int[]", counts),
+        datatype,
+        ffi.new("int[]", dests),
+        ffi.new("int[]", tags),
+        comm,
+        request_p,
+        posted,
+    )
+    if ret != lib.MPI_SUCCESS:
+        # Drop the slots of the requests that were not posted
+        requests.remove(list(range(start + posted[0], requests.size)))
+    check_error(ret)
+
+    return requests
+
+
+def irecv_batch(
+    bufs,
+    sources=lib.MPI_ANY_SOURCE,
+    tags=lib.MPI_ANY_TAG,
+    comm=lib.MPI_COMM_WORLD,
+    datatype=lib.MPI_BYTE,
+    requests=None,
+    handles=None,
+):
+    """Begin nonblocking receives into many buffers in one call.
+
+    Parameters
+    ----------
+    bufs : sequence of writable objects supporting buffer interface
+        The receive buffers, e.g. memoryview slices of one large buffer
+    sources : int or sequence of int
+        Rank of source, for all or for each buffer
+    tags : int or sequence of int
+        Message tag, for all or for each buffer
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each receive buffer element
+    requests : RequestArray
+        Array to post the requests into.
+        If requests is None a new array with capacity len(bufs) is created.
+    handles : sequence or None
+        Handle of each request, stored in the request array
+
+    Returns
+    -------
+    requests : RequestArray
+        Array of communication requests, which keeps the buffers alive
+        until the requests are removed
+
+    Raises
+    ------
+    MPIError
+        If posting a request fails. The requests posted before the
+        failure stay in the array and must still be completed;
+        the others are not added to it.
+    """
+    n = len(bufs)
+    sources = _batch_arg(sources, n)
+    tags = _batch_arg(tags, n)
+    # Invalid buffers are rejected before any slot is reserved
+    cbufs = [ffi.from_buffer("char[]", buf, require_writable=True) for buf in bufs]
+    elsize = 1 if datatype == lib.MPI_BYTE else type_size(datatype)
+    counts = [_element_count(len(cbuf), elsize) for cbuf in cbufs]
+
+    if requests is None:
+        requests = RequestArray(n)
+    start = requests.size
+    request_p = requests.reserve(n, handles)
+    posted = ffi.new("int*")
+    requests.buffers[start:] = cbufs
+
+    ret = lib.yapympi_irecv_batch(
+        n,
+        ffi.new("void*[]", cbufs),
+        ffi.new("int[]", counts),
+        datatype,
+        ffi.new("int[]", sources),
+        ffi.new("int[]", tags),
+        comm,
+        request_p,
+        posted,
+    )
+    if ret != lib.MPI_SUCCESS:
+        # Drop the slots of the requests that were not posted
+        requests.remove(list(range(start + posted[0], requests.size)))
+    check_error(ret)
+
+    return requests
+
+
+def split_buffer(buf, offsets):
+    """Split a buffer into consecutive slices.
+
+    Parameters
+    ----------
+    buf : object supporting buffer interface
+        The buffer to split
+    offsets : sequence of int
+        Byte offsets of the slice boundaries,
+        starting with 0 and ending with the size of the slices' span.
+
+    Returns
+    -------
+    slices : list of memoryview
+        Slices buf[offsets[i]:offsets[i + 1]]
+    """
+    view = memoryview(buf).cast("B")
+    return [view[offsets[i] : offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+
+# Longest sleep between polls of a wait with a timeout
+_MAX_POLL_INTERVAL = 0.001
+
+
+def _poll(done, timeout):
+    """Call done until it returns True; raise MPITimeoutError after timeout seconds."""
+    deadline = time.monotonic() + timeout
+    delay = 0.0
+    while not done():
+        if time.monotonic() >= deadline:
+            raise MPITimeoutError(timeout)
+        time.sleep(delay)
+        delay = min(max(2 * delay, 1e-6), _MAX_POLL_INTERVAL)
+
+
+def wait(request, status=None, timeout=None):
+    """Wait for an MPI request to complete.
+
+    Parameters
+    ----------
+    request : MPI_Request*
+        Communication request
+    status : MPI_Status*
+        Status object
+        If status is None a new status object is created.
+    timeout : float or None
+        Maximum time to wait in seconds.
+        If None wait with MPI_Wait, else poll with MPI_Test.
+
+    Returns
+    -------
+    status : MPI_Status*
+        Status object
+
+    Raises
+    ------
+    MPITimeoutError
+        If the request did not complete within timeout;
+        it is then still active
+    """
+    if status is None:
+        status = ffi.new("MPI_Status*")
+    if timeout is None:
+        ret = lib.MPI_Wait(request, status)
+        check_error(ret)
+        return status
+
+    flag = ffi.new("int*")
+
+    def done():
+        check_error(lib.MPI_Test(request, flag, status))
+        return flag[0]
+
+    _poll(done, timeout)
+    return status
+
+
+def test(request, status=None):
+    """Test for the completion of a request.
+
+    Parameters
+    ----------
+    request: MPI_Request*
+        Communication request
+    status : MPI_Status*
+        Status object
+        If status is None a new status object is created.
+
+    Returns
+    -------
+    flag : bool
+        True if operation completed
+    status : MPI_Status*
+        Status object
+    """
+    flag = ffi.new("int*")
+    if status is None:
+        status = ffi.new("MPI_Status*")
+    ret = lib.MPI_Test(request, flag, status)
+    check_error(ret)
+    return flag[0], status
+
+
+def cancel(request):
+    """Cancel a communication request.
+
+    Parameters
+    ----------
+    request : MPI_Request*
+        Communication request
+    """
+    ret = lib.MPI_Cancel(request)
+    check_error(ret)
+
+
+def request_free(request):
+    """Free a communication request.
+
+    Parameters
+    ----------
+    request : MPI_Request*
+        Communication request
+    """
+    ret = lib.MPI_Request_free(request)
+    check_error(ret)
+
+
+def send_init(buf, dest, tag, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE, request=None):
+    """Create a persistent request for a standard send.
+
+    The buffer must stay alive until the request is freed.
+
+    Parameters
+    ----------
+    buf : object supporting buffer interface
+        The send buffer
+    dest : int
+        Rank of destination
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each send buffer element
+    request : MPI_Request*
+        Communication request
+        If request is None a new request object is created.
+
+    Returns
+    -------
+    request : MPI_Request*
+        Communication request
+    """
+    cbuf = ffi.from_buffer("char[]", buf)
+    count = _buffer_count(cbuf, datatype)
+    if request is None:
+        request = ffi.new("MPI_Request*")
+    ret = lib.MPI_Send_init(cbuf, count, datatype, dest, tag, comm, request)
+    check_error(ret)
+    return request
+
+
+def recv_init(
+    buf,
+    source=lib.MPI_ANY_SOURCE,
+    tag=lib.MPI_ANY_TAG,
+    comm=lib.MPI_COMM_WORLD,
+    datatype=lib.MPI_BYTE,
+    request=None,
+):
+    """Create a persistent request for a receive.
+
+    The buffer must stay alive until the request is freed.
+
+    Parameters
+    ----------
+    buf : a writable object supporting buffer interface
+        The receive buffer
+    source : int
+        Rank of source
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each receive buffer element
+    request : MPI_Request*
+        Communication request
+        If request is None a new request object is created.
+
+    Returns
+    -------
+    request : MPI_Request*
+        Communication request
+    """
+    cbuf = ffi.from_buffer("char[]", buf, require_writable=True)
+    count = _buffer_count(cbuf, datatype)
+    if request is None:
+        request = ffi.new("MPI_Request*")
+    ret = lib.MPI_Recv_init(cbuf, count, datatype, source, tag, comm, request)
+    check_error(ret)
+    return request
+
+
+def start(request):
+    """Start a persistent request.
+
+    Parameters
+    ----------
+    request : MPI_Request*
+        Communication request
+    """
+    ret = lib.MPI_Start(request)
+    check_error(ret)
+
+
+def startall(requests):
+    """Start a collection of persistent requests.
+
+    Parameters
+    ----------
+    requests : MPI_Request[] or RequestArray
+        Array of requests
+    """
+    requests, count = as_request_array(requests)
+    ret = lib.MPI_Startall(count, requests)
+    check_error(ret)
+
+
+def waitany(requests, status=None, timeout=None):
+    """Wait for any specified MPI Request to complete.
+
+    Parameters
+    ----------
+    requests : MPI_Request[] or RequestArray
+        Array of requests
+    status : MPI_Status*
+        Status object
+        If status is None a new status object is created.
+    timeout : float or None
+        Maximum time to wait in seconds.
+        If None wait with MPI_Waitany, else poll with MPI_Testany.
+
+    Returns
+    -------
+    indx : int
+        Index of handle for operation that completed (integer).
+        In the range 0 to len(requests) -1.
+    status : MPI_Status*
+        Status object.
+    """
+    indx = ffi.new("int*")
+    if status is None:
+        status = ffi.new("MPI_Status*")
+    requests, count = as_request_array(requests)
+    if timeout is None:
+        ret = lib.MPI_Waitany(count, requests, indx, status)
+        check_error(ret)
+        return indx[0], status
+
+    flag = ffi.new("int*")
+
+    def done():
+        check_error(lib.MPI_Testany(count, requests, indx, flag, status))
+        return flag[0]
+
+    _poll(done, timeout)
+    return indx[0], status
+
+
+def waitall(requests, statuses=None, timeout=None):
+    """Wait for all given MPI Requests to complete.
+
+    Parameters
+    ----------
+    requests : MPI_Request[] or RequestArray
+        Array of requests
+    statuses : MPI_Status[]
+        Array of status objects
+        If statuses is None an array of statues object will be created.
+    timeout : float or None
+        Maximum time to wait in seconds.
+        If None wait with MPI_Waitall, else poll with MPI_Testall.
+
+    Returns
+    -------
+    statuses : list of MPI_Status*
         Array of status objects
     """
+    requests, count = as_request_array(requests)
     if statuses is None:
-        statuses = ffi.new("MPI_Status[]", len(requests))
+        statuses = ffi.new("MPI_Status[]", count)
     else:
-        assert len(requests) == len(statuses)
-    count = len(requests)
-    ret = lib.MPI_Waitall(count, requests, statuses)
-    check_error_in_status(ret, statuses)
+        assert count == len(statuses)
+    if timeout is None:
+        ret = lib.MPI_Waitall(count, requests, statuses)
+        check_error_in_status(ret, statuses)
+        return statuses
+
+    flag = ffi.new("int*")
+
+    def done():
+        check_error_in_status(lib.MPI_Testall(count, requests, flag, statuses), statuses)
+        return flag[0]
 
+    _poll(done, timeout)
+    return statuses
 
-def waitsome(requests, statuses=None):
+
+def waitsome(requests, statuses=None, timeout=None):
     """Wait for some given MPI Requests to complete.
 
     Parameters
     ----------
-    requests : MPI_Request[]
+    requests : MPI_Request[] or RequestArray
         Array of requests
     statuses : MPI_Status[]
         Array of status objects
-        If statuses is None an array of statues object will be created.
+        If statuses is None an array of statues object will be created,
+        or for a RequestArray its own status array is used.
+    timeout : float or None
+        Maximum time to wait in seconds.
+        If None wait with MPI_Waitsome, else poll with MPI_Testsome.
 
     Returns
     -------
@@ -572,17 +1970,32 @@ def waitsome(requests, statuses=None):
     statuses : list of statuses
         Array of status objects
     """
+    indices = None
+    if isinstance(requests, RequestArray):
+        indices = requests.indices
+        if statuses is None:
+            statuses = requests.statuses[0 : len(requests)]
+    requests, incount = as_request_array(requests)
     if statuses is None:
-        statuses = ffi.new("MPI_Status[]", len(requests))
+        statuses = ffi.new("MPI_Status[]", incount)
     else:
-        assert len(requests) == len(statuses)
-    incount = len(requests)
+        assert incount == len(statuses)
     outcount = ffi.new("int*")
-    indices = ffi.new("int[]", incount)
-    ret = lib.MPI_Waitsome(incount, requests, outcount, indices, statuses)
-    check_error_in_status(ret, statuses)
+    if indices is None:
+        indices = ffi.new("int[]", incount)
+    if timeout is None:
+        ret = lib.MPI_Waitsome(incount, requests, outcount, indices, statuses)
+        check_error_in_status(ret, statuses)
+    else:
+
+        def done():
+            ret = lib.MPI_Testsome(incount, requests, outcount, indices, statuses)
+            check_error_in_status(ret, statuses)
+            return outcount[0] != 0
+
+        _poll(done, timeout)
 
-    indices = [indices[i] for i in range(outcount[0])]
+    indices = [indices[i] for i in range(max(outcount[0], 0))]
     return indices, statuses
 
 
@@ -591,7 +2004,7 @@ def testany(requests, status=None):
 
     Parameters
     ----------
-    requests : MPI_Request[]
+    requests : MPI_Request[] or RequestArray
         Array of requests
     status : MPI_Status*
         Status object
@@ -611,7 +2024,7 @@ def testany(requests, status=None):
     flag = ffi.new("int*")
     if status is None:
         status = ffi.new("MPI_Status*")
-    count = len(requests)
+    requests, count = as_request_array(requests)
     ret = lib.MPI_Testany(count, requests, indx, flag, status)
     check_error(ret)
     return bool(flag[0]), indx[0], status
@@ -622,7 +2035,7 @@ def testall(requests, statuses=None):
 
     Parameters
     ----------
-    requests : MPI_Request[]
+    requests : MPI_Request[] or RequestArray
         Array of requests
     statuses : MPI_Status[]
         Array of status objects
@@ -636,11 +2049,11 @@ def testall(requests, statuses=None):
         Array of status objects
     """
     flag = ffi.new("int*")
+    requests, count = as_request_array(requests)
     if statuses is None:
-        statuses = ffi.new("MPI_Status[]", len(requests))
+        statuses = ffi.new("MPI_Status[]", count)
     else:
-        assert len(requests) == len(statuses)
-    count = len(requests)
+        assert count == len(statuses)
     ret = lib.MPI_Testall(count, requests, flag, statuses)
     check_error_in_status(ret, statuses)
 
@@ -652,11 +2065,12 @@ def testsome(requests, statuses=None):
 
     Parameters
     ----------
-    requests : MPI_Request[]
+    requests : MPI_Request[] or RequestArray
         Array of requests
     statuses : MPI_Status[]
         Array of status objects
-        If statuses is None an array of statues object will be created.
+        If statuses is None an array of statues object will be created,
+        or for a RequestArray its own status array is used.
 
     Returns
     -------
@@ -665,17 +2079,23 @@ def testsome(requests, statuses=None):
     statuses : list of statuses
         Array of status objects
     """
+    indices = None
+    if isinstance(requests, RequestArray):
+        indices = requests.indices
+        if statuses is None:
+            statuses = requests.statuses[0 : len(requests)]
+    requests, incount = as_request_array(requests)
     if statuses is None:
-        statuses = ffi.new("MPI_Status[]", len(requests))
+        statuses = ffi.new("MPI_Status[]", incount)
     else:
-        assert len(requests) == len(statuses)
-    incount = len(requests)
+        assert incount == len(statuses)
     outcount = ffi.new("int*")
-    indices = ffi.new("int[]", incount)
+    if indices is None:
+        indices = ffi.new("int[]", incount)
     ret = lib.MPI_Testsome(incount, requests, outcount, indices, statuses)
     check_error_in_status(ret, statuses)
 
-    indices = [indices[i] for i in range(outcount[0])]
+    indices = [indices[i] for i in range(max(outcount[0], 0))]
     return indices, statuses
 
 
@@ -697,7 +2117,7 @@ def bcast(buf, root, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE):
         cbuf = ffi.from_buffer("char[]", buf)
     else:
         cbuf = ffi.from_buffer("char[]", buf, require_writable=True)
-    count = len(cbuf)
+    count = _buffer_count(cbuf, datatype)
 
     ret = lib.MPI_Bcast(cbuf, count, datatype, root, comm)
     check_error(ret)
@@ -724,7 +2144,7 @@ def ibcast(buf, root, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE, request=No
         cbuf = ffi.from_buffer("char[]", buf)
     else:
         cbuf = ffi.from_buffer("char[]", buf, require_writable=True)
-    count = len(cbuf)
+    count = _buffer_count(cbuf, datatype)
     if request is None:
         request = ffi.new("MPI_Request*")
 
@@ -732,3 +2152,417 @@ def ibcast(buf, root, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE, request=No
     check_error(ret)
 
     return request
+
+
+def psend_init(buf, partitions, dest, tag, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE):
+    """Create a partitioned send request.
+
+    Uses MPI_Psend_init when the MPI library supports it,
+    and one persistent send per partition otherwise.
+
+    Parameters
+    ----------
+    buf : object supporting buffer interface
+        The send buffer
+    partitions : int
+        Number of partitions; must divide the number of elements
+        of the buffer
+    dest : int
+        Rank of destination
+    tag : int
+        Message tag. Without MPI-4 support tags tag to
+        tag + partitions - 1 are used.
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each send buffer element
+
+    Returns
+    -------
+    request : PartitionedRequest
+        Partitioned communication request
+    """
+    return PartitionedRequest(True, buf, partitions, dest, tag, comm, datatype)
+
+
+def precv_init(buf, partitions, source, tag, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE):
+    """Create a partitioned receive request.
+
+    Uses MPI_Precv_init when the MPI library supports it,
+    and one persistent receive per partition otherwise.
+
+    Parameters
+    ----------
+    buf : a writable object supporting buffer interface
+        The receive buffer
+    partitions : int
+        Number of partitions; must divide the number of elements
+        of the buffer
+    source : int
+        Rank of source
+    tag : int
+        Message tag. Without MPI-4 support tags tag to
+        tag + partitions - 1 are used.
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of each receive buffer element
+
+    Returns
+    -------
+    request : PartitionedRequest
+        Partitioned communication request
+    """
+    return PartitionedRequest(False, buf, partitions, source, tag, comm, datatype)
+
+
+def pready(partition, request):
+    """Mark a partition of a started partitioned send as ready.
+
+    Parameters
+    ----------
+    partition : int
+        Index of the partition
+    request : PartitionedRequest
+        Partitioned send request
+    """
+    request.pready(partition)
+
+
+def parrived(request, partition):
+    """Test if a partition of a started partitioned receive has arrived.
+
+    Parameters
+    ----------
+    request : PartitionedRequest
+        Partitioned receive request
+    partition : int
+        Index of the partition
+
+    Returns
+    -------
+    flag : bool
+        True if the partition has arrived
+    """
+    return request.parrived(partition)
+
+
+def reduce(sendbuf, recvbuf, op=lib.MPI_SUM, root=0, comm=lib.MPI_COMM_WORLD, datatype=None):
+    """Reduce values on all processes to a single value on root.
+
+    Parameters
+    ----------
+    sendbuf : object supporting buffer interface
+        Send buffer
+    recvbuf : writable object supporting buffer interface or None
+        Receive buffer; only used on root
+    op : MPI_Op
+        Reduce operation
+    root : int
+        Rank of root process
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of the buffer elements
+        If datatype is None it is inferred from sendbuf.
+    """
+    if datatype is None:
+        datatype = buffer_datatype(sendbuf)
+    csendbuf = ffi.from_buffer("char[]", sendbuf)
+    if recvbuf is None:
+        crecvbuf = ffi.NULL
+    else:
+        crecvbuf = ffi.from_buffer("char[]", recvbuf, require_writable=True)
+    count = _buffer_count(csendbuf, datatype)
+
+    ret = lib.MPI_Reduce(csendbuf, crecvbuf, count, datatype, op, root, comm)
+    check_error(ret)
+
+
+def allreduce(sendbuf, recvbuf, op=lib.MPI_SUM, comm=lib.MPI_COMM_WORLD, datatype=None):
+    """Combine values from all processes and distribute the result to all processes.
+
+    Parameters
+    ----------
+    sendbuf : object supporting buffer interface
+        Send buffer
+    recvbuf : writable object supporting buffer interface
+        Receive buffer
+    op : MPI_Op
+        Reduce operation
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of the buffer elements
+        If datatype is None it is inferred from sendbuf.
+    """
+    if datatype is None:
+        datatype = buffer_datatype(sendbuf)
+    csendbuf = ffi.from_buffer("char[]", sendbuf)
+    crecvbuf = ffi.from_buffer("char[]", recvbuf, require_writable=True)
+    count = _buffer_count(csendbuf, datatype)
+
+    ret = lib.MPI_Allreduce(csendbuf, crecvbuf, count, datatype, op, comm)
+    check_error(ret)
+
+
+def gather(sendbuf, recvbuf, root=0, comm=lib.MPI_COMM_WORLD, datatype=None):
+    """Gather equal sized buffers from all processes on root.
+
+    Parameters
+    ----------
+    sendbuf : object supporting buffer interface
+        Send buffer
+    recvbuf : writable object supporting buffer interface or None
+        Receive buffer, comm_size times the size of sendbuf;
+        only used on root
+    root : int
+        Rank of root process
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of the buffer elements
+        If datatype is None it is inferred from sendbuf.
+    """
+    if datatype is None:
+        datatype = buffer_datatype(sendbuf)
+    csendbuf = ffi.from_buffer("char[]", sendbuf)
+    if recvbuf is None:
+        crecvbuf = ffi.NULL
+    else:
+        crecvbuf = ffi.from_buffer("char[]", recvbuf, require_writable=True)
+    count = _buffer_count(csendbuf, datatype)
+
+    ret = lib.MPI_Gather(csendbuf, count, datatype, crecvbuf, count, datatype, root, comm)
+    check_error(ret)
+
+
+def _displacements(counts):
+    """Return the exclusive prefix sums of counts."""
+    displs, total = [], 0
+    for c in counts:
+        displs.append(total)
+        total += c
+    return displs
+
+
+def gatherv(sendbuf, recvbuf, recvcounts, displs=None, root=0, comm=lib.MPI_COMM_WORLD, datatype=None):
+    """Gather variable sized buffers from all processes on root.
+
+    Parameters
+    ----------
+    sendbuf : object supporting buffer interface
+        Send buffer
+    recvbuf : writable object supporting buffer interface or None
+        Receive buffer; only used on root
+    recvcounts : sequence of int or None
+        Number of elements received from each process; only used on root
+    displs : sequence of int or None
+        Displacement (in elements) of the data from each process.
+        If None the data is stored contiguously in rank order.
+    root : int
+        Rank of root process
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of the buffer elements
+        If datatype is None it is inferred from sendbuf.
+    """
+    if datatype is None:
+        datatype = buffer_datatype(sendbuf)
+    csendbuf = ffi.from_buffer("char[]", sendbuf)
+    count = _buffer_count(csendbuf, datatype)
+    if recvbuf is None:
+        crecvbuf, crecvcounts, cdispls = ffi.NULL, ffi.NULL, ffi.NULL
+    else:
+        crecvbuf = ffi.from_buffer("char[]", recvbuf, require_writable=True)
+        if displs is None:
+            displs = _displacements(recvcounts)
+        crecvcounts = ffi.new("int[]", list(recvcounts))
+        cdispls = ffi.new("int[]", list(displs))
+
+    ret = lib.MPI_Gatherv(
+        csendbuf, count, datatype, crecvbuf, crecvcounts, cdispls, datatype, root, comm
+    )
+    check_error(ret)
+
+
+def scatterv(sendbuf, recvbuf, sendcounts, displs=None, root=0, comm=lib.MPI_COMM_WORLD, datatype=None):
+    """Scatter variable sized parts of a buffer on root to all processes.
+
+    Parameters
+    ----------
+    sendbuf : object supporting buffer interface or None
+        Send buffer; only used on root
+    recvbuf : writable object supporting buffer interface
+        Receive buffer
+    sendcounts : sequence of int or None
+        Number of elements sent to each process; only used on root
+    displs : sequence of int or None
+        Displacement (in elements) of the data sent to each process.
+        If None the data is taken contiguously in rank order.
+    root : int
+        Rank of root process
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of the buffer elements
+        If datatype is None it is inferred from recvbuf.
+    """
+    if datatype is None:
+        datatype = buffer_datatype(recvbuf)
+    crecvbuf = ffi.from_buffer("char[]", recvbuf, require_writable=True)
+    count = _buffer_count(crecvbuf, datatype)
+    if sendbuf is None:
+        csendbuf, csendcounts, cdispls = ffi.NULL, ffi.NULL, ffi.NULL
+    else:
+        csendbuf = ffi.from_buffer("char[]", sendbuf)
+        if displs is None:
+            displs = _displacements(sendcounts)
+        csendcounts = ffi.new("int[]", list(sendcounts))
+        cdispls = ffi.new("int[]", list(displs))
+
+    ret = lib.MPI_Scatterv(
+        csendbuf, csendcounts, cdispls, datatype, crecvbuf, count, datatype, root, comm
+    )
+    check_error(ret)
+
+
+def allgather(sendbuf, recvbuf, comm=lib.MPI_COMM_WORLD, datatype=None):
+    """Gather equal sized buffers from all processes and distribute them to all.
+
+    Parameters
+    ----------
+    sendbuf : object supporting buffer interface
+        Send buffer
+    recvbuf : writable object supporting buffer interface
+        Receive buffer, comm_size times the size of sendbuf
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of the buffer elements
+        If datatype is None it is inferred from sendbuf.
+    """
+    if datatype is None:
+        datatype = buffer_datatype(sendbuf)
+    csendbuf = ffi.from_buffer("char[]", sendbuf)
+    crecvbuf = ffi.from_buffer("char[]", recvbuf, require_writable=True)
+    count = _buffer_count(csendbuf, datatype)
+
+    ret = lib.MPI_Allgather(csendbuf, count, datatype, crecvbuf, count, datatype, comm)
+    check_error(ret)
+
+
+def allgatherv(sendbuf, recvbuf, recvcounts, displs=None, comm=lib.MPI_COMM_WORLD, datatype=None):
+    """Gather variable sized buffers from all processes and distribute them to all.
+
+    Parameters
+    ----------
+    sendbuf : object supporting buffer interface
+        Send buffer
+    recvbuf : writable object supporting buffer interface
+        Receive buffer
+    recvcounts : sequence of int
+        Number of elements received from each process
+    displs : sequence of int or None
+        Displacement (in elements) of the data from each process.
+        If None the data is stored contiguously in rank order.
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of the buffer elements
+        If datatype is None it is inferred from sendbuf.
+    """
+    if datatype is None:
+        datatype = buffer_datatype(sendbuf)
+    csendbuf = ffi.from_buffer("char[]", sendbuf)
+    crecvbuf = ffi.from_buffer("char[]", recvbuf, require_writable=True)
+    count = _buffer_count(csendbuf, datatype)
+    if displs is None:
+        displs = _displacements(recvcounts)
+    crecvcounts = ffi.new("int[]", list(recvcounts))
+    cdispls = ffi.new("int[]", list(displs))
+
+    ret = lib.MPI_Allgatherv(
+        csendbuf, count, datatype, crecvbuf, crecvcounts, cdispls, datatype, comm
+    )
+    check_error(ret)
+
+
+def alltoall(sendbuf, recvbuf, comm=lib.MPI_COMM_WORLD, datatype=None):
+    """Send a distinct, equal sized block of data to every process.
+
+    Parameters
+    ----------
+    sendbuf : object supporting buffer interface
+        Send buffer; block i is sent to process i
+    recvbuf : writable object supporting buffer interface
+        Receive buffer, same size as sendbuf; block i is received from process i
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of the buffer elements
+        If datatype is None it is inferred from sendbuf.
+    """
+    if datatype is None:
+        datatype = buffer_datatype(sendbuf)
+    csendbuf = ffi.from_buffer("char[]", sendbuf)
+    crecvbuf = ffi.from_buffer("char[]", recvbuf, require_writable=True)
+    size = comm_size(comm)
+    count = _buffer_count(csendbuf, datatype) // size
+
+    ret = lib.MPI_Alltoall(csendbuf, count, datatype, crecvbuf, count, datatype, comm)
+    check_error(ret)
+
+
+def alltoallv(
+    sendbuf,
+    sendcounts,
+    recvbuf,
+    recvcounts,
+    sdispls=None,
+    rdispls=None,
+    comm=lib.MPI_COMM_WORLD,
+    datatype=None,
+):
+    """Send a distinct, variable sized block of data to every process.
+
+    Parameters
+    ----------
+    sendbuf : object supporting buffer interface
+        Send buffer
+    sendcounts : sequence of int
+        Number of elements sent to each process
+    recvbuf : writable object supporting buffer interface
+        Receive buffer
+    recvcounts : sequence of int
+        Number of elements received from each process
+    sdispls : sequence of int or None
+        Displacement (in elements) of the data for each process.
+        If None the data is taken contiguously in rank order.
+    rdispls : sequence of int or None
+        Displacement (in elements) of the data from each process.
+        If None the data is stored contiguously in rank order.
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of the buffer elements
+        If datatype is None it is inferred from sendbuf.
+    """
+    if datatype is None:
+        datatype = buffer_datatype(sendbuf)
+    csendbuf = ffi.from_buffer("char[]", sendbuf)
+    crecvbuf = ffi.from_buffer("char[]", recvbuf, require_writable=True)
+    if sdispls is None:
+        sdispls = _displacements(sendcounts)
+    if rdispls is None:
+        rdispls = _displacements(recvcounts)
+    csendcounts = ffi.new("int[]", list(sendcounts))
+    csdispls = ffi.new("int[]", list(sdispls))
+    crecvcounts = ffi.new("int[]", list(recvcounts))
+    crdispls = ffi.new("int[]", list(rdispls))
+
+    ret = lib.MPI_Alltoallv(
+        csendbuf, csendcounts, csdispls, datatype, crecvbuf, crecvcounts, crdispls, datatype, comm
+    )
+    check_error(ret)
@@ -72,6 +72,185 @@ def get_mpi_handle_type(tmpdir=None):
         os.remove(c_file.name)
 
 
+# C source of the module.
+# Functions introduced after MPI-3 are called through yapympi_* shims,
+# which return MPI_ERR_UNSUPPORTED_OPERATION when the MPI library is too old.
+# The YAPYMPI_HAVE_* constants tell which of the shims are functional.
+# The yapympi_* helpers at the end run loops over request and status
+# arrays in C, replacing one Python level call per element.
+C_SOURCE = """
+#include <stdlib.h>
+#include <mpi.h>
+
+#if MPI_VERSION >= 4
+#define YAPYMPI_HAVE_PARTITIONED 1
+
+static int yapympi_Psend_init(const void *buf, int partitions, long long count, MPI_Datatype datatype, int dest, int tag, MPI_Comm comm, MPI_Request *request)
+{
+    return MPI_Psend_init(buf, partitions, (MPI_Count) count, datatype, dest, tag, comm, MPI_INFO_NULL, request);
+}
+
+static int yapympi_Precv_init(void *buf, int partitions, long long count, MPI_Datatype datatype, int source, int tag, MPI_Comm comm, MPI_Request *request)
+{
+    return MPI_Precv_init(buf, partitions, (MPI_Count) count, datatype, source, tag, comm, MPI_INFO_NULL, request);
+}
+
+static int yapympi_Pready(int partition, MPI_Request request)
+{
+    return MPI_Pready(partition, request);
+}
+
+static int yapympi_Parrived(MPI_Request request, int partition, int *flag)
+{
+    return MPI_Parrived(request, partition, flag);
+}
+#else
+#define YAPYMPI_HAVE_PARTITIONED 0
+
+static int yapympi_Psend_init(const void *buf, int partitions, long long count, MPI_Datatype datatype, int dest, int tag, MPI_Comm comm, MPI_Request *request)
+{
+    return MPI_ERR_UNSUPPORTED_OPERATION;
+}
+
+static int yapympi_Precv_init(void *buf, int partitions, long long count, MPI_Datatype datatype, int source, int tag, MPI_Comm comm, MPI_Request *request)
+{
+    return MPI_ERR_UNSUPPORTED_OPERATION;
+}
+
+static int yapympi_Pready(int partition, MPI_Request request)
+{
+    return MPI_ERR_UNSUPPORTED_OPERATION;
+}
+
+static int yapympi_Parrived(MPI_Request request, int partition, int *flag)
+{
+    return MPI_ERR_UNSUPPORTED_OPERATION;
+}
+#endif
+
+#if MPI_VERSION >= 4
+#define YAPYMPI_HAVE_ISENDRECV 1
+
+static int yapympi_Isendrecv(const void *sendbuf, int sendcount, MPI_Datatype sendtype, int dest, int sendtag, void *recvbuf, int recvcount, MPI_Datatype recvtype, int source, int recvtag, MPI_Comm comm, MPI_Request *request)
+{
+    return MPI_Isendrecv(sendbuf, sendcount, sendtype, dest, sendtag, recvbuf, recvcount, recvtype, source, recvtag, comm, request);
+}
+
+static int yapympi_Isendrecv_replace(void *buf, int count, MPI_Datatype datatype, int dest, int sendtag, int source, int recvtag, MPI_Comm comm, MPI_Request *request)
+{
+    return MPI_Isendrecv_replace(buf, count, datatype, dest, sendtag, source, recvtag, comm, request);
+}
+#else
+#define YAPYMPI_HAVE_ISENDRECV 0
+
+static int yapympi_Isendrecv(const void *sendbuf, int sendcount, MPI_Datatype sendtype, int dest, int sendtag, void *recvbuf, int recvcount, MPI_Datatype recvtype, int source, int recvtag, MPI_Comm comm, MPI_Request *request)
+{
+    return MPI_ERR_UNSUPPORTED_OPERATION;
+}
+
+static int yapympi_Isendrecv_replace(void *buf, int count, MPI_Datatype datatype, int dest, int sendtag, int source, int recvtag, MPI_Comm comm, MPI_Request *request)
+{
+    return MPI_ERR_UNSUPPORTED_OPERATION;
+}
+#endif
+
+static int yapympi_compare_desc(const void *a, const void *b)
+{
+    return *(const int *) b - *(const int *) a;
+}
+
+/* MPI_Testsome, then remove the completed requests by moving the last
+   active requests into their slots, highest index first. The removal is
+   recorded in moves as outcount (dst, src) pairs, src = -1 when nothing
+   is moved, so the caller can apply the same moves to its own arrays. */
+static int yapympi_testsome_compact(int *size, MPI_Request requests[], int *outcount, int indices[], MPI_Status statuses[], int moves[])
+{
+    int i, idx, last;
+    int ret = MPI_Testsome(*size, requests, outcount, indices, statuses);
+
+    if ((ret != MPI_SUCCESS && ret != MPI_ERR_IN_STATUS) || *outcount == MPI_UNDEFINED) {
+        *outcount = 0;
+        return ret;
+    }
+
+    for (i = 0; i < *outcount; i++)
+        moves[2 * i] = indices[i];
+    qsort(moves, *outcount, 2 * sizeof(int), yapympi_compare_desc);
+
+    for (i = 0; i < *outcount; i++) {
+        idx = moves[2 * i];
+        last = *size - 1;
+        if (idx < last) {
+            requests[idx] = requests[last];
+            moves[2 * i + 1] = last;
+        } else {
+            moves[2 * i + 1] = -1;
+        }
+        requests[last] = MPI_REQUEST_NULL;
+        *size = last;
+    }
+    return ret;
+}
+
+/* Post n nonblocking sends; stops at the first error.
+   posted is set to the number of requests posted. */
+static int yapympi_isend_batch(int n, void *const bufs[], const int counts[], MPI_Datatype datatype, const int dests[], const int tags[], MPI_Comm comm, MPI_Request requests[], int *posted)
+{
+    int i, ret = MPI_SUCCESS;
+
+    for (i = 0; i < n; i++) {
+        ret = MPI_Isend(bufs[i], counts[i], datatype, dests[i], tags[i], comm, requests + i);
+        if (ret != MPI_SUCCESS)
+            break;
+    }
+    *posted = i;
+    return ret;
+}
+
+/* Post n nonblocking receives; stops at the first error.
+   posted is set to the number of requests posted. */
+static int yapympi_irecv_batch(int n, void *const bufs[], const int counts[], MPI_Datatype datatype, const int sources[], const int tags[], MPI_Comm comm, MPI_Request requests[], int *posted)
+{
+    int i, ret = MPI_SUCCESS;
+
+    for (i = 0; i < n; i++) {
+        ret = MPI_Irecv(bufs[i], counts[i], datatype, sources[i], tags[i], comm, requests + i);
+        if (ret != MPI_SUCCESS)
+            break;
+    }
+    *posted = i;
+    return ret;
+}
+
+/* Copy source, tag, error and count of n statuses into table[n][4]. */
+static int yapympi_status_table(int n, const MPI_Status statuses[], MPI_Datatype datatype, int table[])
+{
+    int i, ret;
+
+    for (i = 0; i < n; i++) {
+        table[4 * i] = statuses[i].MPI_SOURCE;
+        table[4 * i + 1] = statuses[i].MPI_TAG;
+        table[4 * i + 2] = statuses[i].MPI_ERROR;
+        ret = MPI_Get_count(&statuses[i], datatype, &table[4 * i + 3]);
+        if (ret != MPI_SUCCESS)
+            return ret;
+    }
+    return MPI_SUCCESS;
+}
+
+/* Delete callback of Python attributes; defined with ffi.def_extern in
+   yapympi.base. */
+static int yapympi_delete_attr(MPI_Comm comm, int keyval, void *attribute_val, void *extra_state);
+
+/* Create a communicator attribute key whose values are not copied to
+   duplicates and are released by yapympi_delete_attr. */
+static int yapympi_comm_create_keyval(int *keyval)
+{
+    return MPI_Comm_create_keyval(MPI_COMM_NULL_COPY_FN, yapympi_delete_attr, keyval, NULL);
+}
+"""
+
+
 # Do not execute get_mpi_handle_type(), which has "side effects"
 # Unless this script has been called as main.
 if __name__ == "__main__":
@@ -87,6 +266,9 @@ if MPI_HANDLE_TYPE == "int":
         typedef int... MPI_Datatype;
         typedef int... MPI_Request;
         typedef int... MPI_Errhandler;
+        typedef int... MPI_Op;
+        typedef int... MPI_Info;
+        typedef int... MPI_Group;
     """
     )
 else:  # MPI_HANDLE_TYPE == "pointer":
@@ -96,6 +278,9 @@ else:  # MPI_HANDLE_TYPE == "pointer":
         typedef ... *MPI_Datatype;
         typedef ... *MPI_Request;
         typedef ... *MPI_Errhandler;
+        typedef ... *MPI_Op;
+        typedef ... *MPI_Info;
+        typedef ... *MPI_Group;
     """
     )
 
@@ -109,22 +294,83 @@ FFIBUILDER.cdef(
     } MPI_Status;
 
     const MPI_Comm MPI_COMM_WORLD;
+    const MPI_Comm MPI_COMM_NULL;
+    const MPI_Info MPI_INFO_NULL;
+    void *const MPI_IN_PLACE;
+
     const MPI_Datatype MPI_BYTE;
+    const MPI_Datatype MPI_CHAR;
+    const MPI_Datatype MPI_SIGNED_CHAR;
+    const MPI_Datatype MPI_UNSIGNED_CHAR;
+    const MPI_Datatype MPI_SHORT;
+    const MPI_Datatype MPI_UNSIGNED_SHORT;
+    const MPI_Datatype MPI_INT;
+    const MPI_Datatype MPI_UNSIGNED;
+    const MPI_Datatype MPI_LONG;
+    const MPI_Datatype MPI_UNSIGNED_LONG;
+    const MPI_Datatype MPI_LONG_LONG;
+    const MPI_Datatype MPI_UNSIGNED_LONG_LONG;
+    const MPI_Datatype MPI_FLOAT;
+    const MPI_Datatype MPI_DOUBLE;
+
+    const MPI_Op MPI_MAX;
+    const MPI_Op MPI_MIN;
+    const MPI_Op MPI_SUM;
+    const MPI_Op MPI_PROD;
+    const MPI_Op MPI_LAND;
+    const MPI_Op MPI_BAND;
+    const MPI_Op MPI_LOR;
+    const MPI_Op MPI_BOR;
+
+    const int MPI_UNDEFINED;
+    const int MPI_COMM_TYPE_SHARED;
     MPI_Status *const MPI_STATUS_IGNORE;
+    const MPI_Request MPI_REQUEST_NULL;
     const MPI_Errhandler MPI_ERRORS_RETURN;
     const MPI_Errhandler MPI_ERRORS_ARE_FATAL;
 
     const int MPI_ANY_SOURCE;
+    const int MPI_PROC_NULL;
     const int MPI_ANY_TAG;
     const int MPI_MAX_PROCESSOR_NAME;
     const int MPI_MAX_ERROR_STRING;
+    const int MPI_BSEND_OVERHEAD;
     const int MPI_SUCCESS;
     const int MPI_ERR_IN_STATUS;
+    const int MPI_ERR_UNSUPPORTED_OPERATION;
+    const int MPI_ERR_BUFFER;
+    const int MPI_ERR_COUNT;
+    const int MPI_ERR_TYPE;
+    const int MPI_ERR_TAG;
+    const int MPI_ERR_COMM;
+    const int MPI_ERR_RANK;
+    const int MPI_ERR_REQUEST;
+    const int MPI_ERR_ROOT;
+    const int MPI_ERR_GROUP;
+    const int MPI_ERR_OP;
+    const int MPI_ERR_ARG;
+    const int MPI_ERR_UNKNOWN;
+    const int MPI_ERR_TRUNCATE;
+    const int MPI_ERR_OTHER;
+    const int MPI_ERR_INTERN;
+    const int MPI_ERR_PENDING;
+    const int MPI_ERR_NO_MEM;
+
+    const int MPI_THREAD_SINGLE;
+    const int MPI_THREAD_FUNNELED;
+    const int MPI_THREAD_SERIALIZED;
+    const int MPI_THREAD_MULTIPLE;
 
     int MPI_Error_string(int errorcode, char *string, int *resultlen);
+    int MPI_Error_class(int errorcode, int *errorclass);
     int MPI_Comm_set_errhandler(MPI_Comm comm, MPI_Errhandler errhandler);
 
     int MPI_Init(int *argc, char ***argv);
+    int MPI_Init_thread(int *argc, char ***argv, int required, int *provided);
+    int MPI_Query_thread(int *provided);
+    int MPI_Is_thread_main(int *flag);
+    int MPI_Initialized(int *flag);
+    int MPI_Finalized(int *flag);
     int MPI_Finalize(void);
     int MPI_Abort(MPI_Comm comm, int errorcode);
 
@@ -132,17 +378,52 @@ FFIBUILDER.cdef(
     int MPI_Comm_size(MPI_Comm comm, int *size);
     int MPI_Get_processor_name(char *name, int *resultlen);
 
+    int MPI_Comm_dup(MPI_Comm comm, MPI_Comm *newcomm);
+    int MPI_Comm_split(MPI_Comm comm, int color, int key, MPI_Comm *newcomm);
+    int MPI_Comm_split_type(MPI_Comm comm, int split_type, int key, MPI_Info info, MPI_Comm *newcomm);
+    int MPI_Comm_free(MPI_Comm *comm);
+    int MPI_Comm_set_attr(MPI_Comm comm, int comm_keyval, void *attribute_val);
+    int MPI_Comm_get_attr(MPI_Comm comm, int comm_keyval, void *attribute_val, int *flag);
+    int MPI_Comm_delete_attr(MPI_Comm comm, int comm_keyval);
+    int MPI_Comm_group(MPI_Comm comm, MPI_Group *group);
+    int MPI_Group_translate_ranks(MPI_Group group1, int n, const int ranks1[], MPI_Group group2, int ranks2[]);
+    int MPI_Group_free(MPI_Group *group);
+
+    int MPI_Type_size(MPI_Datatype datatype, int *size);
+
+    double MPI_Wtime(void);
+    double MPI_Wtick(void);
+
     int MPI_Get_count(const MPI_Status *status, MPI_Datatype datatype, int *count);
 
     int MPI_Send(const void *buf, int count, MPI_Datatype datatype, int dest, int tag, MPI_Comm comm);
+    int MPI_Ssend(const void *buf, int count, MPI_Datatype datatype, int dest, int tag, MPI_Comm comm);
+    int MPI_Rsend(const void *buf, int count, MPI_Datatype datatype, int dest, int tag, MPI_Comm comm);
+    int MPI_Bsend(const void *buf, int count, MPI_Datatype datatype, int dest, int tag, MPI_Comm comm);
+    int MPI_Sendrecv(const void *sendbuf, int sendcount, MPI_Datatype sendtype, int dest, int sendtag, void *recvbuf, int recvcount, MPI_Datatype recvtype, int source, int recvtag, MPI_Comm comm, MPI_Status *status);
+    int MPI_Sendrecv_replace(void *buf, int count, MPI_Datatype datatype, int dest, int sendtag, int source, int recvtag, MPI_Comm comm, MPI_Status *status);
+    int MPI_Buffer_attach(void *buffer, int size);
+    int MPI_Buffer_detach(void *buffer_addr, int *size);
     int MPI_Recv(void *buf, int count, MPI_Datatype datatype, int source, int tag, MPI_Comm comm, MPI_Status *status);
     int MPI_Barrier(MPI_Comm comm);
+    int MPI_Ibarrier(MPI_Comm comm, MPI_Request *request);
+    int MPI_Probe(int source, int tag, MPI_Comm comm, MPI_Status *status);
+    int MPI_Iprobe(int source, int tag, MPI_Comm comm, int *flag, MPI_Status *status);
 
     int MPI_Isend(const void *buf, int count, MPI_Datatype datatype, int dest, int tag, MPI_Comm comm, MPI_Request *request);
+    int MPI_Issend(const void *buf, int count, MPI_Datatype datatype, int dest, int tag, MPI_Comm comm, MPI_Request *request);
+    int MPI_Irsend(const void *buf, int count, MPI_Datatype datatype, int dest, int tag, MPI_Comm comm, MPI_Request *request);
+    int MPI_Ibsend(const void *buf, int count, MPI_Datatype datatype, int dest, int tag, MPI_Comm comm, MPI_Request *request);
     int MPI_Irecv(void *buf, int count, MPI_Datatype datatype, int source, int tag, MPI_Comm comm, MPI_Request *request);
     int MPI_Wait(MPI_Request *request, MPI_Status *status);
     int MPI_Test(MPI_Request *request, int *flag, MPI_Status *status);
     int MPI_Cancel(MPI_Request * request);
+    int MPI_Request_free(MPI_Request *request);
+
+    int MPI_Send_init(const void *buf, int count, MPI_Datatype datatype, int dest, int tag, MPI_Comm comm, MPI_Request *request);
+    int MPI_Recv_init(void *buf, int count, MPI_Datatype datatype, int source, int tag, MPI_Comm comm, MPI_Request *request);
+    int MPI_Start(MPI_Request *request);
+    int MPI_Startall(int count, MPI_Request array_of_requests[]);
 
     int MPI_Waitany(int count, MPI_Request array_of_requests[], int *index, MPI_Status *status);
     int MPI_Waitsome(int incount, MPI_Request array_of_requests[], int *outcount, int array_of_indices[], MPI_Status array_of_statuses[]);
@@ -151,10 +432,47 @@ FFIBUILDER.cdef(
     int MPI_Testany(int count, MPI_Request array_of_requests[], int *index, int *flag, MPI_Status *status);
     int MPI_Testsome(int incount, MPI_Request array_of_requests[], int *outcount, int array_of_indices[], MPI_Status array_of_statuses[]);
     int MPI_Testall(int count, MPI_Request array_of_requests[], int *flag, MPI_Status array_of_statuses[]);
+
+    int MPI_Bcast(void *buffer, int count, MPI_Datatype datatype, int root, MPI_Comm comm);
+    int MPI_Ibcast(void *buffer, int count, MPI_Datatype datatype, int root, MPI_Comm comm, MPI_Request *request);
+    int MPI_Reduce(const void *sendbuf, void *recvbuf, int count, MPI_Datatype datatype, MPI_Op op, int root, MPI_Comm comm);
+    int MPI_Allreduce(const void *sendbuf, void *recvbuf, int count, MPI_Datatype datatype, MPI_Op op, MPI_Comm comm);
+    int MPI_Gather(const void *sendbuf, int sendcount, MPI_Datatype sendtype, void *recvbuf, int recvcount, MPI_Datatype recvtype, int root, MPI_Comm comm);
+    int MPI_Gatherv(const void *sendbuf, int sendcount, MPI_Datatype sendtype, void *recvbuf, const int recvcounts[], const int displs[], MPI_Datatype recvtype, int root, MPI_Comm comm);
+    int MPI_Scatterv(const void *sendbuf, const int sendcounts[], const int displs[], MPI_Datatype sendtype, void *recvbuf, int recvcount, MPI_Datatype recvtype, int root, MPI_Comm comm);
+    int MPI_Allgather(const void *sendbuf, int sendcount, MPI_Datatype sendtype, void *recvbuf, int recvcount, MPI_Datatype recvtype, MPI_Comm comm);
+    int MPI_Allgatherv(const void *sendbuf, int sendcount, MPI_Datatype sendtype, void *recvbuf, const int recvcounts[], const int displs[], MPI_Datatype recvtype, MPI_Comm comm);
+    int MPI_Alltoall(const void *sendbuf, int sendcount, MPI_Datatype sendtype, void *recvbuf, int recvcount, MPI_Datatype recvtype, MPI_Comm comm);
+    int MPI_Alltoallv(const void *sendbuf, const int sendcounts[], const int sdispls[], MPI_Datatype sendtype, void *recvbuf, const int recvcounts[], const int rdispls[], MPI_Datatype recvtype, MPI_Comm comm);
+"""
+)
+
+# Functions of API mode modules are called with the GIL released.
+FFIBUILDER.cdef(
+    """
+    #define YAPYMPI_HAVE_PARTITIONED ...
+
+    int yapympi_Psend_init(const void *buf, int partitions, long long count, MPI_Datatype datatype, int dest, int tag, MPI_Comm comm, MPI_Request *request);
+    int yapympi_Precv_init(void *buf, int partitions, long long count, MPI_Datatype datatype, int source, int tag, MPI_Comm comm, MPI_Request *request);
+    int yapympi_Pready(int partition, MPI_Request request);
+    int yapympi_Parrived(MPI_Request request, int partition, int *flag);
+
+    #define YAPYMPI_HAVE_ISENDRECV ...
+
+    int yapympi_Isendrecv(const void *sendbuf, int sendcount, MPI_Datatype sendtype, int dest, int sendtag, void *recvbuf, int recvcount, MPI_Datatype recvtype, int source, int recvtag, MPI_Comm comm, MPI_Request *request);
+    int yapympi_Isendrecv_replace(void *buf, int count, MPI_Datatype datatype, int dest, int sendtag, int source, int recvtag, MPI_Comm comm, MPI_Request *request);
+
+    int yapympi_testsome_compact(int *size, MPI_Request requests[], int *outcount, int indices[], MPI_Status statuses[], int moves[]);
+    int yapympi_isend_batch(int n, void *const bufs[], const int counts[], MPI_Datatype datatype, const int dests[], const int tags[], MPI_Comm comm, MPI_Request requests[], int *posted);
+    int yapympi_irecv_batch(int n, void *const bufs[], const int counts[], MPI_Datatype datatype, const int sources[], const int tags[], MPI_Comm comm, MPI_Request requests[], int *posted);
+    int yapympi_status_table(int n, const MPI_Status statuses[], MPI_Datatype datatype, int table[]);
+
+    extern "Python" int yapympi_delete_attr(MPI_Comm comm, int keyval, void *attribute_val, void *extra_state);
+    int yapympi_comm_create_keyval(int *keyval);
 """
 )
 
-FFIBUILDER.set_source("yapympi.cmpi", "#include <mpi.h>", libraries=["mpi"])
+FFIBUILDER.set_source("yapympi.cmpi", C_SOURCE, libraries=["mpi"])
 
 if __name__ == "__main__":
     FFIBUILDER.compile(verbose=True)
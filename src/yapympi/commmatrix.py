@@ -0,0 +1,191 @@
+"""Communication matrix and load imbalance report.
+
+The CommMatrix is a profiling tool (see :mod:`yapympi.profiling`) that
+accumulates, on every rank, the number of messages and bytes sent to
+each peer by the point to point wrappers and the RequestManager, along
+with the time spent waiting in wait* and barrier calls.
+Peers are counted by their rank in MPI_COMM_WORLD, whatever the
+communicator of the call, and sends to MPI_PROC_NULL are not counted.
+At finalize the per rank rows are gathered on rank 0 into a
+size x size matrix, where entry (i, j) describes messages sent
+from rank i to rank j.
+"""
+
+import csv
+
+from . import base
+from . import profiling
+from .cmpi import lib
+
+# Calls whose peer is the destination of a message
+SEND_CALLS = {
+    "send",
+    "ssend",
+    "rsend",
+    "bsend",
+    "isend",
+    "issend",
+    "irsend",
+    "ibsend",
+    "sendrecv",
+    "sendrecv_replace",
+    "isendrecv",
+    "isendrecv_replace",
+    "isend_batch",
+    "RequestManager.send",
+}
+
+# Calls whose time is counted as waiting time
+WAIT_CALLS = {"wait", "waitany", "waitall", "waitsome", "barrier"}
+
+
+_KEYVAL = None
+
+
+def _world_ranks(comm):
+    """Return the MPI_COMM_WORLD rank of each rank of comm.
+
+    The ranks are cached on the communicator as an attribute.
+    None is returned for MPI_COMM_WORLD, whose ranks need no translation.
+    """
+    global _KEYVAL  # pylint: disable=global-statement
+    if comm is None or comm == lib.MPI_COMM_WORLD:
+        return None
+    if _KEYVAL is None:
+        _KEYVAL = base.comm_create_keyval()
+    ranks = base.comm_get_attr(comm, _KEYVAL)
+    if ranks is None:
+        ranks = base.translate_ranks(list(range(base.comm_size(comm))), comm)
+        base.comm_set_attr(comm, _KEYVAL, ranks)
+    return ranks
+
+
+class CommMatrix(profiling.Tool):
+    """Tool collecting the communication matrix.
+
+    Attributes
+    ----------
+    messages : dict of int to int
+        Number of messages sent to each peer from this rank
+    nbytes : dict of int to int
+        Number of bytes sent to each peer from this rank
+    wait_time : float
+        Time spent by this rank in wait* and barrier calls
+    output : str or None
+        Filename prefix of the report written by rank 0.
+        If None, nothing is written.
+    matrix : dict or None
+        On rank 0, after finalize, a dict with keys
+        "messages" and "nbytes" (size x size lists of lists)
+        and "wait_time" (list of floats indexed by rank).
+    """
+
+    def __init__(self, output=None):
+        self.messages = {}
+        self.nbytes = {}
+        self.wait_time = 0.0
+        self.output = output
+        self.matrix = None
+
+    def on_call(self, info):
+        if info.name in SEND_CALLS:
+            # A batch call sends one message to each of its destinations
+            batch = info.batch if info.batch is not None else [(info.peer, info.nbytes)]
+            world_ranks = _world_ranks(info.comm)
+            for peer, nbytes in batch:
+                # Skip MPI_PROC_NULL and peers that could not be determined
+                if peer is None or peer < 0:
+                    continue
+                if world_ranks is not None:
+                    peer = world_ranks[peer]
+                self.messages[peer] = self.messages.get(peer, 0) + 1
+                self.nbytes[peer] = self.nbytes.get(peer, 0) + nbytes
+        elif info.name in WAIT_CALLS:
+            self.wait_time += info.total_time
+
+    def on_finalize(self):
+        row = (self.messages, self.nbytes, self.wait_time)
+        rows = profiling.gather_objects(row)
+        if rows is None:
+            return
+
+        size = len(rows)
+        messages = [[0] * size for _ in range(size)]
+        nbytes = [[0] * size for _ in range(size)]
+        wait_time = []
+        for src, (row_messages, row_nbytes, row_wait_time) in enumerate(rows):
+            for dst, n in row_messages.items():
+                messages[src][dst] = n
+            for dst, n in row_nbytes.items():
+                nbytes[src][dst] = n
+            wait_time.append(row_wait_time)
+
+        self.matrix = {"messages": messages, "nbytes": nbytes, "wait_time": wait_time}
+        if self.output is not None:
+            write_report(self.output, self.matrix)
+
+
+def write_report(prefix, matrix):
+    """Write the communication matrix to files.
+
+    The messages and bytes matrices and the per rank wait times are
+    written as CSV files named <prefix>_messages.csv, <prefix>_nbytes.csv
+    and <prefix>_wait_time.csv. If NumPy is available, all three are also
+    written to <prefix>.npz.
+
+    Parameters
+    ----------
+    prefix : str
+        Filename prefix
+    matrix : dict
+        The matrix as stored in CommMatrix.matrix
+    """
+    for key in ("messages", "nbytes"):
+        with open("%s_%s.csv" % (prefix, key), "wt", newline="") as fobj:
+            csv.writer(fobj).writerows(matrix[key])
+
+    with open("%s_wait_time.csv" % prefix, "wt", newline="") as fobj:
+        writer = csv.writer(fobj)
+        writer.writerow(["rank", "wait_time"])
+        writer.writerows(enumerate(matrix["wait_time"]))
+
+    try:
+        import numpy as np
+    except ImportError:
+        return
+
+    np.savez_compressed(
+        prefix,
+        messages=np.array(matrix["messages"], dtype=np.int64),
+        nbytes=np.array(matrix["nbytes"], dtype=np.int64),
+        wait_time=np.array(matrix["wait_time"], dtype=np.float64),
+    )
+
+
+def enable(output="comm_matrix"):
+    """Enable collection of the communication matrix.
+
+    Parameters
+    ----------
+    output : str or None
+        Filename prefix of the report written by rank 0 at finalize
+
+    Returns
+    -------
+    collector : CommMatrix
+        The installed collector
+    """
+    collector = CommMatrix(output)
+    profiling.install(collector)
+    return collector
+
+
+def disable(collector):
+    """Disable a collector created with enable.
+
+    Parameters
+    ----------
+    collector : CommMatrix
+        The collector returned by enable
+    """
+    profiling.uninstall(collector)
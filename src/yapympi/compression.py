@@ -0,0 +1,507 @@
+"""Opt-in compression of messages.
+
+send, isend, recv and bcast here move byte payloads like their
+counterparts in :mod:`yapympi.base`, but every message starts with a
+small header (codec id and uncompressed size), after which the payload
+is either compressed or raw. Both sides must use these functions.
+
+Compression is selected per call, or per communicator with
+set_compression. A Compression object holds the codec, the size
+threshold below which messages are sent raw, and the adaptive state:
+it measures the compression ratio and speed of the messages it
+compresses, and compresses a message only if the estimated time saved
+on the link (of the given bandwidth, see measure_bandwidth) exceeds the
+time spent compressing. While compression does not pay off, every
+probe_interval-th message is still compressed so that changes in the
+data are noticed.
+
+The zlib and lzma codecs are always available; lz4 and zstd need the
+lz4 and zstandard packages.
+"""
+
+import time
+import struct
+from array import array
+
+from .cmpi import ffi, lib
+from . import base
+from .request_array import RequestArray
+
+BANDWIDTH_TAG = 32050
+
+# Codec id and uncompressed size
+_HEADER = struct.Struct("<BQ")
+
+_RAW = 0
+_CODEC_IDS = {"zlib": 1, "lzma": 2, "lz4": 3, "zstd": 4}
+_CODEC_NAMES = {v: k for k, v in _CODEC_IDS.items()}
+_CODECS = {}
+
+
+def _load_codec(name):
+    """Return the compress(data, level) and decompress(data, max_length) functions of a codec.
+
+    decompress returns at most max_length bytes, however large the data
+    would decompress to.
+    """
+    if name == "zlib":
+        import zlib
+
+        def compress(data, level):
+            return zlib.compress(data, -1 if level is None else level)
+
+        def decompress(data, max_length):
+            return zlib.decompressobj().decompress(data, max_length)
+
+        return compress, decompress
+
+    if name == "lzma":
+        import lzma
+
+        def compress(data, level):
+            return lzma.compress(data, preset=level)
+
+        def decompress(data, max_length):
+            return lzma.LZMADecompressor().decompress(data, max_length)
+
+        return compress, decompress
+
+    if name == "lz4":
+        import lz4.frame
+
+        def compress(data, level):
+            return lz4.frame.compress(data, compression_level=level or 0)
+
+        def decompress(data, max_length):
+            return lz4.frame.LZ4FrameDecompressor().decompress(data, max_length)
+
+        return compress, decompress
+
+    if name == "zstd":
+        import zstandard
+
+        def compress(data, level):
+            return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+
+        def decompress(data, max_length):
+            with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+                return reader.read(max_length)
+
+        return compress, decompress
+
+    raise ValueError("Unknown codec %r" % name)
+
+
+def _codec(name):
+    """Return the cached functions of a codec."""
+    try:
+        return _CODECS[name]
+    except KeyError:
+        pass
+    try:
+        functions = _load_codec(name)
+    except ImportError:
+        raise ValueError("Codec %r is not available" % name) from None
+    _CODECS[name] = functions
+    return functions
+
+
+def available_codecs():
+    """Return the names of the codecs that can be used.
+
+    Returns
+    -------
+    codecs : list of str
+        Names of the installed codecs
+    """
+    names = []
+    for name in _CODEC_IDS:
+        try:
+            _codec(name)
+        except ValueError:
+            continue
+        names.append(name)
+    return names
+
+
+class Compression:
+    """Compression settings and adaptive state.
+
+    Attributes
+    ----------
+    codec : str
+        Codec name: "zlib", "lzma", "lz4" or "zstd"
+    level : int or None
+        Compression level; None for the codec's default
+    threshold : int
+        Messages smaller than this many bytes are sent raw
+    adaptive : bool
+        If True compress only when it is estimated to pay off
+    bandwidth : float
+        Link bandwidth in bytes per second
+    ratio : float or None
+        Moving average of compressed size / uncompressed size
+    speed : float or None
+        Moving average of the compression speed in bytes per second
+    """
+
+    def __init__(
+        self,
+        codec="zlib",
+        level=None,
+        threshold=4096,
+        adaptive=True,
+        bandwidth=1.25e9,
+        probe_interval=32,
+        smoothing=0.25,
+    ):
+        """Initialize.
+
+        Parameters
+        ----------
+        codec : str
+            Codec name: "zlib", "lzma", "lz4" or "zstd"
+        level : int or None
+            Compression level; None for the codec's default
+        threshold : int
+            Messages smaller than this many bytes are sent raw
+        adaptive : bool
+            If True compress only when it is estimated to pay off
+        bandwidth : float
+            Link bandwidth in bytes per second
+        probe_interval : int
+            While compression does not pay off,
+            compress every probe_interval-th message anyway
+        smoothing : float
+            Weight of the latest measurement in the moving averages
+        """
+        self._compress, _ = _codec(codec)
+        self.codec = codec
+        self.level = level
+        self.threshold = threshold
+        self.adaptive = adaptive
+        self.bandwidth = bandwidth
+        self.probe_interval = probe_interval
+        self.smoothing = smoothing
+        self.ratio = None
+        self.speed = None
+        self._skipped = 0
+
+    def __repr__(self):
+        return "Compression(codec=%r, ratio=%s)" % (self.codec, self.ratio)
+
+    def should_compress(self, nbytes):
+        """Decide whether to compress a message.
+
+        Parameters
+        ----------
+        nbytes : int
+            Uncompressed size of the message
+
+        Returns
+        -------
+        compress : bool
+            True if the message should be compressed
+        """
+        if nbytes < self.threshold:
+            return False
+        if not self.adaptive or self.ratio is None:
+            return True
+
+        saved = nbytes * (1.0 - self.ratio) / self.bandwidth
+        if saved > nbytes / self.speed:
+            self._skipped = 0
+            return True
+
+        self._skipped += 1
+        if self._skipped >= self.probe_interval:
+            self._skipped = 0
+            return True
+        return False
+
+    def _update(self, nbytes, compressed, elapsed):
+        """Update the moving averages with a measurement."""
+        ratio = compressed / nbytes
+        speed = nbytes / max(elapsed, 1e-9)
+        if self.ratio is None:
+            self.ratio, self.speed = ratio, speed
+        else:
+            w = self.smoothing
+            self.ratio = (1.0 - w) * self.ratio + w * ratio
+            self.speed = (1.0 - w) * self.speed + w * speed
+
+    def encode(self, buf):
+        """Return the message of a payload, compressed if it pays off.
+
+        Parameters
+        ----------
+        buf : bytes or any object supporting buffer interface
+            Payload
+
+        Returns
+        -------
+        message : bytearray
+            Header and payload
+        """
+        view = memoryview(buf).cast("B")
+        nbytes = view.nbytes
+        if self.should_compress(nbytes):
+            start = time.perf_counter()
+            data = self._compress(view, self.level)
+            self._update(nbytes, len(data), time.perf_counter() - start)
+            if len(data) < nbytes:
+                return _message(_CODEC_IDS[self.codec], nbytes, data)
+        return _message(_RAW, nbytes, view)
+
+
+def _message(codec_id, nbytes, data):
+    """Return a message with a header."""
+    message = bytearray(_HEADER.size + len(data))
+    _HEADER.pack_into(message, 0, codec_id, nbytes)
+    message[_HEADER.size :] = data
+    return message
+
+
+def decode(message):
+    """Return the payload of a message.
+
+    Parameters
+    ----------
+    message : bytes or any object supporting buffer interface
+        Header and payload
+
+    Returns
+    -------
+    payload : bytes or memoryview
+        Uncompressed payload; a view of message if it was sent raw
+    """
+    codec_id, nbytes = _HEADER.unpack_from(message)
+    data = memoryview(message)[_HEADER.size :]
+    if codec_id == _RAW:
+        return data
+
+    try:
+        name = _CODEC_NAMES[codec_id]
+    except KeyError:
+        raise ValueError("Unknown codec id %d" % codec_id) from None
+    # One byte more than expected is enough to detect a wrong size
+    payload = _codec(name)[1](data, nbytes + 1)
+    if len(payload) != nbytes:
+        raise ValueError("Decompressed %d bytes; expected %d" % (len(payload), nbytes))
+    return payload
+
+
+_KEYVAL = None
+
+
+def _keyval():
+    """Return the attribute key of the compression of a communicator."""
+    global _KEYVAL  # pylint: disable=global-statement
+    if _KEYVAL is None:
+        _KEYVAL = base.comm_create_keyval()
+    return _KEYVAL
+
+
+def set_compression(compression, comm=lib.MPI_COMM_WORLD):
+    """Set the compression used for the messages of a communicator.
+
+    The compression is cached on the communicator as an attribute, so it
+    is dropped when the communicator is freed and is not inherited by
+    duplicates.
+
+    Parameters
+    ----------
+    compression : Compression or None
+        Compression settings; None sends the messages raw
+    comm : MPI_Comm
+        Communicator
+    """
+    if compression is None:
+        base.comm_delete_attr(comm, _keyval())
+    else:
+        base.comm_set_attr(comm, _keyval(), compression)
+
+
+def get_compression(comm=lib.MPI_COMM_WORLD):
+    """Return the compression set for a communicator, or None."""
+    return base.comm_get_attr(comm, _keyval())
+
+
+def _encode(buf, comm, compression):
+    """Encode a payload with the compression of the call or the communicator."""
+    if compression is None:
+        compression = get_compression(comm)
+    if not compression:
+        view = memoryview(buf).cast("B")
+        return _message(_RAW, view.nbytes, view)
+    return compression.encode(buf)
+
+
+def send(buf, dest, tag, comm=lib.MPI_COMM_WORLD, compression=None):
+    """Send a payload, compressed if enabled.
+
+    Parameters
+    ----------
+    buf : bytes or any object supporting buffer interface
+        Payload
+    dest : int
+        Rank of destination
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    compression : Compression, False or None
+        Compression for this call; False sends raw.
+        If None the compression set for comm is used.
+    """
+    base.send(_encode(buf, comm, compression), dest, tag, comm)
+
+
+def isend(buf, dest, tag, comm=lib.MPI_COMM_WORLD, compression=None, requests=None, handle=None):
+    """Begin a nonblocking send of a payload, compressed if enabled.
+
+    The payload is encoded before isend returns, so buf may be reused.
+
+    Parameters
+    ----------
+    buf : bytes or any object supporting buffer interface
+        Payload
+    dest : int
+        Rank of destination
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    compression : Compression, False or None
+        Compression for this call; False sends raw.
+        If None the compression set for comm is used.
+    requests : RequestArray or None
+        Array to post the request into.
+        If requests is None a new array is created.
+    handle : object
+        Handle of the request
+
+    Returns
+    -------
+    requests : RequestArray
+        Array of requests, which keeps the message alive
+    """
+    message = _encode(buf, comm, compression)
+    if requests is None:
+        requests = RequestArray(1)
+    base.isend(message, dest, tag, comm, request=requests.add(handle, message))
+    return requests
+
+
+def recv(source=lib.MPI_ANY_SOURCE, tag=lib.MPI_ANY_TAG, comm=lib.MPI_COMM_WORLD, status=None):
+    """Receive a payload sent with send or isend.
+
+    Parameters
+    ----------
+    source : int
+        Rank of source
+    tag : int
+        Message tag
+    comm : MPI_Comm
+        Communicator
+    status : MPI_Status*
+        Status object
+        If status is None a new status object is created.
+
+    Returns
+    -------
+    payload : bytes or memoryview
+        Uncompressed payload
+    """
+    if status is None:
+        status = ffi.new("MPI_Status*")
+    base.probe(source, tag, comm, status)
+    message = bytearray(base.get_count(status))
+    base.recv(message, status.MPI_SOURCE, status.MPI_TAG, comm, status=status)
+    return decode(message)
+
+
+def bcast(buf, root, comm=lib.MPI_COMM_WORLD, compression=None):
+    """Broadcast a payload, compressed if enabled.
+
+    This is a collective operation on comm.
+
+    Parameters
+    ----------
+    buf : bytes or any object supporting buffer interface
+        Payload; only used on root
+    root : int
+        Rank of broadcast root
+    comm : MPI_Comm
+        Communicator
+    compression : Compression, False or None
+        Compression for this call, used on root; False sends raw.
+        If None the compression set for comm is used.
+
+    Returns
+    -------
+    payload : bytes or memoryview
+        Uncompressed payload; a view of buf on root
+    """
+    size = array("q", [0])
+    if base.comm_rank(comm) == root:
+        message = _encode(buf, comm, compression)
+        size[0] = len(message)
+        base.bcast(size, root, comm)
+        base.bcast(message, root, comm)
+        return memoryview(buf).cast("B")
+
+    base.bcast(size, root, comm)
+    message = bytearray(size[0])
+    base.bcast(message, root, comm)
+    return decode(message)
+
+
+def measure_bandwidth(peer, comm=lib.MPI_COMM_WORLD, nbytes=1 << 22, niters=3):
+    """Measure the bandwidth of the link to a peer with a ping-pong.
+
+    This is a collective operation on comm: the ping-pong runs on a
+    duplicate of comm, so it cannot match messages of the caller.
+    The two processes of the link call it with each other as peer,
+    the other processes with MPI_PROC_NULL.
+
+    Parameters
+    ----------
+    peer : int
+        Rank of the other process, or MPI_PROC_NULL
+    comm : MPI_Comm
+        Communicator
+    nbytes : int
+        Message size
+    niters : int
+        Number of round trips; the fastest is used
+
+    Returns
+    -------
+    bandwidth : float or None
+        Bandwidth in bytes per second; None if peer is MPI_PROC_NULL
+    """
+    comm = base.comm_dup(comm)
+    try:
+        if peer == lib.MPI_PROC_NULL:
+            return None
+        return _measure_bandwidth(peer, comm, nbytes, niters)
+    finally:
+        base.comm_free(comm)
+
+
+def _measure_bandwidth(peer, comm, nbytes, niters):
+    """Measure the bandwidth with a ping-pong on a private communicator."""
+    buf = bytearray(nbytes)
+    first = base.comm_rank(comm) < peer
+    best = float("inf")
+    for _ in range(niters):
+        start = base.wtime()
+        if first:
+            base.send(buf, peer, BANDWIDTH_TAG, comm)
+            base.recv(buf, peer, BANDWIDTH_TAG, comm)
+        else:
+            base.recv(buf, peer, BANDWIDTH_TAG, comm)
+            base.send(buf, peer, BANDWIDTH_TAG, comm)
+        best = min(best, base.wtime() - start)
+    return 2 * nbytes / best
@@ -0,0 +1,253 @@
+"""Block distributed NumPy arrays with halo exchange.
+
+A DistArray is distributed in contiguous blocks of rows (along axis 0)
+over the processes of a communicator. Each process stores its block with
+halo rows above and below it. Since the array is stored in C order, the
+halo rows and the boundary rows they are filled from are contiguous, so
+the exchange is done with plain byte buffers and no derived datatypes.
+The exchange plan is a set of persistent requests created once, on a
+duplicate of the communicator so that its messages never match the
+application's.
+
+NumPy is required.
+"""
+
+import numpy as np
+
+from .cmpi import lib
+from . import base
+from .request_array import RequestArray
+
+# Tags used by the halo exchange on the duplicated communicator
+_TAG_UP = 32001
+_TAG_DOWN = 32002
+
+_NUMPY_OPS = {"sum": np.sum, "min": np.min, "max": np.max, "prod": np.prod}
+_MPI_OPS = {"sum": lib.MPI_SUM, "min": lib.MPI_MIN, "max": lib.MPI_MAX, "prod": lib.MPI_PROD}
+
+
+def _identity(op, dtype):
+    """Return the identity element of a reduction, used for empty blocks."""
+    if op == "sum":
+        return 0
+    if op == "prod":
+        return 1
+    if dtype.kind == "f":
+        return np.inf if op == "min" else -np.inf
+    info = np.iinfo(dtype)
+    return info.max if op == "min" else info.min
+
+
+def block_counts(n, size):
+    """Return the number of rows of each process in a block distribution.
+
+    Parameters
+    ----------
+    n : int
+        Number of rows
+    size : int
+        Number of processes
+
+    Returns
+    -------
+    counts : list of int
+        Number of rows owned by each process
+    """
+    return [n // size + (1 if r < n % size else 0) for r in range(size)]
+
+
+class DistArray:
+    """A block distributed array with halo rows.
+
+    Attributes
+    ----------
+    shape : tuple of int
+        Global shape
+    dtype : numpy.dtype
+        Element type
+    halo : int
+        Number of halo rows on each side
+    periodic : bool
+        If True the first and last blocks are neighbours
+    comm : MPI_Comm
+        Communicator
+    rank : int
+        Rank in comm
+    size : int
+        Size of comm
+    counts : list of int
+        Number of rows owned by each process
+    start : int
+        Global index of the first owned row
+    stop : int
+        Global index one past the last owned row
+    data : numpy.ndarray
+        Local storage including the halo rows
+    local : numpy.ndarray
+        View of the owned rows in data
+    """
+
+    def __init__(self, shape, dtype=np.float64, halo=1, periodic=False, comm=lib.MPI_COMM_WORLD):
+        """Initialize.
+
+        Parameters
+        ----------
+        shape : int or tuple of int
+            Global shape
+        dtype : numpy dtype
+            Element type
+        halo : int
+            Number of halo rows on each side
+        periodic : bool
+            If True the first and last blocks are neighbours
+        comm : MPI_Comm
+            Communicator
+        """
+        if isinstance(shape, int):
+            shape = (shape,)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.halo = int(halo)
+        self.periodic = periodic
+        self.comm = comm
+        self.rank = base.comm_rank(comm)
+        self.size = base.comm_size(comm)
+        self._comm = base.comm_dup(comm)
+
+        self.counts = block_counts(self.shape[0], self.size)
+        if self.halo and min(self.counts) < self.halo:
+            raise ValueError(
+                "Every process must own at least halo=%d rows; counts=%r" % (self.halo, self.counts)
+            )
+        self.start = sum(self.counts[: self.rank])
+        self.stop = self.start + self.counts[self.rank]
+
+        nrows = self.counts[self.rank]
+        self._rowbytes = int(np.prod(self.shape[1:], dtype=np.int64)) * self.dtype.itemsize
+        self.data = np.zeros((nrows + 2 * self.halo,) + self.shape[1:], dtype=self.dtype)
+        self.local = self.data[self.halo : self.halo + nrows]
+
+        self._requests = None
+        if self.halo:
+            self._plan()
+
+    def _neighbours(self):
+        """Return the ranks of the processes above and below, or None."""
+        up, down = self.rank - 1, self.rank + 1
+        if self.periodic:
+            return up % self.size, down % self.size
+        return (up if up >= 0 else None), (down if down < self.size else None)
+
+    def _plan(self):
+        """Create the persistent requests of the halo exchange."""
+        h = self.halo
+        n = self.counts[self.rank]
+        up, down = self._neighbours()
+        view = memoryview(self.data.reshape(-1).view(np.uint8))
+        rowbytes = self._rowbytes
+
+        def rows(i, j):
+            return view[i * rowbytes : j * rowbytes]
+
+        self._requests = RequestArray(4)
+        if up is not None:
+            base.recv_init(rows(0, h), up, _TAG_DOWN, self._comm, request=self._requests.add())
+            base.send_init(rows(h, 2 * h), up, _TAG_UP, self._comm, request=self._requests.add())
+        if down is not None:
+            base.recv_init(rows(n + h, n + 2 * h), down, _TAG_UP, self._comm, request=self._requests.add())
+            base.send_init(rows(n, n + h), down, _TAG_DOWN, self._comm, request=self._requests.add())
+
+    def update_halos(self):
+        """Fill the halo rows with the boundary rows of the neighbours."""
+        if self._requests is None or not len(self._requests):
+            return
+        base.startall(self._requests)
+        base.waitall(self._requests)
+
+    def free(self):
+        """Free the halo exchange requests and the duplicated communicator.
+
+        This is a collective operation on comm.
+        """
+        if self._requests is not None:
+            for i in range(len(self._requests)):
+                base.request_free(self._requests.requests + i)
+            self._requests.clear()
+            self._requests = None
+        if self._comm is not None:
+            base.comm_free(self._comm)
+            self._comm = None
+
+    def reduce(self, op="sum"):
+        """Reduce all elements of the array.
+
+        Parameters
+        ----------
+        op : str
+            One of "sum", "min", "max" or "prod"
+
+        Returns
+        -------
+        value : numpy scalar
+            The reduced value, on all processes
+        """
+        local = np.array([_NUMPY_OPS[op](self.local, initial=_identity(op, self.dtype))], dtype=self.dtype)
+        result = np.empty_like(local)
+        base.allreduce(local, result, _MPI_OPS[op], self.comm)
+        return result[0]
+
+    def sum(self):
+        """Return the sum of all elements."""
+        return self.reduce("sum")
+
+    def min(self):
+        """Return the minimum of all elements."""
+        return self.reduce("min")
+
+    def max(self):
+        """Return the maximum of all elements."""
+        return self.reduce("max")
+
+    def gather_to_root(self, root=0):
+        """Gather the full array on one process.
+
+        Parameters
+        ----------
+        root : int
+            Rank of the receiving process
+
+        Returns
+        -------
+        array : numpy.ndarray or None
+            The global array on root; None on other processes
+        """
+        sendbuf = self.local.reshape(-1).view(np.uint8)
+        if self.rank == root:
+            out = np.empty(self.shape, dtype=self.dtype)
+            recvbuf = out.reshape(-1).view(np.uint8)
+            counts = [c * self._rowbytes for c in self.counts]
+        else:
+            out, recvbuf, counts = None, None, None
+        base.gatherv(sendbuf, recvbuf, counts, root=root, comm=self.comm, datatype=lib.MPI_BYTE)
+        return out
+
+    def scatter_from_root(self, array, root=0):
+        """Set the owned rows from a global array available on root.
+
+        Parameters
+        ----------
+        array : numpy.ndarray or None
+            The global array on root; ignored on other processes
+        root : int
+            Rank of the sending process
+        """
+        if self.rank == root:
+            array = np.ascontiguousarray(array, dtype=self.dtype)
+            if array.shape != self.shape:
+                raise ValueError("Expected shape %r; got %r" % (self.shape, array.shape))
+            sendbuf = array.reshape(-1).view(np.uint8)
+            counts = [c * self._rowbytes for c in self.counts]
+        else:
+            sendbuf, counts = None, None
+        recvbuf = self.local.reshape(-1).view(np.uint8)
+        base.scatterv(sendbuf, recvbuf, counts, root=root, comm=self.comm, datatype=lib.MPI_BYTE)
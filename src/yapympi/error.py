@@ -26,6 +26,27 @@ def error_string(errorcode):
     return error_str
 
 
+def error_class(errorcode):
+    """Return the error class of a given error code.
+
+    Parameters
+    ----------
+    errorcode : int
+        A MPI error code
+
+    Returns
+    -------
+    errorclass : int
+        The MPI error class (one of the MPI_ERR_* constants);
+        errorcode itself if it can not be determined
+    """
+    errorclass = ffi.new("int*")
+    retcode = lib.MPI_Error_class(errorcode, errorclass)
+    if retcode != lib.MPI_SUCCESS:
+        return errorcode
+    return errorclass[0]
+
+
 class MPIErrorBase(RuntimeError):
     """Base class of MPI Error objects."""
 
@@ -33,24 +54,112 @@ class MPIErrorBase(RuntimeError):
 class MPIError(MPIErrorBase):
     """MPI runtime error.
 
+    Creating an MPIError returns an instance of the subclass matching
+    the error class of the code, e.g. MPITruncateError for codes of class
+    MPI_ERR_TRUNCATE, so errors can be caught by kind.
+
     Attributes
     ----------
     errcode : int
         A MPI error code
+    errclass : int
+        The MPI error class of errcode
     errstr : str
         String representation of the error code
     """
 
+    def __new__(cls, errcode):
+        if cls is MPIError:
+            cls = _ERROR_CLASSES.get(error_class(errcode), MPIError)
+        return super().__new__(cls, errcode)
+
     def __init__(self, errcode):
         super().__init__(errcode)
 
         self.errcode = errcode
+        self.errclass = error_class(errcode)
         self.errorstr = error_string(self.errcode)
 
     def __str__(self):
         return "MPI Error: %d: %s" % (self.errcode, self.errorstr)
 
 
+class MPIArgumentError(MPIError, ValueError):
+    """Invalid argument: buffer, count, datatype, tag, root, group, op or other argument."""
+
+
+class MPIRankError(MPIError, ValueError):
+    """Invalid rank (MPI_ERR_RANK)."""
+
+
+class MPICommError(MPIError, ValueError):
+    """Invalid communicator (MPI_ERR_COMM)."""
+
+
+class MPIRequestError(MPIError, ValueError):
+    """Invalid request (MPI_ERR_REQUEST)."""
+
+
+class MPITruncateError(MPIError):
+    """Message truncated on receive (MPI_ERR_TRUNCATE)."""
+
+
+class MPIPendingError(MPIError):
+    """Request still pending (MPI_ERR_PENDING)."""
+
+
+class MPINoMemoryError(MPIError, MemoryError):
+    """MPI ran out of memory (MPI_ERR_NO_MEM)."""
+
+
+class MPIUnsupportedError(MPIError, NotImplementedError):
+    """Operation not supported by the MPI library (MPI_ERR_UNSUPPORTED_OPERATION)."""
+
+
+class MPIInternalError(MPIError):
+    """Internal MPI error (MPI_ERR_INTERN)."""
+
+
+class MPITimeoutError(MPIErrorBase, TimeoutError):
+    """A wait did not complete within its timeout.
+
+    The requests are still active; they can be waited on again
+    or cancelled.
+
+    Attributes
+    ----------
+    timeout : float
+        The timeout in seconds
+    """
+
+    def __init__(self, timeout):
+        super().__init__(timeout)
+        self.timeout = timeout
+
+    def __str__(self):
+        return "MPI wait timed out after %g seconds" % self.timeout
+
+
+_ERROR_CLASSES = {
+    lib.MPI_ERR_BUFFER: MPIArgumentError,
+    lib.MPI_ERR_COUNT: MPIArgumentError,
+    lib.MPI_ERR_TYPE: MPIArgumentError,
+    lib.MPI_ERR_TAG: MPIArgumentError,
+    lib.MPI_ERR_ROOT: MPIArgumentError,
+    lib.MPI_ERR_GROUP: MPIArgumentError,
+    lib.MPI_ERR_OP: MPIArgumentError,
+    lib.MPI_ERR_ARG: MPIArgumentError,
+    lib.MPI_ERR_RANK: MPIRankError,
+    lib.MPI_ERR_COMM: MPICommError,
+    lib.MPI_ERR_REQUEST: MPIRequestError,
+    lib.MPI_ERR_TRUNCATE: MPITruncateError,
+    lib.MPI_ERR_PENDING: MPIPendingError,
+    lib.MPI_ERR_NO_MEM: MPINoMemoryError,
+    lib.MPI_ERR_UNSUPPORTED_OPERATION: MPIUnsupportedError,
+    lib.MPI_ERR_INTERN: MPIInternalError,
+}
+
+
 class MPIStatusErrors(MPIErrorBase):
     """MPI runtime error in status.
 
@@ -58,25 +167,35 @@ class MPIStatusErrors(MPIErrorBase):
     ----------
     errcodes : list of int
         List of MPI error codes
+    errclasses : list of int
+        List of the MPI error classes of the error codes
     errstrs : list of str
         List of string representations of the error codes
     handles : list of handles
         List of handle objects associated with the failed requests
+    erridxs : list of int
+        List of indices where the errors occured
     """
 
-    def __init__(self, errcodes, handles=None):
-        super().__init__(errcodes, handles=None)
+    def __init__(self, errcodes, handles=None, erridxs=None):
+        super().__init__(errcodes, handles, erridxs)
         if handles is None:
             handles = [None] * len(errcodes)
         else:
             assert len(handles) == len(errcodes)
+        if erridxs is None:
+            erridxs = [None] * len(errcodes)
+        else:
+            assert len(erridxs) == len(errcodes)
 
         self.errcodes = errcodes
+        self.errclasses = [error_class(c) for c in self.errcodes]
         self.errstrs = [error_string(c) for c in self.errcodes]
         self.handles = handles
+        self.erridxs = erridxs
 
     def __str__(self):
-        it = zip(self.errcodes, self.errstrs, self.handles)
-        it = ["Error: %d: %s\n%r" % r for r in it]
+        it = zip(self.erridxs, self.errcodes, self.errstrs, self.handles)
+        it = ["Index: %r; Error: %d: %s\n%r" % r for r in it]
         it = "\n".join(it)
         return "MPI Status Errors: %d errors\n%s" % (len(self.errcodes), it)
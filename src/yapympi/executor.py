@@ -0,0 +1,362 @@
+"""Task farm executor over MPI processes.
+
+MPIPoolExecutor implements the concurrent.futures.Executor interface.
+One process (the root) submits tasks; all other processes of the
+communicator are workers. It is used collectively, in SPMD style::
+
+    with MPIPoolExecutor() as executor:
+        if executor is not None:
+            results = list(executor.map(fn, items, chunksize=16))
+
+On the workers the with statement runs the worker loop until the root
+shuts the executor down; the body is then run with executor set to None.
+
+Each worker is kept busy with up to prefetch outstanding tasks, so it
+never waits for a round trip to the root between tasks. Tasks are
+assigned to workers as they return results, which balances the load
+dynamically. Tasks and results are pickled; functions must be picklable
+(defined at module level). Task and result sends are nonblocking and
+driven by a RequestManager. Results stream back through a second
+RequestManager on the root, which keeps a receive of RESULT_BUFSIZE bytes
+posted for every worker; a larger result is announced by its size and
+received in a second message.
+
+The executor communicates on a duplicate of the communicator, so its
+messages never match those of the caller. The duplicate is freed when
+the workers are stopped.
+
+On the root, a dispatcher thread makes all MPI calls while the executor
+is running, so MPI must have been initialized with at least
+MPI_THREAD_SERIALIZED and the root should not make other MPI calls
+until shutdown.
+"""
+
+import time
+import pickle
+import struct
+import threading
+import itertools
+from collections import deque
+from concurrent.futures import Executor, Future
+
+from .cmpi import ffi, lib
+from . import base
+from .request_manager import RequestManager
+
+TASK_TAG = 32010
+RESULT_TAG = 32011
+STOP_TAG = 32012
+RESULT_DATA_TAG = 32013
+
+# Results smaller than this are received in the preposted buffer
+RESULT_BUFSIZE = 1 << 16
+
+# First byte of a result message: the pickled result follows, or its size
+_INLINE = b"\0"
+_LARGE = b"\1"
+
+
+def _run_chunk(fn, chunk):
+    """Apply fn to each argument tuple of a chunk."""
+    return [fn(*args) for args in chunk]
+
+
+def _chunks(iterables, chunksize):
+    """Yield chunks of argument tuples."""
+    it = zip(*iterables)
+    while True:
+        chunk = list(itertools.islice(it, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _recv_pickled(status, comm):
+    """Receive and unpickle the message matched by a probe."""
+    buf = bytearray(base.get_count(status))
+    base.recv(buf, status.MPI_SOURCE, status.MPI_TAG, comm, status=status)
+    return pickle.loads(buf)
+
+
+def _result_messages(payload):
+    """Return the (message, tag) pairs that send a pickled result."""
+    if len(payload) < RESULT_BUFSIZE:
+        return [(_INLINE + payload, RESULT_TAG)]
+    return [(_LARGE + struct.pack("<q", len(payload)), RESULT_TAG), (payload, RESULT_DATA_TAG)]
+
+
+def _drain(manager):
+    """Wait for all requests of a manager to complete."""
+    while manager.size:
+        if manager.test()[0] is None:
+            time.sleep(0)
+
+
+def worker_loop(comm=lib.MPI_COMM_WORLD, root=0, prefetch=2):
+    """Run tasks received from root until it sends the stop message.
+
+    Parameters
+    ----------
+    comm : MPI_Comm
+        Communicator of the executor (MPIPoolExecutor.comm)
+    root : int
+        Rank of the process submitting the tasks
+    prefetch : int
+        Maximum number of outstanding results; must match the root
+    """
+    manager = RequestManager(2 * (prefetch + 1), comm)
+    status = ffi.new("MPI_Status*")
+    while True:
+        base.probe(root, lib.MPI_ANY_TAG, comm, status)
+        if status.MPI_TAG == STOP_TAG:
+            base.recv(bytearray(0), root, STOP_TAG, comm)
+            break
+
+        task_id, fn, args, kwargs = _recv_pickled(status, comm)
+        try:
+            result = (task_id, True, fn(*args, **kwargs))
+        except BaseException as e:  # pylint: disable=broad-except
+            result = (task_id, False, e)
+        try:
+            payload = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:  # pylint: disable=broad-except
+            payload = pickle.dumps((task_id, False, e), pickle.HIGHEST_PROTOCOL)
+
+        # Reclaim finished result sends before posting the next ones
+        messages = _result_messages(payload)
+        while manager.size + len(messages) > manager.capacity:
+            manager.test()
+        manager.test()
+        for message, tag in messages:
+            manager.send(memoryview(message), root, tag)
+
+    _drain(manager)
+
+
+class MPIPoolExecutor(Executor):
+    """Executor running tasks on the other processes of a communicator.
+
+    Attributes
+    ----------
+    comm : MPI_Comm
+        Private duplicate of the communicator
+    root : int
+        Rank of the process submitting the tasks
+    prefetch : int
+        Maximum number of outstanding tasks per worker
+    workers : list of int
+        Ranks of the workers
+    """
+
+    def __init__(self, comm=lib.MPI_COMM_WORLD, root=0, prefetch=2, interval=0.0001):
+        """Initialize.
+
+        This is a collective operation on comm.
+
+        Parameters
+        ----------
+        comm : MPI_Comm
+            Communicator
+        root : int
+            Rank of the process submitting the tasks
+        prefetch : int
+            Maximum number of outstanding tasks per worker
+        interval : float
+            Time in seconds the dispatcher sleeps when idle
+        """
+        self.root = root
+        self.prefetch = max(int(prefetch), 1)
+        self.interval = interval
+
+        self.rank = base.comm_rank(comm)
+        size = base.comm_size(comm)
+        self.workers = [r for r in range(size) if r != root]
+        if not self.workers:
+            raise ValueError("MPIPoolExecutor needs at least two processes")
+        self.comm = base.comm_dup(comm)
+
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._shutdown = False
+        self._thread = None
+        self._error = None
+
+    @property
+    def is_root(self):
+        """True on the process submitting the tasks."""
+        return self.rank == self.root
+
+    def __enter__(self):
+        if self.is_root:
+            self._start()
+            return self
+        try:
+            worker_loop(self.comm, self.root, self.prefetch)
+        finally:
+            base.comm_free(self.comm)
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.is_root:
+            self.shutdown(wait=True)
+        return False
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._dispatch, daemon=True)
+            self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):  # pylint: disable=arguments-differ
+        """Submit fn(*args, **kwargs) to be run on a worker.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Future of the result
+        """
+        if not self.is_root:
+            raise RuntimeError("Tasks can only be submitted on the root process")
+
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Cannot submit after shutdown")
+            if self._error is not None:
+                raise self._error
+            self._pending.append((future, fn, args, kwargs))
+        self._start()
+        return future
+
+    def map(self, fn, *iterables, timeout=None, chunksize=1):
+        """Return an iterator of fn applied to the items of iterables.
+
+        Parameters
+        ----------
+        fn : callable
+            Function to apply
+        *iterables : iterables
+            Arguments of fn
+        timeout : float or None
+            Maximum number of seconds to wait for each result
+        chunksize : int
+            Number of items sent to a worker as a single task
+
+        Returns
+        -------
+        results : iterator
+            Results in the order of the items
+        """
+        if chunksize < 1:
+            raise ValueError("chunksize must be >= 1")
+        if chunksize == 1:
+            return super().map(fn, *iterables, timeout=timeout)
+
+        chunks = super().map(_run_chunk, itertools.repeat(fn), _chunks(iterables, chunksize), timeout=timeout)
+        return itertools.chain.from_iterable(chunks)
+
+    def shutdown(self, wait=True, cancel_futures=False):  # pylint: disable=arguments-differ
+        """Stop the workers after all submitted tasks are done.
+
+        Parameters
+        ----------
+        wait : bool
+            If True wait for the dispatcher to finish
+        cancel_futures : bool
+            If True cancel the tasks not yet sent to a worker
+        """
+        if not self.is_root:
+            return
+        with self._lock:
+            self._shutdown = True
+            if cancel_futures:
+                while self._pending:
+                    self._pending.popleft()[0].cancel()
+        self._start()
+        if wait and self._thread is not None:
+            self._thread.join()
+            if self._error is not None:
+                raise self._error
+
+    def _dispatch(self):
+        """Dispatcher thread: send tasks, receive results, stop workers."""
+        manager = RequestManager(len(self.workers) * (self.prefetch + 1), self.comm)
+        results = RequestManager(len(self.workers) * (self.prefetch + 1), self.comm)
+        outstanding = {w: 0 for w in self.workers}
+        futures = {}
+        task_ids = itertools.count()
+
+        def post_result_recv(worker):
+            buf = bytearray(RESULT_BUFSIZE)
+            results.recv(buf, worker, RESULT_TAG, handle=(RESULT_TAG, worker, buf))
+
+        try:
+            for worker in self.workers:
+                post_result_recv(worker)
+
+            while True:
+                busy = False
+
+                # Fill every worker up to prefetch tasks, least loaded first
+                for worker in sorted(self.workers, key=outstanding.__getitem__):
+                    if outstanding[worker] >= self.prefetch:
+                        break
+                    with self._lock:
+                        if not self._pending:
+                            break
+                        future, fn, args, kwargs = self._pending.popleft()
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    task_id = next(task_ids)
+                    try:
+                        payload = pickle.dumps((task_id, fn, args, kwargs), pickle.HIGHEST_PROTOCOL)
+                    except Exception as e:  # pylint: disable=broad-except
+                        future.set_exception(e)
+                        continue
+                    while manager.size == manager.capacity:
+                        manager.test()
+                    manager.send(memoryview(payload), worker, TASK_TAG)
+                    futures[task_id] = (future, worker)
+                    outstanding[worker] += 1
+                    busy = True
+
+                manager.test()
+
+                # Stream in all available results
+                handles, statuses = results.test()
+                for (tag, worker, buf), status in zip(handles or (), statuses or ()):
+                    if tag == RESULT_TAG:
+                        post_result_recv(worker)
+                        if buf[:1] == _LARGE:
+                            data = bytearray(struct.unpack_from("<q", buf, 1)[0])
+                            results.recv(data, worker, RESULT_DATA_TAG, handle=(RESULT_DATA_TAG, worker, data))
+                            continue
+                        buf = memoryview(buf)[1 : status.count]
+                    task_id, ok, value = pickle.loads(buf)
+                    future, _ = futures.pop(task_id)
+                    outstanding[worker] -= 1
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+                    busy = True
+
+                with self._lock:
+                    done = self._shutdown and not self._pending and not futures
+                if done:
+                    break
+                if not busy and self.interval:
+                    time.sleep(self.interval)
+
+            results.cancel_all()
+            for worker in self.workers:
+                manager.send(bytearray(0), worker, STOP_TAG)
+            _drain(manager)
+        except BaseException as e:  # pylint: disable=broad-except
+            self._error = e
+            for future, _ in futures.values():
+                future.set_exception(e)
+            with self._lock:
+                while self._pending:
+                    self._pending.popleft()[0].set_exception(e)
+        finally:
+            base.comm_free(self.comm)
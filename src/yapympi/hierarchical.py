@@ -0,0 +1,286 @@
+"""Node aware (hierarchical) collectives.
+
+A HierarchicalComm splits a communicator into one communicator per
+shared memory node and a communicator of node leaders (node rank 0).
+Collectives are then done in two levels: within each node, where the
+MPI library uses its shared memory transport, and among the leaders,
+so that only one copy of the data crosses the network per node.
+
+The module level functions take a method argument ("flat" or
+"hierarchical") so the variant can be selected per call.
+"""
+
+from itertools import accumulate
+
+from .cmpi import ffi, lib
+from . import base
+
+FLAT = "flat"
+HIERARCHICAL = "hierarchical"
+
+
+class HierarchicalComm:
+    """Node and leader communicators derived from a communicator.
+
+    Attributes
+    ----------
+    comm : MPI_Comm
+        The parent communicator
+    node_comm : MPI_Comm
+        Communicator of the processes on the same node
+    leader_comm : MPI_Comm
+        Communicator of the node leaders; MPI_COMM_NULL on other processes
+    rank : int
+        Rank in comm
+    size : int
+        Size of comm
+    node_rank : int
+        Rank in node_comm
+    node_size : int
+        Size of node_comm
+    node_of : list of int
+        Node index (leader_comm rank of the node's leader) of each rank of comm
+    node_rank_of : list of int
+        Node rank of each rank of comm
+    node_sizes : list of int
+        Number of processes on each node
+    """
+
+    def __init__(self, comm=lib.MPI_COMM_WORLD, ranks_per_node=None):
+        """Initialize.
+
+        This is a collective operation on comm.
+
+        Parameters
+        ----------
+        comm : MPI_Comm
+            The parent communicator
+        ranks_per_node : int or None
+            If given, emulate nodes of this many consecutive ranks
+            instead of using the shared memory nodes. Useful to
+            benchmark different ranks per node on a single machine.
+        """
+        self.comm = comm
+        self.rank = base.comm_rank(comm)
+        self.size = base.comm_size(comm)
+
+        if ranks_per_node is None:
+            self.node_comm = base.comm_split_type(comm, lib.MPI_COMM_TYPE_SHARED, self.rank)
+        else:
+            color = self.rank // ranks_per_node
+            self.node_comm = base.comm_split(comm, color, self.rank)
+        self.node_rank = base.comm_rank(self.node_comm)
+        self.node_size = base.comm_size(self.node_comm)
+
+        color = 0 if self.node_rank == 0 else lib.MPI_UNDEFINED
+        self.leader_comm = base.comm_split(comm, color, self.rank)
+
+        node = ffi.new("int[2]")
+        if self.is_leader:
+            node[0] = base.comm_rank(self.leader_comm)
+        base.bcast(ffi.buffer(node, ffi.sizeof("int")), 0, self.node_comm)
+        node[1] = self.node_rank
+
+        table = ffi.new("int[]", 2 * self.size)
+        base.allgather(ffi.buffer(node), ffi.buffer(table), comm, lib.MPI_INT)
+        self.node_of = [table[2 * r] for r in range(self.size)]
+        self.node_rank_of = [table[2 * r + 1] for r in range(self.size)]
+
+        nnodes = max(self.node_of) + 1
+        self.node_sizes = [0] * nnodes
+        for n in self.node_of:
+            self.node_sizes[n] += 1
+
+    @property
+    def is_leader(self):
+        """True if this process is the leader of its node."""
+        return self.node_rank == 0
+
+    def free(self):
+        """Free the node and leader communicators.
+
+        They are set to MPI_COMM_NULL, so freeing twice does nothing.
+        """
+        if self.node_comm != lib.MPI_COMM_NULL:
+            base.comm_free(self.node_comm)
+            self.node_comm = lib.MPI_COMM_NULL
+        if self.leader_comm != lib.MPI_COMM_NULL:
+            base.comm_free(self.leader_comm)
+            self.leader_comm = lib.MPI_COMM_NULL
+
+    def bcast(self, buf, root):
+        """Hierarchical broadcast; see yapympi.base.bcast."""
+        root_node = self.node_of[root]
+        my_node = self.node_of[self.rank]
+        root_node_rank = self.node_rank_of[root]
+
+        # Move the data to the root's node leader
+        if my_node == root_node and root_node_rank != 0:
+            base.bcast(buf, root_node_rank, self.node_comm)
+
+        if self.is_leader:
+            base.bcast(buf, root_node, self.leader_comm)
+
+        if my_node != root_node or root_node_rank == 0:
+            base.bcast(buf, 0, self.node_comm)
+
+    def allreduce(self, sendbuf, recvbuf, op=lib.MPI_SUM, datatype=None):
+        """Hierarchical allreduce; see yapympi.base.allreduce."""
+        if datatype is None:
+            datatype = base.buffer_datatype(sendbuf)
+
+        base.reduce(sendbuf, recvbuf, op, 0, self.node_comm, datatype)
+        if self.is_leader:
+            node_sum = bytearray(recvbuf)
+            base.allreduce(node_sum, recvbuf, op, self.leader_comm, datatype)
+        base.bcast(memoryview(recvbuf).cast("B"), 0, self.node_comm)
+
+    def allgather(self, sendbuf, recvbuf, datatype=None):
+        """Hierarchical allgather; see yapympi.base.allgather."""
+        if datatype is None:
+            datatype = base.buffer_datatype(sendbuf)
+        block = memoryview(sendbuf).nbytes
+        count = block // base.type_size(datatype)
+        out = memoryview(recvbuf).cast("B")
+
+        node_buf = bytearray(block * self.node_size) if self.is_leader else None
+        base.gather(sendbuf, node_buf, 0, self.node_comm, datatype)
+
+        if self.is_leader:
+            # Blocks arrive grouped by node, in node rank order
+            counts = [n * count for n in self.node_sizes]
+            grouped = bytearray(block * self.size)
+            base.allgatherv(node_buf, grouped, counts, comm=self.leader_comm, datatype=datatype)
+
+            node_offsets = [0] + list(accumulate(n * block for n in self.node_sizes))
+            for r in range(self.size):
+                src = node_offsets[self.node_of[r]] + self.node_rank_of[r] * block
+                out[r * block : (r + 1) * block] = grouped[src : src + block]
+
+        base.bcast(out, 0, self.node_comm)
+
+
+_KEYVAL = None
+
+
+def _keyval():
+    """Return the attribute key of the HierarchicalComm of a communicator."""
+    global _KEYVAL  # pylint: disable=global-statement
+    if _KEYVAL is None:
+        _KEYVAL = base.comm_create_keyval(HierarchicalComm.free)
+    return _KEYVAL
+
+
+def get_hierarchical_comm(comm=lib.MPI_COMM_WORLD):
+    """Return the cached HierarchicalComm of a communicator.
+
+    The first call for a communicator is collective. The HierarchicalComm
+    is cached on the communicator as an attribute, and its node and leader
+    communicators are freed when the communicator is freed.
+
+    Parameters
+    ----------
+    comm : MPI_Comm
+        Communicator
+
+    Returns
+    -------
+    hcomm : HierarchicalComm
+        Node and leader communicators of comm
+    """
+    hcomm = base.comm_get_attr(comm, _keyval())
+    if hcomm is None:
+        hcomm = HierarchicalComm(comm)
+        base.comm_set_attr(comm, _keyval(), hcomm)
+    return hcomm
+
+
+def free_hierarchical_comm(comm=lib.MPI_COMM_WORLD):
+    """Free the cached HierarchicalComm of a communicator, if any.
+
+    This is a collective operation on comm. Freeing comm does the same,
+    so this is only needed to release the node and leader communicators
+    of a communicator that stays in use.
+
+    Parameters
+    ----------
+    comm : MPI_Comm
+        Communicator
+    """
+    base.comm_delete_attr(comm, _keyval())
+
+
+def _check_method(method):
+    if method not in (FLAT, HIERARCHICAL):
+        raise ValueError("Unknown collective method %r" % method)
+
+
+def bcast(buf, root, comm=lib.MPI_COMM_WORLD, method=HIERARCHICAL):
+    """Broadcast with a selectable algorithm.
+
+    Parameters
+    ----------
+    buf : object supporting buffer interface
+        Buffer; must be writable on all ranks other than root
+    root : int
+        Rank of broadcast root
+    comm : MPI_Comm
+        Communicator
+    method : str
+        "flat" for MPI_Bcast, "hierarchical" for the node aware variant
+    """
+    _check_method(method)
+    if method == FLAT:
+        base.bcast(buf, root, comm)
+    else:
+        get_hierarchical_comm(comm).bcast(buf, root)
+
+
+def allreduce(sendbuf, recvbuf, op=lib.MPI_SUM, comm=lib.MPI_COMM_WORLD, datatype=None, method=HIERARCHICAL):
+    """Allreduce with a selectable algorithm.
+
+    Parameters
+    ----------
+    sendbuf : object supporting buffer interface
+        Send buffer
+    recvbuf : writable object supporting buffer interface
+        Receive buffer
+    op : MPI_Op
+        Reduce operation
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of the buffer elements
+        If datatype is None it is inferred from sendbuf.
+    method : str
+        "flat" for MPI_Allreduce, "hierarchical" for the node aware variant
+    """
+    _check_method(method)
+    if method == FLAT:
+        base.allreduce(sendbuf, recvbuf, op, comm, datatype)
+    else:
+        get_hierarchical_comm(comm).allreduce(sendbuf, recvbuf, op, datatype)
+
+
+def allgather(sendbuf, recvbuf, comm=lib.MPI_COMM_WORLD, datatype=None, method=HIERARCHICAL):
+    """Allgather with a selectable algorithm.
+
+    Parameters
+    ----------
+    sendbuf : object supporting buffer interface
+        Send buffer
+    recvbuf : writable object supporting buffer interface
+        Receive buffer, comm_size times the size of sendbuf
+    comm : MPI_Comm
+        Communicator
+    datatype : MPI_Datatype
+        Datatype of the buffer elements
+        If datatype is None it is inferred from sendbuf.
+    method : str
+        "flat" for MPI_Allgather, "hierarchical" for the node aware variant
+    """
+    _check_method(method)
+    if method == FLAT:
+        base.allgather(sendbuf, recvbuf, comm, datatype)
+    else:
+        get_hierarchical_comm(comm).allgather(sendbuf, recvbuf, datatype)
@@ -0,0 +1,224 @@
+"""Broadcast and scatter of files through memory maps.
+
+bcast_file and scatter_file move the contents of a file on the root to
+files on the other processes without reading it into memory: the root
+maps the input file and sends regions of it directly from the mapping,
+and every receiver maps an output file, pre-sized to its part, and
+receives directly into the mapping.
+
+Data moves in chunks of chunk_size bytes. After each chunk the pages of
+the chunk are written back (on receivers) and dropped from the mapping
+with madvise(MADV_DONTNEED) where available, so the resident memory
+stays bounded by about one chunk however large the file is.
+
+scatter_file sends its chunks on a duplicate of the communicator, so
+they never match the application's messages.
+"""
+
+import os
+import mmap
+import contextlib
+from array import array
+from itertools import accumulate
+
+from .cmpi import lib
+from . import base
+
+# Tag of the chunks sent by scatter_file on the duplicated communicator
+FILE_TAG = 32060
+
+DEFAULT_CHUNK_SIZE = 1 << 26
+
+
+def _chunk_size(chunk_size):
+    """Round a chunk size up to a multiple of the allocation granularity."""
+    granularity = mmap.ALLOCATIONGRANULARITY
+    return max(granularity, -(-int(chunk_size) // granularity) * granularity)
+
+
+def _chunks(offset, nbytes, chunk_size):
+    """Yield (start, length) of the chunks of a region."""
+    for start in range(offset, offset + nbytes, chunk_size):
+        yield start, min(chunk_size, offset + nbytes - start)
+
+
+@contextlib.contextmanager
+def _open_map(path, nbytes, write):
+    """Map a file; an output file is created with size nbytes.
+
+    Yields None for empty files, which can't be mapped.
+    """
+    with open(path, "w+b" if write else "rb") as f:
+        if write:
+            f.truncate(nbytes)
+        if not nbytes:
+            yield None
+            return
+
+        access = mmap.ACCESS_WRITE if write else mmap.ACCESS_READ
+        mm = mmap.mmap(f.fileno(), nbytes, access=access)
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+
+def _release(mm, start, length, dirty):
+    """Write back and drop the pages of a region of a mapping."""
+    pad = start % mmap.PAGESIZE
+    if dirty:
+        mm.flush(start - pad, length + pad)
+    if hasattr(mmap, "MADV_DONTNEED"):
+        mm.madvise(mmap.MADV_DONTNEED, start - pad, length + pad)
+
+
+def _file_size(path, root, comm):
+    """Broadcast the size of the file on root."""
+    size = array("q", [0])
+    if base.comm_rank(comm) == root:
+        size[0] = os.path.getsize(path)
+    base.bcast(size, root, comm)
+    return size[0]
+
+
+def bcast_file(path, out_path, root=0, comm=lib.MPI_COMM_WORLD, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Broadcast a file from root to a file on every other process.
+
+    This is a collective operation on comm.
+
+    Parameters
+    ----------
+    path : str
+        Input file; only used on root
+    out_path : str
+        Output file; created or overwritten on all processes other than
+        root. Ignored on root.
+    root : int
+        Rank of the process with the input file
+    comm : MPI_Comm
+        Communicator
+    chunk_size : int
+        Number of bytes broadcast at a time
+
+    Returns
+    -------
+    nbytes : int
+        Size of the file
+    """
+    chunk_size = _chunk_size(chunk_size)
+    nbytes = _file_size(path, root, comm)
+    is_root = base.comm_rank(comm) == root
+
+    with _open_map(path if is_root else out_path, nbytes, not is_root) as mm:
+        for start, length in _chunks(0, nbytes, chunk_size):
+            with memoryview(mm)[start : start + length] as chunk:
+                base.bcast(chunk, root, comm)
+            _release(mm, start, length, not is_root)
+
+    return nbytes
+
+
+def split_file(nbytes, size, align=1):
+    """Split a file into contiguous parts of nearly equal size.
+
+    Parameters
+    ----------
+    nbytes : int
+        Size of the file
+    size : int
+        Number of parts
+    align : int
+        Every part but the last has a multiple of align bytes,
+        e.g. the size of a record
+
+    Returns
+    -------
+    counts : list of int
+        Number of bytes of each part
+    """
+    nunits = nbytes // align
+    counts = [(nunits // size + (1 if r < nunits % size else 0)) * align for r in range(size)]
+    counts[-1] += nbytes - nunits * align
+    return counts
+
+
+def _scatter_chunks(path, out_path, root, counts, offsets, comm, chunk_size):
+    """Send the parts of the file from root in chunks; see scatter_file."""
+    rank = base.comm_rank(comm)
+    with _open_map(out_path, counts[rank], True) as out:
+        if rank != root:
+            for start, length in _chunks(0, counts[rank], chunk_size):
+                with memoryview(out)[start : start + length] as chunk:
+                    base.recv(chunk, root, FILE_TAG, comm)
+                _release(out, start, length, True)
+            return
+
+        with _open_map(path, sum(counts), False) as mm:
+            for r in range(len(counts)):
+                for start, length in _chunks(offsets[r], counts[r], chunk_size):
+                    with memoryview(mm)[start : start + length] as chunk:
+                        if r == root:
+                            out_start = start - offsets[r]
+                            out[out_start : out_start + length] = chunk
+                            _release(out, out_start, length, True)
+                        else:
+                            base.send(chunk, r, FILE_TAG, comm)
+                    _release(mm, start, length, False)
+
+
+def scatter_file(
+    path,
+    out_path,
+    root=0,
+    counts=None,
+    align=1,
+    comm=lib.MPI_COMM_WORLD,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    """Scatter contiguous parts of a file from root to a file on every process.
+
+    This is a collective operation on comm.
+
+    Parameters
+    ----------
+    path : str
+        Input file; only used on root
+    out_path : str
+        Output file of this process's part; created or overwritten
+    root : int
+        Rank of the process with the input file
+    counts : list of int or None
+        Number of bytes of each process's part; the same on all processes.
+        If None the file is split with split_file.
+    align : int
+        Alignment of the parts if counts is None
+    comm : MPI_Comm
+        Communicator
+    chunk_size : int
+        Number of bytes sent at a time
+
+    Returns
+    -------
+    offset : int
+        Offset of this process's part in the input file
+    count : int
+        Size of this process's part
+    """
+    chunk_size = _chunk_size(chunk_size)
+    nbytes = _file_size(path, root, comm)
+    rank = base.comm_rank(comm)
+    size = base.comm_size(comm)
+
+    if counts is None:
+        counts = split_file(nbytes, size, align)
+    if len(counts) != size or sum(counts) != nbytes:
+        raise ValueError("counts must have one part per process and add up to %d bytes" % nbytes)
+    offsets = [0] + list(accumulate(counts))[:-1]
+
+    file_comm = base.comm_dup(comm)
+    try:
+        _scatter_chunks(path, out_path, root, counts, offsets, file_comm, chunk_size)
+    finally:
+        base.comm_free(file_comm)
+
+    return offsets[rank], counts[rank]
@@ -0,0 +1,185 @@
+"""Partitioned point to point communication.
+
+With MPI-4 libraries the PartitionedRequest wraps a request created with
+MPI_Psend_init or MPI_Precv_init. Older libraries lack partitioned
+communication; there the request falls back to one persistent request
+per partition. The fallback sends partition i with tag tag + i, so the
+whole range tag to tag + partitions - 1 must be valid (at most
+MPI_TAG_UB) and should not be used by other messages between the same
+pair of processes on the communicator while the request exists.
+"""
+
+from .cmpi import ffi, lib
+from .error import MPIError, MPIStatusErrors
+from .request_array import RequestArray
+
+HAVE_PARTITIONED = bool(lib.YAPYMPI_HAVE_PARTITIONED)
+
+
+def _check_error(retcode):
+    if retcode != lib.MPI_SUCCESS:
+        raise MPIError(retcode)
+
+
+class PartitionedRequest:
+    """A persistent partitioned send or receive request.
+
+    Attributes
+    ----------
+    is_send : bool
+        True for send requests, False for receive requests
+    partitions : int
+        Number of partitions
+    native : bool
+        True if MPI-4 partitioned communication is used
+    """
+
+    def __init__(self, is_send, buf, partitions, peer, tag, comm, datatype, native=None):
+        """Initialize.
+
+        Parameters
+        ----------
+        is_send : bool
+            True for send requests, False for receive requests
+        buf : object supporting buffer interface
+            The buffer; must be writable for receive requests
+        partitions : int
+            Number of partitions; must divide the number of elements
+            of the buffer
+        peer : int
+            Rank of destination or source
+        tag : int
+            Message tag. The fallback uses tags tag to
+            tag + partitions - 1.
+        comm : MPI_Comm
+            Communicator
+        datatype : MPI_Datatype
+            Datatype of each buffer element
+        native : bool or None
+            Use MPI-4 partitioned communication.
+            If None it is used when available.
+        """
+        if native is None:
+            native = HAVE_PARTITIONED
+        if native and not HAVE_PARTITIONED:
+            raise MPIError(lib.MPI_ERR_UNSUPPORTED_OPERATION)
+
+        if is_send:
+            self._cbuf = ffi.from_buffer("char[]", buf)
+        else:
+            self._cbuf = ffi.from_buffer("char[]", buf, require_writable=True)
+        type_size = ffi.new("int*")
+        _check_error(lib.MPI_Type_size(datatype, type_size))
+        nelements = len(self._cbuf) // type_size[0]
+        if nelements % partitions:
+            raise ValueError(
+                "Buffer size %d elements is not a multiple of partitions %d" % (nelements, partitions)
+            )
+        count = nelements // partitions
+        partbytes = count * type_size[0]
+
+        self.is_send = is_send
+        self.partitions = partitions
+        self.native = native
+
+        if native:
+            self._request = ffi.new("MPI_Request*")
+            if is_send:
+                init = lib.yapympi_Psend_init
+            else:
+                init = lib.yapympi_Precv_init
+            _check_error(init(self._cbuf, partitions, count, datatype, peer, tag, comm, self._request))
+            return
+
+        self._requests = RequestArray(partitions)
+        self._arrived = [False] * partitions
+        request_p = self._requests.reserve(partitions)
+        init = lib.MPI_Send_init if is_send else lib.MPI_Recv_init
+        created = 0
+        try:
+            for i in range(partitions):
+                part = self._cbuf + i * partbytes
+                _check_error(init(part, count, datatype, peer, tag + i, comm, request_p + i))
+                created += 1
+        except BaseException:
+            # Free the requests created before the failure
+            for i in range(created):
+                lib.MPI_Request_free(request_p + i)
+            self._requests.clear()
+            raise
+
+    def start(self):
+        """Start a round of communication.
+
+        Send requests must then mark every partition with pready.
+        """
+        if self.native:
+            _check_error(lib.MPI_Start(self._request))
+            return
+
+        self._arrived = [False] * self.partitions
+        if not self.is_send:
+            _check_error(lib.MPI_Startall(self.partitions, self._requests.requests))
+
+    def pready(self, partition):
+        """Mark a partition of a send request as ready to be sent.
+
+        Parameters
+        ----------
+        partition : int
+            Index of the partition
+        """
+        if self.native:
+            _check_error(lib.yapympi_Pready(partition, self._request[0]))
+            return
+
+        _check_error(lib.MPI_Start(self._requests.requests + partition))
+
+    def parrived(self, partition):
+        """Test if a partition of a receive request has arrived.
+
+        Parameters
+        ----------
+        partition : int
+            Index of the partition
+
+        Returns
+        -------
+        flag : bool
+            True if the partition has arrived
+        """
+        flag = ffi.new("int*")
+        if self.native:
+            _check_error(lib.yapympi_Parrived(self._request[0], partition, flag))
+            return bool(flag[0])
+
+        if not self._arrived[partition]:
+            request_p = self._requests.requests + partition
+            _check_error(lib.MPI_Test(request_p, flag, lib.MPI_STATUS_IGNORE))
+            self._arrived[partition] = bool(flag[0])
+        return self._arrived[partition]
+
+    def wait(self):
+        """Wait for the current round of communication to complete."""
+        if self.native:
+            _check_error(lib.MPI_Wait(self._request, lib.MPI_STATUS_IGNORE))
+            return
+
+        statuses = ffi.new("MPI_Status[]", self.partitions)
+        retcode = lib.MPI_Waitall(self.partitions, self._requests.requests, statuses)
+        if retcode == lib.MPI_ERR_IN_STATUS:
+            erridxs = [i for i in range(self.partitions) if statuses[i].MPI_ERROR != lib.MPI_SUCCESS]
+            errcodes = [statuses[i].MPI_ERROR for i in erridxs]
+            raise MPIStatusErrors(errcodes, erridxs=erridxs)
+        _check_error(retcode)
+        self._arrived = [True] * self.partitions
+
+    def free(self):
+        """Free the request; it must not be active."""
+        if self.native:
+            _check_error(lib.MPI_Request_free(self._request))
+            return
+
+        for i in range(self.partitions):
+            _check_error(lib.MPI_Request_free(self._requests.requests + i))
+        self._requests.clear()
@@ -0,0 +1,524 @@
+"""PMPI-style profiling hooks.
+
+Profiling is implemented by interposition, in the spirit of the MPI
+profiling interface (PMPI). When the first tool is installed the public
+wrappers in :mod:`yapympi.base` and the methods of
+:class:`yapympi.request_manager.RequestManager` are replaced with
+instrumented versions, and the ``lib`` object used by those modules is
+replaced with a proxy that times every call into the MPI library.
+When the last tool is removed the original functions are restored,
+so there is no overhead when profiling is disabled.
+
+Since the wrappers are replaced at the module level, code must call them
+through the module (``mpi.send(...)`` after ``import yapympi.base as mpi``)
+for the calls to be seen by the tools.
+
+Only the outermost wrapper call is recorded. Time spent in MPI by nested
+wrapper calls (e.g. ``comm_rank`` inside ``bcast``) is attributed to the
+outermost call.
+"""
+
+import sys
+import time
+import pickle
+import inspect
+import operator
+import threading
+import functools
+from array import array
+
+from . import base
+from . import status
+from . import request_array
+from . import request_manager
+
+_TOOLS = []
+_PATCHES = []
+_LOCAL = threading.local()
+
+# Helper functions in base that are not instrumented
+_SKIP_FUNCTIONS = {
+    "error_string",
+    "check_error",
+    "check_error_in_status",
+    "list_to_array",
+    "split_buffer",
+    "buffer_datatype",
+    "wtime",
+    "wtick",
+}
+
+# Argument names used to find the peer of a call
+_PEER_ARGS = ("dest", "source", "root")
+
+# Argument names used to find the peers of a batch call
+_BATCH_PEER_ARGS = ("dests", "sources")
+
+
+class CallInfo:
+    """Information about a single call to an instrumented function.
+
+    Attributes
+    ----------
+    name : str
+        Name of the called function
+    peer : int or None
+        Rank of the peer process (destination, source or root)
+    tag : int or None
+        Message tag
+    nbytes : int
+        Size of the message buffer in bytes
+    batch : list of (int, int) or None
+        Peer and size in bytes of each message of a batch call;
+        None for other calls
+    comm : MPI_Comm or None
+        Communicator of the peer ranks
+    start : float
+        Time (from time.perf_counter) when the call started
+    end : float
+        Time (from time.perf_counter) when the call ended
+    mpi_time : float
+        Time spent inside the MPI library during the call
+    """
+
+    __slots__ = ("name", "peer", "tag", "nbytes", "batch", "comm", "start", "end", "mpi_time")
+
+    def __init__(self, name, peer=None, tag=None, nbytes=0, batch=None, comm=None):
+        self.name = name
+        self.peer = peer
+        self.tag = tag
+        self.nbytes = nbytes
+        self.batch = batch
+        self.comm = comm
+        self.start = 0.0
+        self.end = 0.0
+        self.mpi_time = 0.0
+
+    @property
+    def total_time(self):
+        """Total wall time of the call."""
+        return self.end - self.start
+
+    @property
+    def wrapper_time(self):
+        """Wall time of the call spent outside of the MPI library."""
+        return self.total_time - self.mpi_time
+
+    def __repr__(self):
+        fmt = "CallInfo(name=%r, peer=%r, tag=%r, nbytes=%d, total_time=%g, mpi_time=%g)"
+        return fmt % (
+            self.name,
+            self.peer,
+            self.tag,
+            self.nbytes,
+            self.total_time,
+            self.mpi_time,
+        )
+
+
+class Tool:
+    """Base class of profiling tools.
+
+    Tools are notified after every instrumented call completes,
+    and once more just before MPI_Finalize is called.
+    """
+
+    def on_call(self, info):
+        """Process a completed call.
+
+        Parameters
+        ----------
+        info : CallInfo
+            Information about the completed call
+        """
+
+    def on_finalize(self):
+        """Process the end of the run.
+
+        This is called just before MPI_Finalize,
+        so tools can still communicate with other ranks.
+        """
+
+
+def _frames():
+    """Return the stack of active calls of the current thread."""
+    try:
+        return _LOCAL.frames
+    except AttributeError:
+        _LOCAL.frames = []
+        return _LOCAL.frames
+
+
+class _TimedLib:
+    """Proxy for the cffi lib object that times calls into MPI."""
+
+    def __init__(self, lib):
+        self._lib = lib
+
+    def __getattr__(self, name):
+        attr = getattr(self._lib, name)
+        # cdata constants (e.g. MPI_REQUEST_NULL) are callable too
+        if not callable(attr) or isinstance(attr, base.ffi.CData):
+            self.__dict__[name] = attr
+            return attr
+
+        def timed(*args):
+            start = time.perf_counter()
+            try:
+                return attr(*args)
+            finally:
+                frames = _frames()
+                if frames:
+                    frames[-1].mpi_time += time.perf_counter() - start
+
+        self.__dict__[name] = timed
+        return timed
+
+
+def _buffer_nbytes(buf):
+    """Return the size of a buffer object in bytes."""
+    try:
+        return memoryview(buf).nbytes
+    except TypeError:
+        return 0
+
+
+def _make_call_info(name, sig, args, kwargs):
+    """Create the CallInfo object from the arguments of a call."""
+    try:
+        bound = sig.bind(*args, **kwargs)
+    except TypeError:
+        return CallInfo(name)
+    bound.apply_defaults()
+    arguments = bound.arguments
+
+    peer = None
+    for arg in _PEER_ARGS:
+        if arg in arguments:
+            peer = arguments[arg]
+            break
+    tag = arguments.get("tag", None)
+    batch = None
+    if "buf" in arguments:
+        nbytes = _buffer_nbytes(arguments["buf"])
+    elif "sendbuf" in arguments:
+        nbytes = _buffer_nbytes(arguments["sendbuf"])
+    elif "bufs" in arguments:
+        sizes = [_buffer_nbytes(buf) for buf in arguments["bufs"]]
+        nbytes = sum(sizes)
+        for arg in _BATCH_PEER_ARGS:
+            if arg in arguments:
+                peers = arguments[arg]
+                try:
+                    peers = [operator.index(peers)] * len(sizes)
+                except TypeError:
+                    pass
+                batch = [(operator.index(peer), nbytes) for peer, nbytes in zip(peers, sizes)]
+                break
+    else:
+        nbytes = 0
+
+    comm = arguments.get("comm", None)
+    if comm is None and "self" in arguments:
+        # RequestManager methods use the communicator of the manager
+        comm = getattr(arguments["self"], "comm", None)
+
+    return CallInfo(name, peer, tag, nbytes, batch, comm)
+
+
+def _refine_from_status(info, result):
+    """Fill in wildcard source and tag from a returned MPI_Status*."""
+    lib = base.lib
+    if isinstance(result, tuple):
+        result = result[-1]
+    if not isinstance(result, base.ffi.CData):
+        return
+    if base.ffi.typeof(result) is not base.ffi.typeof("MPI_Status*"):
+        return
+
+    if info.peer is None or info.peer == lib.MPI_ANY_SOURCE:
+        info.peer = result.MPI_SOURCE
+    if info.tag is None or info.tag == lib.MPI_ANY_TAG:
+        info.tag = result.MPI_TAG
+
+
+# Frame of the calls made by tools while they process a call
+_TOOL_FRAME = CallInfo("tool")
+
+
+def _instrument(name, func):
+    """Return an instrumented version of func."""
+    sig = inspect.signature(func)
+    is_finalize = name == "finalize"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        frames = _frames()
+        if frames:
+            return func(*args, **kwargs)
+
+        info = _make_call_info(name, sig, args, kwargs)
+        frames.append(info)
+        info.start = time.perf_counter()
+        try:
+            if is_finalize:
+                for tool in list(_TOOLS):
+                    tool.on_finalize()
+            result = func(*args, **kwargs)
+            _refine_from_status(info, result)
+            return result
+        finally:
+            info.end = time.perf_counter()
+            frames.pop()
+            # Wrappers called by the tools are not recorded
+            frames.append(_TOOL_FRAME)
+            try:
+                for tool in _TOOLS:
+                    tool.on_call(info)
+            finally:
+                frames.pop()
+
+    return wrapper
+
+
+def _patch():
+    """Replace the wrappers with their instrumented versions."""
+    timed_lib = _TimedLib(base.lib)
+    for module in (base, status, request_array, request_manager):
+        _PATCHES.append((module, "lib", module.lib))
+        module.lib = timed_lib
+
+    for name, func in list(vars(base).items()):
+        if name.startswith("_") or name in _SKIP_FUNCTIONS:
+            continue
+        if not inspect.isfunction(func) or func.__module__ != base.__name__:
+            continue
+        _PATCHES.append((base, name, func))
+        setattr(base, name, _instrument(name, func))
+
+    cls = request_manager.RequestManager
+    for name in ("send", "recv", "bcast", "test"):
+        func = vars(cls)[name]
+        _PATCHES.append((cls, name, func))
+        setattr(cls, name, _instrument("RequestManager." + name, func))
+
+
+def _unpatch():
+    """Restore the original wrappers."""
+    while _PATCHES:
+        obj, name, orig = _PATCHES.pop()
+        setattr(obj, name, orig)
+
+
+def gather_objects(obj, root=0, comm=base.lib.MPI_COMM_WORLD):
+    """Gather picklable objects from all ranks to the root.
+
+    Tools use this in on_finalize to collect per rank data.
+
+    Parameters
+    ----------
+    obj : object
+        A picklable object
+    root : int
+        Rank of the receiving process
+    comm : MPI_Comm
+        Communicator
+
+    Returns
+    -------
+    objs : list or None
+        On root, the list of objects indexed by rank; None elsewhere.
+    """
+    data = pickle.dumps(obj)
+    rank = base.comm_rank(comm)
+    size = base.comm_size(comm)
+    is_root = rank == root
+
+    # Collectives don't use tags, so they can't match the caller's messages
+    counts = array("i", [0]) * size if is_root else None
+    base.gather(array("i", [len(data)]), counts, root, comm)
+    buf = bytearray(sum(counts)) if is_root else None
+    base.gatherv(data, buf, counts, root=root, comm=comm, datatype=base.lib.MPI_BYTE)
+    if not is_root:
+        return None
+
+    objs, offset = [], 0
+    for src, count in enumerate(counts):
+        objs.append(obj if src == root else pickle.loads(buf[offset : offset + count]))
+        offset += count
+    return objs
+
+
+def install(tool):
+    """Install a profiling tool.
+
+    Parameters
+    ----------
+    tool : Tool
+        The tool to be notified of calls
+    """
+    if not _TOOLS:
+        _patch()
+    _TOOLS.append(tool)
+
+
+def uninstall(tool):
+    """Uninstall a previously installed profiling tool.
+
+    Parameters
+    ----------
+    tool : Tool
+        The tool to be removed
+    """
+    _TOOLS.remove(tool)
+    if not _TOOLS:
+        _unpatch()
+
+
+def is_enabled():
+    """Return True if any profiling tool is installed."""
+    return bool(_TOOLS)
+
+
+class CallStats:
+    """Aggregate statistics for calls to a single function.
+
+    Attributes
+    ----------
+    count : int
+        Number of calls
+    nbytes : int
+        Total size of message buffers in bytes
+    total_time : float
+        Total wall time of the calls
+    mpi_time : float
+        Wall time spent inside the MPI library
+    """
+
+    __slots__ = ("count", "nbytes", "total_time", "mpi_time")
+
+    def __init__(self):
+        self.count = 0
+        self.nbytes = 0
+        self.total_time = 0.0
+        self.mpi_time = 0.0
+
+    @property
+    def wrapper_time(self):
+        """Wall time spent outside of the MPI library."""
+        return self.total_time - self.mpi_time
+
+    def add(self, info):
+        """Add a completed call to the statistics."""
+        self.count += 1
+        self.nbytes += info.nbytes
+        self.total_time += info.total_time
+        self.mpi_time += info.mpi_time
+
+
+class Profiler(Tool):
+    """Tool collecting per call and per peer/tag statistics.
+
+    Attributes
+    ----------
+    stats : dict of str to CallStats
+        Statistics per function
+    peers : dict of (str, int, int) to CallStats
+        Statistics per function, peer and tag
+    output : file object or str or None
+        Where to write the summary at finalize.
+        If a string, it is used as a filename pattern with the rank
+        substituted for "%d".
+        If None, no summary is written.
+    """
+
+    def __init__(self, output=None):
+        self.stats = {}
+        self.peers = {}
+        self.output = output
+        self.rank = None
+
+    def on_call(self, info):
+        if info.name not in self.stats:
+            self.stats[info.name] = CallStats()
+        self.stats[info.name].add(info)
+
+        if info.peer is not None or info.tag is not None:
+            key = (info.name, info.peer, info.tag)
+            if key not in self.peers:
+                self.peers[key] = CallStats()
+            self.peers[key].add(info)
+
+    def on_finalize(self):
+        self.rank = base.comm_rank()
+        if self.output is None:
+            return
+
+        if isinstance(self.output, str):
+            with open(self.output % self.rank, "wt") as fobj:
+                fobj.write(self.summary())
+        else:
+            self.output.write(self.summary())
+            self.output.flush()
+
+    def summary(self):
+        """Return a summary of the collected statistics.
+
+        Returns
+        -------
+        summary : str
+            Text table of the collected statistics
+        """
+        rank = "?" if self.rank is None else str(self.rank)
+        lines = ["yapympi profile: rank %s" % rank]
+
+        fmt = "%-28s %10s %14s %12s %12s %12s"
+        lines.append(fmt % ("function", "calls", "bytes", "total (s)", "mpi (s)", "wrapper (s)"))
+        fmt = "%-28s %10d %14d %12.6f %12.6f %12.6f"
+        for name in sorted(self.stats):
+            s = self.stats[name]
+            row = (name, s.count, s.nbytes, s.total_time, s.mpi_time, s.wrapper_time)
+            lines.append(fmt % row)
+
+        if self.peers:
+            lines.append("")
+            fmt = "%-28s %8s %8s %10s %14s %12s"
+            lines.append(fmt % ("function", "peer", "tag", "calls", "bytes", "mpi (s)"))
+            fmt = "%-28s %8s %8s %10d %14d %12.6f"
+            for key in sorted(self.peers, key=repr):
+                name, peer, tag = key
+                s = self.peers[key]
+                row = (name, peer, tag, s.count, s.nbytes, s.mpi_time)
+                lines.append(fmt % row)
+
+        return "\n".join(lines) + "\n"
+
+
+def enable(output=sys.stderr):
+    """Enable profiling with a new Profiler.
+
+    Parameters
+    ----------
+    output : file object or str or None
+        Where to write the per rank summary at finalize.
+        See Profiler.
+
+    Returns
+    -------
+    profiler : Profiler
+        The installed profiler
+    """
+    profiler = Profiler(output)
+    install(profiler)
+    return profiler
+
+
+def disable(profiler):
+    """Disable a profiler created with enable.
+
+    Parameters
+    ----------
+    profiler : Profiler
+        The profiler returned by enable
+    """
+    uninstall(profiler)
@@ -0,0 +1,230 @@
+"""Contiguous arrays of MPI requests."""
+
+from .cmpi import ffi, lib
+
+
+class RequestArray:
+    """A growable, compacting MPI_Request[] with per request slots.
+
+    Active requests are kept at the front of a contiguous MPI_Request[],
+    with a handle and a buffer slot for each. Removing completed requests
+    moves the last active requests into the freed positions, so the free
+    slots always form the tail of the array and removal costs
+    O(completed). The array doubles its capacity when full; in steady
+    state it is never reallocated.
+
+    The array also owns the int[] and MPI_Status[] arrays that
+    waitsome and testsome fill in, so polling an array does not
+    allocate. testsome_remove tests and compacts the requests in a
+    single call into C.
+
+    The wait* and test* functions of :mod:`yapympi.base` accept a
+    RequestArray directly and only consider its first len(array)
+    requests, so no copy is made.
+
+    Pointers returned by reserve are invalidated when the array grows.
+
+    Attributes
+    ----------
+    capacity : int
+        Number of allocated requests
+    size : int
+        Number of requests in use
+    requests : MPI_Request[]
+        The request array
+    handles : list
+        Handle of each request in use
+    buffers : list
+        Buffer of each request in use, kept alive until the
+        request is removed
+    indices : int[]
+        Index array for waitsome and testsome
+    statuses : MPI_Status[]
+        Status array for waitsome and testsome
+    """
+
+    def __init__(self, capacity=16):
+        self.capacity = max(int(capacity), 1)
+        self.size = 0
+        self.handles = []
+        self.buffers = []
+        self._alloc(self.capacity)
+
+    def _alloc(self, capacity):
+        """Allocate the arrays with the given capacity, keeping the requests."""
+        requests = ffi.new("MPI_Request[]", capacity)
+        for i in range(capacity):
+            requests[i] = lib.MPI_REQUEST_NULL
+        if self.size:
+            ffi.memmove(requests, self.requests, self.size * ffi.sizeof("MPI_Request"))
+
+        self.capacity = capacity
+        self.requests = requests
+        self.indices = ffi.new("int[]", capacity)
+        self.statuses = ffi.new("MPI_Status[]", capacity)
+        self._moves = ffi.new("int[]", 2 * capacity)
+        self._size_p = ffi.new("int*")
+        self._outcount = ffi.new("int*")
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return "RequestArray(size=%d, capacity=%d)" % (self.size, self.capacity)
+
+    def reserve(self, n, handles=None):
+        """Reserve the next n requests, growing the array if needed.
+
+        Parameters
+        ----------
+        n : int
+            Number of requests to reserve
+        handles : sequence or None
+            Handles of the reserved requests.
+            If None the handles are set to None.
+
+        Returns
+        -------
+        requests : MPI_Request*
+            Pointer to the first reserved request
+        """
+        if self.size + n > self.capacity:
+            capacity = self.capacity
+            while self.size + n > capacity:
+                capacity *= 2
+            self._alloc(capacity)
+
+        if handles is None:
+            self.handles.extend([None] * n)
+        else:
+            if len(handles) != n:
+                raise ValueError("Expected %d handles; got %d" % (n, len(handles)))
+            self.handles.extend(handles)
+        self.buffers.extend([None] * n)
+
+        requests = self.requests + self.size
+        self.size += n
+        return requests
+
+    def add(self, handle=None, buffer=None):
+        """Reserve a single request.
+
+        Parameters
+        ----------
+        handle : object
+            Handle of the request
+        buffer : object
+            Buffer to keep alive until the request is removed
+
+        Returns
+        -------
+        request : MPI_Request*
+            Pointer to the reserved request
+        """
+        request = self.reserve(1, (handle,))
+        self.buffers[self.size - 1] = buffer
+        return request
+
+    def _remove_one(self, idx):
+        """Remove the request at idx by moving the last request into it."""
+        last = self.size - 1
+        if idx < last:
+            self.requests[idx] = self.requests[last]
+            self.handles[idx] = self.handles[last]
+            self.buffers[idx] = self.buffers[last]
+        elif idx > last:
+            raise ValueError("Can't remove index idx=%d; size=%d" % (idx, self.size))
+
+        self.requests[last] = lib.MPI_REQUEST_NULL
+        del self.handles[last]
+        del self.buffers[last]
+        self.size = last
+
+    def remove(self, indices):
+        """Remove completed requests.
+
+        Parameters
+        ----------
+        indices : list of int
+            Indices of the requests to remove,
+            as returned by waitsome or testsome
+
+        Returns
+        -------
+        handles : list
+            Handles of the removed requests, in the order of indices
+        """
+        handles = [self.handles[idx] for idx in indices]
+        for idx in sorted(indices, reverse=True):
+            self._remove_one(idx)
+        return handles
+
+    def testsome_remove(self):
+        """Test the requests for completion and remove the completed ones.
+
+        MPI_Testsome and the compaction of the request array run in one
+        call into C, which returns the moves it made; only the handle
+        and buffer lists are updated in Python. The indices and statuses
+        of the completed requests are left in indices and statuses.
+
+        Returns
+        -------
+        retcode : int
+            Return code of MPI_Testsome. Completed requests are
+            removed if it is MPI_SUCCESS or MPI_ERR_IN_STATUS.
+        handles : list
+            Handles of the removed requests, in the order of
+            indices and statuses
+        """
+        self._size_p[0] = self.size
+        retcode = lib.yapympi_testsome_compact(
+            self._size_p, self.requests, self._outcount, self.indices, self.statuses, self._moves
+        )
+        outcount = self._outcount[0]
+        if not outcount:
+            return retcode, []
+
+        handles, buffers = self.handles, self.buffers
+        removed = [handles[idx] for idx in ffi.unpack(self.indices, outcount)]
+        moves = ffi.unpack(self._moves, 2 * outcount)
+        for i in range(0, 2 * outcount, 2):
+            src = moves[i + 1]
+            if src >= 0:
+                handles[moves[i]] = handles[src]
+                buffers[moves[i]] = buffers[src]
+
+        self.size = self._size_p[0]
+        del handles[self.size :]
+        del buffers[self.size :]
+        return retcode, removed
+
+    def clear(self):
+        """Forget all requests and release the buffers.
+
+        All requests must have completed.
+        """
+        for i in range(self.size):
+            self.requests[i] = lib.MPI_REQUEST_NULL
+        self.size = 0
+        self.handles = []
+        self.buffers = []
+
+
+def as_request_array(requests):
+    """Return the request array and count for the wait* and test* functions.
+
+    Parameters
+    ----------
+    requests : MPI_Request[] or RequestArray
+        Array of requests
+
+    Returns
+    -------
+    array : MPI_Request[] or MPI_Request*
+        The requests
+    count : int
+        Number of requests
+    """
+    if isinstance(requests, RequestArray):
+        return requests.requests, requests.size
+    return requests, len(requests)
@@ -1,25 +1,85 @@
 """Async MPI Request Manager."""
 
+import time
+import threading
+
 from .cmpi import ffi, lib
 from .status import MPIStatus
-from .error import MPIError, MPIStatusErrors
+from .request_array import RequestArray
+from .error import MPIError, MPIStatusErrors, MPITimeoutError
+
+STANDARD = "standard"
+SYNCHRONOUS = "synchronous"
+READY = "ready"
+BUFFERED = "buffered"
+
+# Nonblocking MPI send function of each send mode
+_SEND_FUNCTIONS = {
+    STANDARD: "MPI_Isend",
+    SYNCHRONOUS: "MPI_Issend",
+    READY: "MPI_Irsend",
+    BUFFERED: "MPI_Ibsend",
+}
 
 
 class RequestManager:
-    def __init__(self, capacity, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE):
+    """Manager of a fixed capacity set of nonblocking requests.
+
+    All methods are protected by a lock, so a manager can be shared
+    between threads when MPI has been initialized with
+    MPI_THREAD_MULTIPLE (or MPI_THREAD_SERIALIZED if no other thread
+    calls MPI concurrently).
+
+    Errors are only reported by MPI (instead of aborting the job) once
+    the communicator's error handler is set to MPI_ERRORS_RETURN, see
+    yapympi.base.comm_set_nonfatal_errhandler. When test or wait then
+    fails, the requests that completed, including the failed ones, are
+    removed, and the error lists the handles of the failed requests.
+    With cancel_on_error the remaining requests are also cancelled,
+    so the manager is empty and can be reused. Cancelled requests keep
+    their buffers alive until MPI completes them, which test checks.
+
+    Attributes
+    ----------
+    error : MPIErrorBase or None
+        The last error raised by test or wait
+    """
+
+    def __init__(self, capacity, comm=lib.MPI_COMM_WORLD, datatype=lib.MPI_BYTE, cancel_on_error=False):
+        self.lock = threading.Lock()
         self.capacity = int(capacity)
         self.comm = comm
         self.datatype = datatype
+        self.cancel_on_error = cancel_on_error
+        self.error = None
+
+        # Counts are in datatype elements, as in yapympi.base
+        type_size = ffi.new("int*")
+        retcode = lib.MPI_Type_size(datatype, type_size)
+        if retcode != lib.MPI_SUCCESS:
+            raise MPIError(retcode)
+        self._type_size = type_size[0]
+
+        self.array = RequestArray(self.capacity)
+
+        # Cancelled requests, with the buffers MPI may still access
+        # until they complete
+        self._cancelled = RequestArray(self.capacity)
 
-        self.size = 0
-        self.requests = ffi.new("MPI_Request[]", self.capacity)
-        self.handles = []
+    def _count(self, nbytes):
+        """Return the number of datatype elements in nbytes bytes."""
+        if nbytes % self._type_size:
+            raise ValueError(
+                "Buffer size %d is not a multiple of the datatype size %d" % (nbytes, self._type_size)
+            )
+        return nbytes // self._type_size
 
-        self.indices = ffi.new("int[]", self.capacity)
-        self.outcount = ffi.new("int*")
-        self.statuses = ffi.new("MPI_Status[]", self.capacity)
+    @property
+    def size(self):
+        """Number of pending requests."""
+        return len(self.array)
 
-    def send(self, buf, dest, tag, handle=None):
+    def send(self, buf, dest, tag, handle=None, mode=STANDARD):
         """Begin a nonblocking send.
 
         Parameters
@@ -32,27 +92,35 @@ class RequestManager:
             Message tag
         handle : object
             Handle object to be returned when the requst is complete
+        mode : str
+            Send mode: "standard", "synchronous" (completes once the
+            receive has started), "ready" (the receive must already be
+            posted) or "buffered" (needs a buffer from base.buffer_attach)
         """
-        if self.size == self.capacity:
-            raise ValueError("Request manager has reached capacity")
+        try:
+            send_function = _SEND_FUNCTIONS[mode]
+        except KeyError:
+            raise ValueError("Unknown send mode %r" % mode) from None
 
-        if isinstance(buf, bytes):
-            cbuf = ffi.new("char[]", buf)
-        else:
-            cbuf = ffi.from_buffer("char[]", buf)
-        count = len(cbuf)
+        with self.lock:
+            if self.size == self.capacity:
+                raise ValueError("Request manager has reached capacity")
 
-        request = self.requests[self.size]
-        request_p = ffi.addressof(request)
+            if isinstance(buf, bytes):
+                # The terminating NUL of the copy is only sent as MPI_BYTE
+                cbuf = ffi.new("char[]", buf)
+                count = len(cbuf) if self.datatype == lib.MPI_BYTE else self._count(len(buf))
+            else:
+                cbuf = ffi.from_buffer("char[]", buf)
+                count = self._count(len(cbuf))
 
-        retcode = lib.MPI_Isend(
-            cbuf, count, self.datatype, dest, tag, self.comm, request_p
-        )
-        if retcode != lib.MPI_SUCCESS:
-            raise MPIError(retcode)
+            request_p = self.array.add(handle, cbuf)
 
-        self.handles.append(handle)
-        self.size += 1
+            retcode = getattr(lib, send_function)(
+                cbuf, count, self.datatype, dest, tag, self.comm, request_p
+            )
+            if retcode != lib.MPI_SUCCESS:
+                self._post_failed(retcode)
 
     def recv(self, buf, source=lib.MPI_ANY_SOURCE, tag=lib.MPI_ANY_TAG, handle=None):
         """Begin a nonblocking receive.
@@ -68,73 +136,260 @@ class RequestManager:
         handle : object
             Handle object to be returned when the requst is complete
         """
-        if self.size == self.capacity:
-            raise ValueError("Request manager has reached capacity")
+        with self.lock:
+            if self.size == self.capacity:
+                raise ValueError("Request manager has reached capacity")
 
-        cbuf = ffi.from_buffer("char[]", buf, require_writable=True)
-        count = len(cbuf)
+            cbuf = ffi.from_buffer("char[]", buf, require_writable=True)
+            count = self._count(len(cbuf))
 
-        request = self.requests[self.size]
-        request_p = ffi.addressof(request)
+            request_p = self.array.add(handle, cbuf)
 
-        retcode = lib.MPI_Irecv(
-            cbuf, count, self.datatype, source, tag, self.comm, request_p
-        )
-        if retcode != lib.MPI_SUCCESS:
-            raise MPIError(retcode)
+            retcode = lib.MPI_Irecv(
+                cbuf, count, self.datatype, source, tag, self.comm, request_p
+            )
+            if retcode != lib.MPI_SUCCESS:
+                self._post_failed(retcode)
+
+    def bcast(self, buf, root, handle=None):
+        """Begin a nonblocking broadcast.
+
+        Parameters
+        ----------
+        buf : bytes or any object supporting buffer interface
+            Starting address of buffer
+            Must be writable on all ranks other than root.
+        root : int
+            Rank of broadcast root
+        handle : object
+            Handle object to be returned when the requst is complete
+        """
+        with self.lock:
+            if self.size == self.capacity:
+                raise ValueError("Request manager has reached capacity")
+
+            rank = ffi.new("int*")
+            retcode = lib.MPI_Comm_rank(self.comm, rank)
+            if retcode != lib.MPI_SUCCESS:
+                raise MPIError(retcode)
 
-        self.handles.append(handle)
-        self.size += 1
+            if rank[0] == root:
+                cbuf = ffi.from_buffer("char[]", buf)
+            else:
+                cbuf = ffi.from_buffer("char[]", buf, require_writable=True)
+            count = self._count(len(cbuf))
 
-    def _del_request(self, idx):
-        """Delete the requst at the given index."""
-        if idx == self.size - 1:
-            del self.handles[self.size - 1]
-            self.size -= 1
+            request_p = self.array.add(handle, cbuf)
 
-        elif idx < self.size - 1:
-            self.requests[idx] = self.requests[self.size - 1]
-            self.handles[idx] = self.handles[self.size - 1]
-            del self.handles[self.size - 1]
-            self.size -= 1
+            retcode = lib.MPI_Ibcast(cbuf, count, self.datatype, root, self.comm, request_p)
+            if retcode != lib.MPI_SUCCESS:
+                self._post_failed(retcode)
 
-        raise ValueError("Can't remove index idx=%d; size=%d" % (idx, self.size))
+    def _post_failed(self, retcode):
+        """Release the slot reserved for a failed post and raise; the lock must be held."""
+        self.array.remove([self.array.size - 1])
+        raise MPIError(retcode)
 
     def test(self):
-        """Test all pending requests for completion."""
-        if not self.size:
-            return None, None
+        """Test all pending requests for completion.
 
-        lib.memset(self.indices, 0, ffi.sizeof(self.indices))
-        self.outcount[0] = 0
-        lib.memset(self.statuses, 0, ffi.sizeof(self.statuses))
+        Returns
+        -------
+        handles : list or None
+            Handles of the completed requests; None if none completed
+        statuses : list of MPIStatus or None
+            Statuses of the completed requests
 
-        retcode = lib.MPI_Testsome(
-            self.size, self.requests, self.outcount, self.indices, self.statuses
-        )
-        if retcode != lib.MPI_SUCCESS:
-            if retcode == lib.MPI_ERR_IN_STATUS:
-                errorcodes, handles = [], []
-                for i in range(self.size):
-                    if self.statuses[i].MPI_ERROR != lib.MPI_SUCCESS:
-                        errorcodes.append(self.statuses[i].MPI_ERROR)
-                        handles.append(self.handles[i])
-                raise MPIStatusErrors(errorcodes, handles)
-            else:
-                raise MPIError(retcode)
+        Raises
+        ------
+        MPIStatusErrors
+            If some completed requests failed; its handles and erridxs
+            are the handles and request indices of the failed requests
+        MPIError
+            For any other error
+        """
+        with self.lock:
+            self._reap()
+            if not self.size:
+                return None, None
+
+            array = self.array
+            retcode, handles = array.testsome_remove()
+            if retcode != lib.MPI_SUCCESS:
+                self._fail(retcode, handles)
+            if not handles:
+                return None, None
+
+            statuses = [MPIStatus(array.statuses[i], self.datatype) for i in range(len(handles))]
+            return handles, statuses
+
+    def wait(self, timeout=None, interval=0.0):
+        """Wait until at least one pending request completes.
+
+        Parameters
+        ----------
+        timeout : float or None
+            Maximum time to wait in seconds; None waits forever
+        interval : float
+            Time in seconds to sleep between tests
+
+        Returns
+        -------
+        handles : list or None
+            Handles of the completed requests; None if nothing is pending
+        statuses : list of MPIStatus or None
+            Statuses of the completed requests
+
+        Raises
+        ------
+        MPITimeoutError
+            If no request completed within timeout. With cancel_on_error
+            the pending requests are then cancelled.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.size:
+            handles, statuses = self.test()
+            if handles is not None:
+                return handles, statuses
+            if deadline is not None and time.monotonic() >= deadline:
+                error = MPITimeoutError(timeout)
+                self.error = error
+                if self.cancel_on_error:
+                    self.cancel_all()
+                raise error
+            time.sleep(interval)
+        return None, None
+
+    def _fail(self, retcode, removed):
+        """Handle an error of MPI_Testsome; the lock must be held.
+
+        Completed requests, failed or not, are deallocated by MPI and
+        have already been removed; removed holds their handles.
+        """
+        array = self.array
+        if retcode == lib.MPI_ERR_IN_STATUS:
+            errorcodes, handles, erridxs = [], [], []
+            for i, handle in enumerate(removed):
+                if array.statuses[i].MPI_ERROR != lib.MPI_SUCCESS:
+                    errorcodes.append(array.statuses[i].MPI_ERROR)
+                    handles.append(handle)
+                    erridxs.append(array.indices[i])
+            error = MPIStatusErrors(errorcodes, handles, erridxs)
+        else:
+            error = MPIError(retcode)
+
+        self.error = error
+        if self.cancel_on_error:
+            self._cancel_all()
+        raise error
+
+    def cancel_all(self):
+        """Cancel all pending requests.
+
+        Returns
+        -------
+        handles : list
+            Handles of the cancelled requests
+        """
+        with self.lock:
+            return self._cancel_all()
+
+    def _cancel_all(self):
+        """Cancel all pending requests; the lock must be held."""
+        array, cancelled = self.array, self._cancelled
+        request_p = cancelled.reserve(array.size)
+        cancelled.buffers[cancelled.size - array.size :] = array.buffers
+        for i in range(array.size):
+            # Errors are ignored, the requests are being torn down
+            lib.MPI_Cancel(array.requests + i)
+            request_p[i] = array.requests[i]
+        handles = list(array.handles)
+        array.clear()
+        self._reap()
+        return handles
+
+    def _reap(self):
+        """Release the buffers of the cancelled requests that completed; the lock must be held."""
+        if self._cancelled.size:
+            # Errors are ignored, the requests were cancelled
+            self._cancelled.testsome_remove()
+
+
+class ProgressEngine:
+    """Background thread driving the requests of a RequestManager.
+
+    Many MPI implementations only progress nonblocking operations while
+    the application is inside an MPI call. The progress engine calls
+    RequestManager.test from a background thread every interval seconds
+    and calls the callback for every completed request.
+
+    cffi releases the GIL around calls into MPI, so the main thread
+    keeps running while the engine is inside MPI_Testsome.
+    MPI must have been initialized with MPI_THREAD_MULTIPLE.
+
+    Attributes
+    ----------
+    manager : RequestManager
+        The manager whose requests are tested
+    callback : callable
+        Called as callback(handle, status) for every completed request
+    interval : float
+        Time in seconds to sleep between tests
+    error : Exception or None
+        Exception raised by test or the callback, which stops the engine
+    """
+
+    def __init__(self, manager, callback, interval=0.001):
+        self.manager = manager
+        self.callback = callback
+        self.interval = interval
+        self.error = None
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background thread."""
+        if self._thread is not None:
+            raise RuntimeError("Progress engine is already running")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and wait for it to exit.
+
+        Raises
+        ------
+        Exception
+            The exception that stopped the engine, if any
+        """
+        if self._thread is None:
+            return
 
-        outcount = int(self.outcount[0])
-        if not outcount:
-            return None, None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
 
-        indices = [self.indices[i] for i in range(outcount)]
+        if self.error is not None:
+            raise self.error
 
-        handles, statuses = [], []
-        for idx in range(indices):
-            handles.append(self.handles[idx])
-            statuses.append(MPIStatus(self.statuses[idx]))
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                handles, statuses = self.manager.test()
+                if handles is not None:
+                    for handle, status in zip(handles, statuses):
+                        self.callback(handle, status)
+                elif self.interval:
+                    time.sleep(self.interval)
+        except Exception as e:  # pylint: disable=broad-except
+            self.error = e
 
-        for idx in sorted(indices, reverse=True):
-            self._del_request(idx)
+    def __enter__(self):
+        self.start()
+        return self
 
-        return handles, statuses
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
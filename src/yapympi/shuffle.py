@@ -0,0 +1,223 @@
+"""Distributed sort and shuffle of NumPy arrays.
+
+The functions here repartition the elements of one dimensional NumPy
+arrays (including structured / record arrays) across the processes of a
+communicator. Each process passes its local array and gets back its new
+local array.
+
+- exchange sends every element to the process given by an array of
+  destination ranks, with one alltoall of counts and one alltoallv.
+- hash_shuffle sends elements with equal keys to the same process.
+- sample_sort sorts globally: afterwards every process holds a sorted
+  array and all keys on process i are <= all keys on process i + 1.
+
+All local work (partitioning, sorting, merging) is vectorized with NumPy.
+Data is exchanged as bytes, so the data sent from one process to another
+must be less than 2 GiB.
+
+NumPy is required.
+"""
+
+import numpy as np
+
+from .cmpi import lib
+from . import base
+
+# Multiplier of the Fibonacci hash used by hash_shuffle
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _keys(arr, key):
+    """Return the key array of arr; key is a field name or None."""
+    if key is None:
+        return arr
+    return arr[key]
+
+
+def _sorted(arr, key):
+    """Return arr stably sorted by key; key is a field name or None."""
+    if key is None:
+        return np.sort(arr, kind="stable")
+    return arr[np.argsort(arr[key], kind="stable")]
+
+
+def exchange(arr, dests, comm=lib.MPI_COMM_WORLD):
+    """Send every element of arr to the process given in dests.
+
+    This is a collective operation on comm.
+
+    Parameters
+    ----------
+    arr : numpy.ndarray
+        One dimensional local array
+    dests : numpy.ndarray of int
+        Destination rank of each element of arr
+    comm : MPI_Comm
+        Communicator
+
+    Returns
+    -------
+    out : numpy.ndarray
+        Elements received, grouped by source rank.
+        Elements from the same source keep their relative order.
+
+    Raises
+    ------
+    ValueError
+        If dests does not give a rank of comm for every element
+        on any process. It is raised on all processes together.
+    """
+    size = base.comm_size(comm)
+    dests = np.asarray(dests)
+    error = None
+    if dests.shape != arr.shape[:1]:
+        error = "Expected %d destinations; got %d" % (len(arr), dests.size)
+    elif len(dests) and (dests.min() < 0 or dests.max() >= size):
+        error = "Destinations must be in [0, %d)" % size
+
+    # Agree on the validity of dests before the exchange,
+    # so that no process is left waiting in it
+    failed = np.array([error is not None], dtype=np.intc)
+    base.allreduce(failed.copy(), failed, lib.MPI_LOR, comm, lib.MPI_INT)
+    if failed[0]:
+        raise ValueError(error or "Invalid destinations on another process")
+    order = np.argsort(dests, kind="stable")
+    sendcounts = np.bincount(dests, minlength=size).astype(np.intc)
+    return _exchange_sorted(arr[order], sendcounts, comm)
+
+
+def _exchange_sorted(arr, sendcounts, comm):
+    """Exchange an array already grouped by destination rank."""
+    arr = np.ascontiguousarray(arr)
+    recvcounts = np.empty_like(sendcounts)
+    base.alltoall(sendcounts, recvcounts, comm, lib.MPI_INT)
+
+    out = np.empty(int(recvcounts.sum()), dtype=arr.dtype)
+    itemsize = arr.dtype.itemsize
+    base.alltoallv(
+        arr.view(np.uint8),
+        (sendcounts * itemsize).tolist(),
+        out.view(np.uint8),
+        (recvcounts * itemsize).tolist(),
+        comm=comm,
+        datatype=lib.MPI_BYTE,
+    )
+    return out
+
+
+def hash_partition(keys, size):
+    """Return the destination rank of each key for hash_shuffle.
+
+    Parameters
+    ----------
+    keys : numpy.ndarray
+        One dimensional array of keys with an itemsize of 1, 2, 4 or 8
+    size : int
+        Number of processes
+
+    Returns
+    -------
+    dests : numpy.ndarray of int
+        Destination rank of each key
+    """
+    keys = np.ascontiguousarray(keys)
+    if keys.dtype.itemsize not in (1, 2, 4, 8):
+        raise ValueError("Can't hash keys of dtype %s" % keys.dtype)
+    bits = keys.view("u%d" % keys.dtype.itemsize).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        hashed = (bits * _HASH_MULTIPLIER) >> np.uint64(32)
+    return (hashed % np.uint64(size)).astype(np.intp)
+
+
+def hash_shuffle(arr, key=None, comm=lib.MPI_COMM_WORLD):
+    """Send elements with equal keys to the same process.
+
+    This is a collective operation on comm.
+
+    Parameters
+    ----------
+    arr : numpy.ndarray
+        One dimensional local array
+    key : str or None
+        Field of a structured array holding the key.
+        If None the elements themselves are the keys.
+    comm : MPI_Comm
+        Communicator
+
+    Returns
+    -------
+    out : numpy.ndarray
+        Elements whose keys hash to this process
+    """
+    size = base.comm_size(comm)
+    return exchange(arr, hash_partition(_keys(arr, key), size), comm)
+
+
+def _splitters(keys, oversample, comm):
+    """Choose size - 1 splitters from a regular sample of the sorted keys."""
+    size = base.comm_size(comm)
+    nsamples = min(len(keys), oversample * size)
+    idx = np.linspace(0, len(keys), nsamples, endpoint=False).astype(np.intp)
+    sample = np.ascontiguousarray(keys[idx])
+
+    counts = np.empty(size, dtype=np.intc)
+    base.allgather(np.array([nsamples], dtype=np.intc), counts, comm, lib.MPI_INT)
+    itemsize = keys.dtype.itemsize
+    samples = np.empty(int(counts.sum()), dtype=keys.dtype)
+    base.allgatherv(
+        sample.view(np.uint8),
+        samples.view(np.uint8),
+        (counts * itemsize).tolist(),
+        comm=comm,
+        datatype=lib.MPI_BYTE,
+    )
+    samples.sort(kind="stable")
+    if not len(samples):
+        return samples
+
+    pos = (np.arange(1, size) * len(samples)) // size
+    return samples[pos]
+
+
+def sample_sort(arr, key=None, oversample=64, comm=lib.MPI_COMM_WORLD):
+    """Sort an array distributed over the processes of a communicator.
+
+    Every process sorts its elements, takes oversample regularly spaced
+    samples of its keys, and the gathered samples give size - 1
+    splitters. Elements are sent to the process of their key range
+    and the received sorted runs are merged.
+
+    This is a collective operation on comm.
+
+    Parameters
+    ----------
+    arr : numpy.ndarray
+        One dimensional local array
+    key : str or None
+        Field of a structured array to sort by.
+        If None the elements themselves are the keys.
+    oversample : int
+        Number of samples per process per splitter;
+        larger values give better balanced output
+    comm : MPI_Comm
+        Communicator
+
+    Returns
+    -------
+    out : numpy.ndarray
+        Sorted local part of the globally sorted array
+    """
+    size = base.comm_size(comm)
+    arr = _sorted(arr, key)
+    keys = _keys(arr, key)
+
+    splitters = _splitters(keys, oversample, comm)
+    if len(splitters):
+        bounds = np.searchsorted(keys, splitters, side="right")
+        sendcounts = np.diff(np.concatenate(([0], bounds, [len(arr)]))).astype(np.intc)
+    else:
+        sendcounts = np.zeros(size, dtype=np.intc)
+    out = _exchange_sorted(arr, sendcounts, comm)
+
+    # The received runs are sorted; the stable sort (timsort/radix) merges them
+    return _sorted(out, key)
@@ -0,0 +1,68 @@
+"""Sparse data exchange with nonblocking consensus (NBX).
+
+When every process sends to a small, data dependent set of peers, the
+receivers do not know how many messages to expect. Exchanging counts
+first with alltoall costs O(P) memory and time per process. The NBX
+algorithm (Hoefler, Siebert and Lumsdaine, 2010) avoids this:
+
+1. Every message is sent with a synchronous send (issend), which
+   completes only once the receiver has matched it.
+2. Every process receives any message with the tag (iprobe + recv).
+3. Once all its sends have completed, a process enters a nonblocking
+   barrier (ibarrier) and keeps receiving.
+4. When the barrier completes, all sends of all processes have been
+   matched, so no messages remain.
+"""
+
+from .cmpi import ffi, lib
+from . import base
+from .request_array import RequestArray
+
+NBX_TAG = 32030
+
+
+def sparse_exchange(sends, comm=lib.MPI_COMM_WORLD, tag=NBX_TAG):
+    """Send messages to arbitrary peers and receive all messages sent to this process.
+
+    This is a collective operation on comm.
+
+    A process may leave as soon as its barrier completes, while others
+    are still receiving, so consecutive exchanges on the same communicator
+    should use different tags (or be separated by a barrier).
+
+    Parameters
+    ----------
+    sends : dict of int to buffer
+        Message for each destination rank;
+        each value is an object supporting buffer interface
+    comm : MPI_Comm
+        Communicator
+    tag : int
+        Message tag; must not be used by other messages in flight on comm
+
+    Returns
+    -------
+    received : dict of int to bytearray
+        Message received from each source rank
+    """
+    requests = RequestArray(max(len(sends), 1))
+    for dest, buf in sends.items():
+        base.issend(buf, dest, tag, comm, request=requests.add(dest, buf))
+
+    received = {}
+    status = ffi.new("MPI_Status*")
+    barrier = None
+    while True:
+        flag, _ = base.iprobe(lib.MPI_ANY_SOURCE, tag, comm, status)
+        if flag:
+            buf = bytearray(base.get_count(status))
+            base.recv(buf, status.MPI_SOURCE, tag, comm)
+            received[status.MPI_SOURCE] = buf
+            continue
+
+        if barrier is None:
+            if base.testall(requests)[0]:
+                requests.clear()
+                barrier = base.ibarrier(comm)
+        elif base.test(barrier)[0]:
+            return received
@@ -1,11 +1,18 @@
 """Python wrapper for MPI_Status objects."""
 
 from .cmpi import ffi, lib
-from .base import MPIError, check_error
+from .error import MPIError
+
+_STATUS_T = ffi.typeof("MPI_Status")
+
 
 class MPIStatus:
     """MPI Status object.
 
+    The wrapped status is copied, so the source array may be reused
+    right away. The count is only computed, with MPI_Get_count,
+    the first time it is accessed.
+
     Attributes
     ----------
     source : int
@@ -18,6 +25,8 @@ class MPIStatus:
         Number received elements
     """
 
+    __slots__ = ("source", "tag", "error", "datatype", "_status", "_count")
+
     def __init__(self, status, datatype=lib.MPI_BYTE):
         """Initialize.
 
@@ -31,16 +40,24 @@ class MPIStatus:
         self.source = status.MPI_SOURCE
         self.tag = status.MPI_TAG
         self.error = status.MPI_ERROR
+        self.datatype = datatype
 
-        cnt = ffi.new("int*")
-        if ffi.typeof(status) is ffi.typeof("MPI_Status"):
-            status_p = ffi.addressof(status)
+        if ffi.typeof(status) is _STATUS_T:
+            self._status = ffi.new("MPI_Status*", status)
         else:
-            status_p = status
-        retcode = lib.MPI_Get_count(status_p, datatype, cnt)
-        if retcode != lib.MPI_SUCCESS:
-            raise MPIError(retcode)
-        self.count = cnt[0]
+            self._status = ffi.new("MPI_Status*", status[0])
+        self._count = None
+
+    @property
+    def count(self):
+        """Number of received elements."""
+        if self._count is None:
+            cnt = ffi.new("int*")
+            retcode = lib.MPI_Get_count(self._status, self.datatype, cnt)
+            if retcode != lib.MPI_SUCCESS:
+                raise MPIError(retcode)
+            self._count = cnt[0]
+        return self._count
 
     def __repr__(self):
         fmt = "MPIStatus(source=%d, tag=%d, error=%d, count=%d)"
@@ -50,3 +67,112 @@ class MPIStatus:
         """Raise MPIError if error is present."""
         if self.error != lib.MPI_SUCCESS:
             raise MPIError(self.error)
+
+
+def get_counts(statuses, n=None, datatype=lib.MPI_BYTE):
+    """Get the number of received elements for an array of statuses.
+
+    Parameters
+    ----------
+    statuses : MPI_Status[]
+        Array of status objects
+    n : int
+        Number of statuses to use from the start of the array.
+        If n is None all statuses are used.
+    datatype : MPI_Datatype
+        Datatype of each receive buffer element
+
+    Returns
+    -------
+    counts : list of int
+        Number of received elements for each status
+    """
+    return _status_values(statuses, n, datatype)[3::4]
+
+
+def _status_values(statuses, n, datatype):
+    """Return source, tag, error and count of each status as a flat list."""
+    if n is None:
+        n = len(statuses)
+    if not n:
+        return []
+
+    table = ffi.new("int[]", 4 * n)
+    retcode = lib.yapympi_status_table(n, statuses, datatype, table)
+    if retcode != lib.MPI_SUCCESS:
+        raise MPIError(retcode)
+    return ffi.unpack(table, 4 * n)
+
+
+def status_table(statuses, n=None, datatype=lib.MPI_BYTE):
+    """Get the fields and counts of an array of statuses in one call.
+
+    Parameters
+    ----------
+    statuses : MPI_Status[]
+        Array of status objects
+    n : int
+        Number of statuses to use from the start of the array.
+        If n is None all statuses are used.
+    datatype : MPI_Datatype
+        Datatype of each receive buffer element
+
+    Returns
+    -------
+    table : list of tuple
+        (source, tag, error, count) of each status
+    """
+    values = _status_values(statuses, n, datatype)
+    return list(zip(values[0::4], values[1::4], values[2::4], values[3::4]))
+
+
+def status_dtype():
+    """Return a NumPy dtype matching the public fields of MPI_Status.
+
+    Returns
+    -------
+    dtype : numpy.dtype
+        Structured dtype with fields source, tag and error,
+        at the offsets and with the itemsize of MPI_Status.
+    """
+    import numpy as np
+
+    return np.dtype(
+        {
+            "names": ["source", "tag", "error"],
+            "formats": [np.intc, np.intc, np.intc],
+            "offsets": [
+                ffi.offsetof("MPI_Status", "MPI_SOURCE"),
+                ffi.offsetof("MPI_Status", "MPI_TAG"),
+                ffi.offsetof("MPI_Status", "MPI_ERROR"),
+            ],
+            "itemsize": ffi.sizeof("MPI_Status"),
+        }
+    )
+
+
+def status_array(statuses, n=None):
+    """Return a NumPy view of an array of statuses.
+
+    No data is copied; the view reflects later changes to the array.
+    NumPy is required.
+
+    Parameters
+    ----------
+    statuses : MPI_Status[]
+        Array of status objects
+    n : int
+        Number of statuses to use from the start of the array.
+        If n is None all statuses are used.
+
+    Returns
+    -------
+    array : numpy.ndarray
+        Structured array with fields source, tag and error
+    """
+    import numpy as np
+
+    if n is None:
+        n = len(statuses)
+    buf = ffi.buffer(statuses, n * ffi.sizeof("MPI_Status"))
+    return np.frombuffer(buf, dtype=status_dtype(), count=n)
@@ -0,0 +1,204 @@
+"""Timing utilities based on MPI_Wtime.
+
+MPI_Wtime clocks of different processes are in general not synchronized.
+clock_offsets estimates the offset of every process's clock from the
+root's clock with ping-pong messages: the root reads its clock before
+(t0) and after (t1) a round trip in which the other process reads its
+clock (t), and estimates the offset as t - (t0 + t1) / 2. The round trip
+with the smallest duration gives the best estimate, which is accurate
+to half its duration. The ping-pongs run on a duplicate of the
+communicator, so they cannot match messages of the caller.
+
+synchronize stores the offset of the calling process, after which
+global_wtime returns timestamps on the root's clock.
+
+Timer measures a region of code with wtime and reduces the elapsed
+time across processes to its minimum, maximum and mean.
+"""
+
+from array import array
+
+from .cmpi import lib
+from . import base
+
+TIMING_TAG = 32040
+
+_OFFSET = 0.0
+
+
+def clock_offsets(comm=lib.MPI_COMM_WORLD, root=0, nrounds=10):
+    """Estimate the offsets of the wtime clocks of all processes.
+
+    This is a collective operation on comm.
+
+    Parameters
+    ----------
+    comm : MPI_Comm
+        Communicator
+    root : int
+        Rank of the process with the reference clock
+    nrounds : int
+        Number of ping-pongs with each process; the shortest one is used
+
+    Returns
+    -------
+    offsets : list of float
+        Offset of each process's clock from the root's clock,
+        i.e. its wtime() minus the root's wtime() at the same instant
+    """
+    comm = base.comm_dup(comm)
+    try:
+        return _clock_offsets(comm, root, nrounds)
+    finally:
+        base.comm_free(comm)
+
+
+def _clock_offsets(comm, root, nrounds):
+    """Estimate the clock offsets with ping-pongs on a private communicator."""
+    rank = base.comm_rank(comm)
+    size = base.comm_size(comm)
+    offsets = array("d", [0.0] * size)
+    ping = bytearray(0)
+    remote = array("d", [0.0])
+
+    if rank == root:
+        for r in range(size):
+            if r == root:
+                continue
+            best = float("inf")
+            for _ in range(nrounds):
+                t0 = base.wtime()
+                base.send(ping, r, TIMING_TAG, comm)
+                base.recv(remote, r, TIMING_TAG, comm)
+                t1 = base.wtime()
+                if t1 - t0 < best:
+                    best = t1 - t0
+                    offsets[r] = remote[0] - (t0 + t1) / 2
+    else:
+        for _ in range(nrounds):
+            base.recv(ping, root, TIMING_TAG, comm)
+            remote[0] = base.wtime()
+            base.send(remote, root, TIMING_TAG, comm)
+
+    base.bcast(offsets, root, comm)
+    return list(offsets)
+
+
+def synchronize(comm=lib.MPI_COMM_WORLD, root=0, nrounds=10):
+    """Estimate and store the offset of this process's clock.
+
+    This is a collective operation on comm.
+
+    Parameters
+    ----------
+    comm : MPI_Comm
+        Communicator
+    root : int
+        Rank of the process with the reference clock
+    nrounds : int
+        Number of ping-pongs with each process
+
+    Returns
+    -------
+    offset : float
+        Offset of this process's clock from the root's clock
+    """
+    global _OFFSET  # pylint: disable=global-statement
+
+    _OFFSET = clock_offsets(comm, root, nrounds)[base.comm_rank(comm)]
+    return _OFFSET
+
+
+def global_wtime():
+    """Return wtime on the clock of the root of the last synchronize.
+
+    Returns
+    -------
+    time : float
+        Time in seconds, comparable across processes
+    """
+    return base.wtime() - _OFFSET
+
+
+def reduce_times(value, comm=lib.MPI_COMM_WORLD):
+    """Reduce a time measured on every process.
+
+    This is a collective operation on comm.
+
+    Parameters
+    ----------
+    value : float
+        Time measured on this process
+    comm : MPI_Comm
+        Communicator
+
+    Returns
+    -------
+    min : float
+        Minimum over processes
+    max : float
+        Maximum over processes
+    mean : float
+        Mean over processes
+    """
+    extremes = array("d", [0.0, 0.0])
+    base.allreduce(array("d", [value, -value]), extremes, lib.MPI_MAX, comm)
+    total = array("d", [0.0])
+    base.allreduce(array("d", [value]), total, lib.MPI_SUM, comm)
+    return -extremes[1], extremes[0], total[0] / base.comm_size(comm)
+
+
+class Timer:
+    """Context manager measuring the time of a region on all processes.
+
+    Example::
+
+        with Timer() as t:
+            work()
+        if rank == 0:
+            print(t.min, t.max, t.mean)
+
+    Attributes
+    ----------
+    elapsed : float
+        Time spent in the region on this process
+    min : float
+        Minimum elapsed time over processes (if reduce is True)
+    max : float
+        Maximum elapsed time over processes (if reduce is True)
+    mean : float
+        Mean elapsed time over processes (if reduce is True)
+    """
+
+    def __init__(self, comm=lib.MPI_COMM_WORLD, barrier=False, reduce=True):
+        """Initialize.
+
+        Parameters
+        ----------
+        comm : MPI_Comm
+            Communicator
+        barrier : bool
+            If True start the region with a barrier, so all processes
+            start timing together
+        reduce : bool
+            If True reduce the elapsed time across processes on exit,
+            which is a collective operation on comm
+        """
+        self.comm = comm
+        self.barrier = barrier
+        self.reduce = reduce
+        self.start = None
+        self.elapsed = None
+        self.min = self.max = self.mean = None
+
+    def __enter__(self):
+        if self.barrier:
+            base.barrier(self.comm)
+        self.start = base.wtime()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.elapsed = base.wtime() - self.start
+        if self.reduce and exc_type is None:
+            self.min, self.max, self.mean = reduce_times(self.elapsed, self.comm)
+        return False
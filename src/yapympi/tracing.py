@@ -0,0 +1,179 @@
+"""Timeline tracing of MPI calls.
+
+The Tracer is a profiling tool (see :mod:`yapympi.profiling`) that records
+the begin and end time of every instrumented call, together with the
+rank, peer, tag and message size, into a per rank ring buffer.
+At finalize the events of all ranks are moved to rank 0's clock, using
+the ping-pong clock offsets of :mod:`yapympi.timing`, gathered on rank 0
+and written out in the Chrome trace event format, which can be viewed
+with chrome://tracing or Perfetto.
+"""
+
+import json
+import time
+import threading
+from collections import deque
+
+from . import base
+from . import profiling
+from . import timing
+
+
+class TraceEvent:
+    """A single traced call.
+
+    Attributes
+    ----------
+    name : str
+        Name of the called function
+    thread : int
+        Identifier of the calling thread
+    start : float
+        Begin time of the call, in seconds on the local MPI_Wtime clock
+    end : float
+        End time of the call, in seconds on the local MPI_Wtime clock
+    peer : int or None
+        Rank of the peer process
+    tag : int or None
+        Message tag
+    nbytes : int
+        Size of the message buffer in bytes
+    """
+
+    __slots__ = ("name", "thread", "start", "end", "peer", "tag", "nbytes")
+
+    def __init__(self, name, thread, start, end, peer, tag, nbytes):
+        self.name = name
+        self.thread = thread
+        self.start = start
+        self.end = end
+        self.peer = peer
+        self.tag = tag
+        self.nbytes = nbytes
+
+
+class Tracer(profiling.Tool):
+    """Tool recording a timeline of calls.
+
+    Attributes
+    ----------
+    events : deque of TraceEvent
+        Ring buffer of the most recent events of this rank
+    output : str or None
+        Filename of the merged Chrome trace JSON written by rank 0.
+        If None, nothing is written.
+    trace : dict or None
+        On rank 0, the merged trace after finalize.
+    """
+
+    def __init__(self, output=None, capacity=100000):
+        self.events = deque(maxlen=capacity)
+        self.output = output
+        self.trace = None
+
+    def on_call(self, info):
+        self.events.append(
+            TraceEvent(
+                info.name,
+                threading.get_ident(),
+                info.start,
+                info.end,
+                info.peer,
+                info.tag,
+                info.nbytes,
+            )
+        )
+
+    def on_finalize(self):
+        # Move event times from the perf_counter clock to rank 0's MPI_Wtime
+        clock_offset = timing.clock_offsets()[base.comm_rank()]
+        offset = base.wtime() - time.perf_counter() - clock_offset
+        events = []
+        for e in self.events:
+            start, end = e.start + offset, e.end + offset
+            events.append(TraceEvent(e.name, e.thread, start, end, e.peer, e.tag, e.nbytes))
+
+        all_events = profiling.gather_objects(events)
+        if all_events is None:
+            return
+
+        self.trace = chrome_trace(all_events)
+        if self.output is not None:
+            with open(self.output, "wt") as fobj:
+                json.dump(self.trace, fobj)
+
+
+def chrome_trace(all_events):
+    """Convert per rank events to a Chrome trace.
+
+    Parameters
+    ----------
+    all_events : list of list of TraceEvent
+        Events of every rank, indexed by rank, with aligned times
+
+    Returns
+    -------
+    trace : dict
+        Trace in the Chrome trace event format
+    """
+    t0 = min((e.start for events in all_events for e in events), default=0.0)
+
+    trace_events = []
+    for rank, events in enumerate(all_events):
+        trace_events.append(
+            {"name": "process_name", "ph": "M", "pid": rank, "args": {"name": "rank %d" % rank}}
+        )
+
+        threads = {}
+        for e in events:
+            tid = threads.setdefault(e.thread, len(threads))
+            args = {"nbytes": e.nbytes}
+            if e.peer is not None:
+                args["peer"] = e.peer
+            if e.tag is not None:
+                args["tag"] = e.tag
+            trace_events.append(
+                {
+                    "name": e.name,
+                    "cat": "mpi",
+                    "ph": "X",
+                    "pid": rank,
+                    "tid": tid,
+                    "ts": (e.start - t0) * 1e6,
+                    "dur": (e.end - e.start) * 1e6,
+                    "args": args,
+                }
+            )
+
+    return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+
+def enable(output="trace.json", capacity=100000):
+    """Enable tracing with a new Tracer.
+
+    Parameters
+    ----------
+    output : str or None
+        Filename of the merged trace written by rank 0 at finalize
+    capacity : int
+        Maximum number of events kept per rank
+
+    Returns
+    -------
+    tracer : Tracer
+        The installed tracer
+    """
+    tracer = Tracer(output, capacity)
+    profiling.install(tracer)
+    return tracer
+
+
+def disable(tracer):
+    """Disable a tracer created with enable.
+
+    Parameters
+    ----------
+    tracer : Tracer
+        The tracer returned by enable
+    """
+    profiling.uninstall(tracer)
@@ -0,0 +1,272 @@
+"""Distributed work stealing scheduler.
+
+Each process keeps a deque of tasks. It runs its own tasks newest first;
+when it runs out, it sends a steal request to a random process, which
+replies with the older half of its deque (or nothing). Tasks may submit
+new tasks while they run, so irregular workloads (e.g. graph traversals)
+balance automatically.
+
+Global termination is detected with the Dijkstra-Safra token algorithm:
+a token carrying a message counter and a color circulates around the
+ring of idle processes; the run ends when the token returns white to
+rank 0 with a zero count. Only steal replies that carry tasks are
+counted as messages, since only they can make an idle process busy.
+
+Tasks are (function, args) pairs that are pickled when stolen, so
+functions must be defined at module level. The scheduler uses a private
+communicator split from the one it is given.
+"""
+
+import time
+import pickle
+import random
+from collections import deque
+
+from .cmpi import ffi, lib
+from . import base
+from .request_manager import RequestManager
+
+STEAL_TAG = 1
+REPLY_TAG = 2
+TOKEN_TAG = 3
+DONE_TAG = 4
+
+_WHITE = 0
+_BLACK = 1
+
+_CURRENT = None
+
+
+def submit(fn, *args):
+    """Submit a task to the scheduler that is running the current task.
+
+    Parameters
+    ----------
+    fn : callable
+        Task function; called as fn(*args)
+    *args
+        Arguments of fn
+    """
+    if _CURRENT is None:
+        raise RuntimeError("No work stealing scheduler is running")
+    _CURRENT.submit(fn, *args)
+
+
+class WorkStealingScheduler:
+    """Work stealing scheduler over the processes of a communicator.
+
+    Attributes
+    ----------
+    comm : MPI_Comm
+        Private communicator of the scheduler
+    rank : int
+        Rank in comm
+    size : int
+        Size of comm
+    tasks : collections.deque
+        Local tasks as (fn, args) pairs
+    executed : int
+        Number of tasks run by this process in the last run
+    steals : int
+        Number of successful steals by this process in the last run
+    """
+
+    def __init__(self, comm=lib.MPI_COMM_WORLD, seed=None, steal_fraction=0.5):
+        """Initialize.
+
+        This is a collective operation on comm.
+
+        Parameters
+        ----------
+        comm : MPI_Comm
+            Communicator
+        seed : int or None
+            Seed for choosing steal victims
+        steal_fraction : float
+            Fraction of its tasks a victim gives away
+        """
+        self.comm = base.comm_split(comm, 0, base.comm_rank(comm))
+        self.rank = base.comm_rank(self.comm)
+        self.size = base.comm_size(self.comm)
+        self.steal_fraction = steal_fraction
+        self.tasks = deque()
+        self.executed = 0
+        self.steals = 0
+
+        self._random = random.Random(seed if seed is None else seed + self.rank)
+        self._manager = RequestManager(2 * self.size + 4, self.comm)
+        self._status = ffi.new("MPI_Status*")
+        self._token = ffi.new("int[2]")
+
+    def free(self):
+        """Free the private communicator."""
+        base.comm_free(self.comm)
+
+    def submit(self, fn, *args):
+        """Add a task to the local deque.
+
+        Parameters
+        ----------
+        fn : callable
+            Task function; called as fn(*args)
+        *args
+            Arguments of fn
+        """
+        self.tasks.append((fn, args))
+
+    def _send(self, payload, dest, tag):
+        """Send without blocking; completed sends are reclaimed first."""
+        manager = self._manager
+        manager.test()
+        while manager.size == manager.capacity:
+            manager.test()
+        manager.send(payload, dest, tag)
+
+    def _reply(self, thief):
+        """Answer a steal request with the older part of the deque."""
+        n = int(len(self.tasks) * self.steal_fraction)
+        if not n:
+            self._send(bytearray(0), thief, REPLY_TAG)
+            return False
+
+        stolen = [self.tasks.popleft() for _ in range(n)]
+        self._send(memoryview(pickle.dumps(stolen, pickle.HIGHEST_PROTOCOL)), thief, REPLY_TAG)
+        return True
+
+    def run(self):
+        """Run tasks until all processes are out of work.
+
+        This is a collective operation on the scheduler's communicator.
+
+        Returns
+        -------
+        results : list
+            Return values of the tasks run by this process
+        """
+        global _CURRENT  # pylint: disable=global-statement
+
+        results = []
+        self.executed = 0
+        self.steals = 0
+
+        # Safra state
+        count = 0
+        color = _WHITE
+        token = None
+        token_out = False
+
+        stealing = False
+        done = self.size == 1
+        status = self._status
+
+        previous, _CURRENT = _CURRENT, self
+        try:
+            while True:
+                # Handle all incoming messages
+                while True:
+                    flag, _ = base.iprobe(lib.MPI_ANY_SOURCE, lib.MPI_ANY_TAG, self.comm, status)
+                    if not flag:
+                        break
+                    source, tag = status.MPI_SOURCE, status.MPI_TAG
+
+                    if tag == TOKEN_TAG:
+                        base.recv(ffi.buffer(self._token), source, tag, self.comm)
+                        token = (self._token[0], self._token[1])
+                        token_out = False
+                        continue
+
+                    buf = bytearray(base.get_count(status))
+                    base.recv(buf, source, tag, self.comm)
+                    if tag == STEAL_TAG:
+                        if not done and self._reply(source):
+                            count += 1
+                        elif done:
+                            self._send(bytearray(0), source, REPLY_TAG)
+                    elif tag == REPLY_TAG:
+                        stealing = False
+                        if buf:
+                            self.tasks.extend(pickle.loads(buf))
+                            self.steals += 1
+                            count -= 1
+                            color = _BLACK
+                    elif tag == DONE_TAG:
+                        done = True
+
+                if done:
+                    break
+
+                if self.tasks:
+                    fn, args = self.tasks.pop()
+                    results.append(fn(*args))
+                    self.executed += 1
+                    continue
+
+                # Idle: steal and take part in termination detection
+                if not stealing and self.size > 1:
+                    victim = self._random.randrange(self.size - 1)
+                    victim += victim >= self.rank
+                    self._send(bytearray(0), victim, STEAL_TAG)
+                    stealing = True
+
+                if self.rank == 0:
+                    if token is not None:
+                        tcolor, tcount = token
+                        token = None
+                        if tcolor == _WHITE and color == _WHITE and tcount + count == 0:
+                            for r in range(1, self.size):
+                                self._send(bytearray(0), r, DONE_TAG)
+                            done = True
+                            continue
+                    if not token_out:
+                        color = _WHITE
+                        self._send_token(_WHITE, 0)
+                        token_out = True
+                elif token is not None:
+                    tcolor, tcount = token
+                    token = None
+                    self._send_token(_BLACK if color == _BLACK else tcolor, tcount + count)
+                    color = _WHITE
+
+                time.sleep(0)
+
+            self._finish(stealing)
+        finally:
+            _CURRENT = previous
+
+        return results
+
+    def _send_token(self, color, count):
+        """Pass the termination token to the next process of the ring."""
+        token = ffi.new("int[2]", [color, count])
+        self._send(ffi.buffer(token), (self.rank + 1) % self.size, TOKEN_TAG)
+
+    def _finish(self, stealing):
+        """Answer outstanding steal requests until every process is done.
+
+        A steal request may still be in flight when a process learns of
+        termination. Every process waits for the reply to its own request
+        and then enters a nonblocking barrier; requests are answered with
+        empty replies until the barrier completes, after which no scheduler
+        messages remain.
+        """
+        status = self._status
+        barrier = None
+        while True:
+            if barrier is None and not stealing:
+                barrier = base.ibarrier(self.comm)
+            if barrier is not None and base.test(barrier)[0]:
+                break
+
+            flag, _ = base.iprobe(lib.MPI_ANY_SOURCE, lib.MPI_ANY_TAG, self.comm, status)
+            if flag:
+                source, tag = status.MPI_SOURCE, status.MPI_TAG
+                buf = bytearray(base.get_count(status))
+                base.recv(buf, source, tag, self.comm)
+                if tag == STEAL_TAG:
+                    self._send(bytearray(0), source, REPLY_TAG)
+                elif tag == REPLY_TAG:
+                    stealing = False
+            self._manager.test()
+
+        while self._manager.size:
+            self._manager.test()
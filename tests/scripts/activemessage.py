@@ -0,0 +1,93 @@
+"""Test active messages and remote procedure calls."""
+
+import yapympi.base as mpi
+from yapympi.activemessage import ActiveMessages, RemoteError
+from yapympi.error import MPITimeoutError
+
+ECHO = 1
+COUNT = 2
+FAIL = 3
+FORWARD = 4
+UNKNOWN = 5
+
+# One payload per size class, and one larger than the largest class
+SIZES = [0, 10, 200, 3000, 50000, 100000]
+
+
+def main():
+    mpi.init()
+    rank, size = mpi.comm_rank(), mpi.comm_size()
+
+    am = ActiveMessages(size_classes=(256, 4096, 65536), depth=2, max_sends=4)
+    assert am.size == size
+
+    counts = {}
+
+    @am.handler(ECHO)
+    def echo(source, payload):
+        return bytes(reversed(payload))
+
+    def count(source, payload):
+        counts[source] = counts.get(source, 0) + len(payload)
+
+    am.register(COUNT, count)
+
+    @am.handler(FAIL)
+    def fail(source, payload):
+        raise KeyError(bytes(payload).decode())
+
+    @am.handler(FORWARD)
+    def forward(source, payload):
+        # Handlers may send, including to the process that sent the message
+        am.send(source, COUNT, payload)
+
+    # Calls to every process, including self, in every size class
+    futures = []
+    for dest in range(size):
+        for nbytes in SIZES:
+            payload = bytes(i % 251 for i in range(nbytes))
+            futures.append((payload, am.call(dest, ECHO, payload)))
+    for payload, future in futures:
+        assert am.wait(future) == bytes(reversed(payload))
+
+    # Fire and forget messages, more than the receive rings hold
+    for i in range(20):
+        am.send((rank + 1) % size, COUNT, bytes(i))
+        am.send((rank + 2) % size, FORWARD, bytes(1))
+
+    # Remote exceptions and unknown tags
+    future = am.call((rank + 1) % size, FAIL, b"missing")
+    try:
+        am.wait(future)
+    except RemoteError as e:
+        assert "KeyError" in str(e) and "missing" in str(e), e
+    else:
+        assert False, "RemoteError not raised"
+
+    future = am.call((rank + 1) % size, UNKNOWN)
+    try:
+        am.wait(future)
+    except RemoteError as e:
+        assert "No active message handler for tag %d" % UNKNOWN in str(e), e
+    else:
+        assert False, "RemoteError not raised"
+
+    try:
+        am.wait(am.call(rank, ECHO, b"x"), timeout=0.0)
+    except MPITimeoutError:
+        pass
+
+    am.free()
+
+    # Everything sent before free has been dispatched
+    expected = {}
+    for source, nbytes in [((rank - 1) % size, sum(range(20))), ((rank + 2) % size, 20)]:
+        expected[source] = expected.get(source, 0) + nbytes
+    assert counts == expected, (counts, expected)
+
+    mpi.barrier()
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
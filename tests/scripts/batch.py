@@ -0,0 +1,41 @@
+"""Test batched nonblocking send recv."""
+
+import yapympi.base as mpi
+
+NMSGS = 10
+MSGSIZE = 8
+
+
+def main():
+    mpi.init()
+    mpi.barrier()
+
+    rank = mpi.comm_rank()
+    offsets = [i * MSGSIZE for i in range(NMSGS + 1)]
+    if rank == 0:
+        buf = bytearray(i % NMSGS for i in range(NMSGS * MSGSIZE))
+        bufs = mpi.split_buffer(buf, offsets)
+        reqs = mpi.isend_batch(bufs, dests=1, tags=list(range(NMSGS)))
+        assert len(reqs) == NMSGS
+        mpi.waitall(reqs)
+    else:
+        buf = bytearray(NMSGS * MSGSIZE)
+        bufs = mpi.split_buffer(buf, offsets)
+        reqs = mpi.irecv_batch(bufs, sources=0, tags=list(range(NMSGS)))
+
+        completed = set()
+        while len(completed) < NMSGS:
+            indices, statuses = mpi.waitsome(reqs)
+            for i, idx in enumerate(indices):
+                assert statuses[i].MPI_TAG == idx
+                completed.add(idx)
+
+        for i in range(NMSGS):
+            assert bufs[i] == bytes([j % NMSGS for j in range(i * MSGSIZE, (i + 1) * MSGSIZE)])
+
+    mpi.barrier()
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
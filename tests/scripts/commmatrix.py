@@ -0,0 +1,72 @@
+"""Test the communication matrix collector."""
+
+import os
+import csv
+import tempfile
+
+import yapympi.base as mpi
+from yapympi import commmatrix
+from yapympi.cmpi import lib
+
+MSG = "hello".encode("utf-8")
+
+
+def main():
+    tmpdir = tempfile.mkdtemp()
+    prefix = os.path.join(tmpdir, "comm")
+    collector = commmatrix.enable(prefix)
+
+    mpi.init()
+    mpi.barrier()
+
+    rank = mpi.comm_rank()
+    size = mpi.comm_size()
+    dest = (rank + 1) % size
+    source = (rank - 1) % size
+
+    buf = bytearray(10)
+    req = mpi.irecv(buf, source=source, tag=1)
+    for _ in range(rank + 1):
+        mpi.send(bytearray(MSG), dest=dest, tag=1)
+    mpi.wait(req)
+    for _ in range(source):
+        mpi.recv(buf, source=source, tag=1)
+
+    # A batch counts one message per destination
+    recvs = mpi.irecv_batch([bytearray(10), bytearray(10)], sources=source, tags=2)
+    sends = mpi.isend_batch([bytearray(MSG), bytearray(MSG[:2])], dests=dest, tags=2)
+    mpi.waitall(sends)
+    mpi.waitall(recvs)
+
+    # Peers are counted by world rank, and MPI_PROC_NULL is skipped
+    comm = mpi.comm_split(color=0, key=size - rank)
+    mpi.sendrecv(bytearray(MSG[:4]), size - 1 - dest, 3, bytearray(4), size - 1 - source, 3, comm=comm)
+    mpi.send(bytearray(MSG), lib.MPI_PROC_NULL, 3)
+    mpi.comm_free(comm)
+
+    mpi.finalize()
+    commmatrix.disable(collector)
+
+    if rank != 0:
+        assert collector.matrix is None
+        return
+
+    messages = collector.matrix["messages"]
+    nbytes = collector.matrix["nbytes"]
+    for src in range(size):
+        for dst in range(size):
+            if dst == (src + 1) % size:
+                assert messages[src][dst] == src + 4
+                assert nbytes[src][dst] == (src + 2) * len(MSG) + 6
+            else:
+                assert messages[src][dst] == 0
+    assert len(collector.matrix["wait_time"]) == size
+
+    with open(prefix + "_messages.csv") as fobj:
+        rows = [[int(x) for x in row] for row in csv.reader(fobj)]
+    assert rows == messages
+    print(messages, flush=True)
+
+
+if __name__ == "__main__":
+    main()
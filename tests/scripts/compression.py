@@ -0,0 +1,114 @@
+"""Test message compression."""
+
+import random
+
+import yapympi.base as mpi
+from yapympi import compression
+from yapympi.cmpi import lib
+from yapympi.compression import Compression
+
+TEXT = b"the quick brown fox jumps over the lazy dog " * 5000
+
+
+def main():
+    mpi.init()
+    rank = mpi.comm_rank()
+
+    # Local encoding and the adaptive decision
+    for codec in compression.available_codecs():
+        comp = Compression(codec, adaptive=False)
+        message = comp.encode(TEXT)
+        assert len(message) < len(TEXT) // 10, (codec, len(message))
+        assert compression.decode(message) == TEXT
+        assert comp.ratio < 0.1
+
+    comp = Compression(threshold=100)
+    assert not comp.should_compress(99)
+    assert len(comp.encode(b"x" * 99)) == 99 + 9
+
+    # Random data does not compress and is sent raw
+    noise = random.Random(0).randbytes(1 << 16)
+    comp = Compression(adaptive=False)
+    assert len(comp.encode(noise)) == len(noise) + 9
+    assert comp.ratio > 0.99
+
+    # On an infinitely fast link compression never pays off, except for probes
+    comp = Compression(bandwidth=float("inf"), probe_interval=4)
+    comp.encode(TEXT)
+    decisions = [comp.should_compress(len(TEXT)) for _ in range(8)]
+    assert decisions == [False, False, False, True] * 2, decisions
+
+    # Decompression stops after the size given in the header
+    message = bytearray(Compression(adaptive=False).encode(bytes(1 << 20)))
+    message[1:9] = (1000).to_bytes(8, "little")
+    try:
+        compression.decode(message)
+    except ValueError:
+        pass
+    else:
+        assert False, "ValueError not raised"
+
+    # Settings are dropped with their communicator
+    comm = mpi.comm_dup()
+    compression.set_compression(Compression(), comm)
+    assert compression.get_compression(comm) is not None
+    dup = mpi.comm_dup(comm)
+    assert compression.get_compression(dup) is None
+    mpi.comm_free(dup)
+    mpi.comm_free(comm)
+    assert not mpi._ATTRIBUTES
+    comm = mpi.comm_dup()
+    assert compression.get_compression(comm) is None
+    compression.set_compression(Compression(), comm)
+    compression.set_compression(None, comm)
+    compression.set_compression(None, comm)
+    assert compression.get_compression(comm) is None and not mpi._ATTRIBUTES
+    mpi.comm_free(comm)
+
+    try:
+        Compression("nonesuch")
+    except ValueError:
+        pass
+    else:
+        assert False, "ValueError not raised"
+
+    # Point to point, per call and per communicator
+    if rank == 0:
+        compression.send(TEXT, 1, 1, compression=Compression())
+        compression.send(noise, 1, 2, compression=Compression())
+        compression.set_compression(Compression(codec="lzma", level=0))
+        compression.send(TEXT, 1, 3)
+        compression.send(TEXT, 1, 4, compression=False)
+        compression.set_compression(None)
+        reqs = compression.isend(bytearray(TEXT), 1, 5, compression=Compression())
+        mpi.waitall(reqs)
+    elif rank == 1:
+        assert compression.recv(0, 1) == TEXT
+        assert compression.recv(0, 2) == noise
+        assert compression.recv(0, 3) == TEXT
+        status = mpi.ffi.new("MPI_Status*")
+        assert compression.recv(0, 4, status=status) == TEXT
+        assert mpi.get_count(status) == len(TEXT) + 9
+        assert compression.recv(0, 5) == TEXT
+
+    # Broadcast
+    payload = compression.bcast(TEXT if rank == 0 else None, 0, compression=Compression())
+    assert payload == TEXT
+
+    # The ping-pong runs on its own communicator, so a pending
+    # message with its tag is left alone
+    if rank < 2:
+        mpi.send(bytearray(b"user"), 1 - rank, compression.BANDWIDTH_TAG)
+        assert compression.measure_bandwidth(1 - rank, nbytes=1 << 16) > 0
+        buf = bytearray(4)
+        mpi.recv(buf, 1 - rank, compression.BANDWIDTH_TAG)
+        assert buf == b"user"
+    else:
+        assert compression.measure_bandwidth(lib.MPI_PROC_NULL) is None
+
+    mpi.barrier()
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Test block distributed arrays with halo exchange."""
+
+import numpy as np
+
+import yapympi.base as mpi
+from yapympi.distarray import DistArray, block_counts
+
+
+def check(shape, halo, periodic, rank, size):
+    arr = DistArray(shape, np.float64, halo=halo, periodic=periodic)
+    assert arr.counts == block_counts(shape[0], size)
+
+    full = np.arange(np.prod(shape), dtype=np.float64).reshape(shape)
+    arr.local[...] = full[arr.start : arr.stop]
+    arr.update_halos()
+
+    n = arr.stop - arr.start
+    above = np.arange(arr.start - halo, arr.start)
+    below = np.arange(arr.stop, arr.stop + halo)
+    if periodic:
+        above, below = above % shape[0], below % shape[0]
+    if periodic or rank > 0:
+        assert np.array_equal(arr.data[:halo], full[above])
+    if periodic or rank < size - 1:
+        assert np.array_equal(arr.data[n + halo :], full[below])
+
+    # Persistent plan is reused
+    arr.local[...] += 1
+    arr.update_halos()
+    if periodic or rank > 0:
+        assert np.array_equal(arr.data[:halo], full[above] + 1)
+
+    assert arr.sum() == full.sum() + full.size
+    assert arr.min() == full.min() + 1
+    assert arr.max() == full.max() + 1
+
+    gathered = arr.gather_to_root()
+    if rank == 0:
+        assert np.array_equal(gathered, full + 1)
+    else:
+        assert gathered is None
+
+    arr.scatter_from_root(full if rank == 0 else None)
+    assert np.array_equal(arr.local, full[arr.start : arr.stop])
+    arr.free()
+
+
+def main():
+    mpi.init()
+
+    rank = mpi.comm_rank()
+    size = mpi.comm_size()
+
+    for shape in [(10,), (11, 3), (7, 2, 2)]:
+        for halo in (1, 2):
+            for periodic in (False, True):
+                check(shape, halo, periodic, rank, size)
+
+    # Processes without rows use the identity element of the reduction
+    for dtype in (np.float64, np.int32):
+        arr = DistArray(size - 1, dtype, halo=0)
+        arr.scatter_from_root(np.arange(1, size, dtype=dtype) if rank == 0 else None)
+        assert (arr.sum(), arr.min(), arr.max()) == (size * (size - 1) // 2, 1, size - 1)
+        arr.free()
+
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Test typed errors, request cleanup and wait timeouts."""
+
+import numpy as np
+
+import yapympi.base as mpi
+from yapympi.cmpi import lib
+from yapympi.request_manager import RequestManager
+
+MSG = b"0123456789"
+
+
+def expect(exc_type, fn, *args, **kwargs):
+    try:
+        fn(*args, **kwargs)
+    except exc_type as e:
+        return e
+    raise AssertionError("expected %s" % exc_type.__name__)
+
+
+def main():
+    mpi.init()
+    mpi.comm_set_nonfatal_errhandler()
+
+    rank = mpi.comm_rank()
+    size = mpi.comm_size()
+
+    # Error classes map to exception types
+    e = expect(mpi.MPIRankError, mpi.send, bytearray(MSG), size + 5, 0)
+    assert isinstance(e, mpi.MPIError) and isinstance(e, ValueError)
+    assert e.errclass == lib.MPI_ERR_RANK
+    assert mpi.error_class(e.errcode) == lib.MPI_ERR_RANK
+
+    # Truncation
+    if rank == 0:
+        mpi.send(bytearray(MSG), 1, 1)
+    else:
+        e = expect(mpi.MPITruncateError, mpi.recv, bytearray(4), 0, 1)
+        assert e.errclass == lib.MPI_ERR_TRUNCATE
+
+    # Failed requests in a RequestManager report their handles
+    rm = RequestManager(4)
+    if rank == 0:
+        mpi.send(bytearray(MSG), 1, 2)
+    else:
+        rm.recv(bytearray(4), 0, 2, handle="small")
+        rm.recv(bytearray(4), 0, 3, handle="pending")
+        e = expect(mpi.MPIErrorBase, rm.wait, 5.0)
+        assert isinstance(e, mpi.MPIStatusErrors)
+        assert e.handles == ["small"]
+        assert e.errclasses == [lib.MPI_ERR_TRUNCATE]
+        assert rm.error is e
+        assert rm.size == 1
+        assert rm.cancel_all() == ["pending"]
+        assert rm.size == 0
+        # The buffer of the cancelled receive is released once it completes
+        rm.test()
+        assert rm._cancelled.size == 0 and not rm._cancelled.buffers
+    mpi.barrier()
+
+    # A failed post leaves the manager unchanged and reusable
+    rm = RequestManager(2)
+    expect(mpi.MPIRankError, rm.send, b"x", size + 5, 0)
+    expect(mpi.MPIRankError, rm.recv, bytearray(4), size + 5, 0)
+    assert rm.size == 0
+    assert rm.wait() == (None, None)
+    rm.recv(bytearray(4), 1 - rank, 4, handle="ok")
+    mpi.send(bytearray(MSG[:4]), 1 - rank, 4)
+    assert rm.wait(5.0)[0] == ["ok"]
+    assert rm.size == 0
+
+    # A failed batch post keeps only the requests posted before the failure
+    bufs = [bytearray(4) for _ in range(3)]
+    reqs = mpi.RequestArray(3)
+    expect(mpi.MPIRankError, mpi.irecv_batch, bufs, [1 - rank, size + 5, 1 - rank], 5, requests=reqs)
+    assert reqs.size == 1 and len(reqs.buffers) == 1
+    mpi.send(bytearray(MSG[:4]), 1 - rank, 5)
+    mpi.waitall(reqs, timeout=5.0)
+    assert bufs[0] == MSG[:4]
+
+    # An invalid buffer is rejected before any slot is reserved
+    nreqs = reqs.size
+    expect(BufferError, mpi.irecv_batch, [bytearray(4), b"ro"], 1 - rank, 6, requests=reqs)
+    expect(ValueError, mpi.isend_batch, [bytearray(4), bytearray(3)], 1 - rank, 6, datatype=lib.MPI_INT, requests=reqs)
+    assert reqs.size == len(reqs.buffers) == len(reqs.handles) == nreqs
+
+    # Peers and tags may be any integers, e.g. NumPy scalars
+    peer, tag = np.int64(1 - rank), np.int32(7)
+    recvs = mpi.irecv_batch([bytearray(4)], peer, [tag])
+    mpi.waitall(mpi.isend_batch([bytearray(MSG[:4])], peer, tag))
+    mpi.waitall(recvs, timeout=5.0)
+
+    # Timeouts leave the request active
+    buf = bytearray(4)
+    req = mpi.irecv(buf, 1 - rank, 99)
+    e = expect(mpi.MPITimeoutError, mpi.wait, req, timeout=0.05)
+    assert isinstance(e, TimeoutError)
+    reqs = mpi.list_to_array("MPI_Request", [req])
+    expect(mpi.MPITimeoutError, mpi.waitall, reqs, timeout=0.01)
+    expect(mpi.MPITimeoutError, mpi.waitany, reqs, timeout=0.01)
+    expect(mpi.MPITimeoutError, mpi.waitsome, reqs, timeout=0.01)
+    mpi.barrier()
+    mpi.send(bytearray(b"abcd"), 1 - rank, 99)
+    mpi.waitall(reqs, timeout=5.0)
+    assert buf == b"abcd"
+
+    # A stalled manager is cancelled on timeout
+    rm = RequestManager(2, cancel_on_error=True)
+    rm.recv(bytearray(4), 1 - rank, 100, handle=1)
+    expect(mpi.MPITimeoutError, rm.wait, 0.05)
+    assert rm.size == 0
+    assert rm.wait(0.05) == (None, None)
+
+    mpi.barrier()
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
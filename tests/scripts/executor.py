@@ -0,0 +1,79 @@
+"""Test the MPI task farm executor."""
+
+import time
+import random
+
+import yapympi.base as mpi
+from yapympi.cmpi import lib
+from yapympi.executor import MPIPoolExecutor, TASK_TAG
+
+
+def square(x):
+    return x * x
+
+
+def add(x, y):
+    return x + y
+
+
+def sleepy(x):
+    time.sleep(random.random() * 0.002)
+    return x, mpi.comm_rank()
+
+
+def big(n):
+    return bytes(range(256)) * n
+
+
+def fail(x):
+    raise ValueError("bad item %d" % x)
+
+
+def main():
+    provided = mpi.init_thread(lib.MPI_THREAD_MULTIPLE)
+    assert provided >= lib.MPI_THREAD_SERIALIZED
+
+    rank = mpi.comm_rank()
+    size = mpi.comm_size()
+
+    # The executor runs on its own communicator, so a pending message
+    # with its tag is not taken for a task
+    if rank == 0:
+        mpi.send(bytearray(b"user"), 1, TASK_TAG)
+
+    with MPIPoolExecutor(prefetch=3) as executor:
+        if executor is not None:
+            assert executor.submit(square, 7).result() == 49
+            assert executor.submit(add, 2, y=3).result() == 5
+
+            items = list(range(200))
+            assert list(executor.map(square, items)) == [x * x for x in items]
+            assert list(executor.map(add, items, items, chunksize=16)) == [2 * x for x in items]
+
+            results = list(executor.map(sleepy, items, chunksize=4))
+            assert [x for x, _ in results] == items
+            # Every worker got some of the work
+            assert {r for _, r in results} == set(range(1, size))
+
+            # Results larger than the preposted receive buffer
+            sizes = [1, 1000, 10, 2000, 3]
+            assert list(executor.map(big, sizes)) == [big(n) for n in sizes]
+
+            future = executor.submit(fail, 3)
+            try:
+                future.result()
+                assert False, "expected ValueError"
+            except ValueError as e:
+                assert "bad item 3" in str(e)
+
+    if rank == 1:
+        buf = bytearray(4)
+        mpi.recv(buf, 0, TASK_TAG)
+        assert buf == b"user"
+
+    mpi.barrier()
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Test that other threads keep running during a blocking recv."""
+
+import time
+import threading
+
+import yapympi.base as mpi
+
+DELAY = 1.0
+
+
+def main():
+    mpi.init()
+    mpi.barrier()
+
+    rank = mpi.comm_rank()
+    if rank == 0:
+        time.sleep(DELAY)
+        mpi.send(bytearray(b"done"), dest=1, tag=0)
+    else:
+        ticks = []
+        stop = threading.Event()
+
+        def ticker():
+            while not stop.is_set():
+                ticks.append(time.perf_counter())
+                time.sleep(0.01)
+
+        thread = threading.Thread(target=ticker)
+        thread.start()
+
+        start = time.perf_counter()
+        buf = bytearray(4)
+        mpi.recv(buf, source=0, tag=0)
+        end = time.perf_counter()
+
+        stop.set()
+        thread.join()
+
+        during = [t for t in ticks if start < t < end]
+        print("ticks during recv:", len(during), flush=True)
+        assert end - start > DELAY / 2
+        assert len(during) > 10
+
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Test node aware collectives."""
+
+from array import array
+
+import yapympi.base as mpi
+from yapympi.cmpi import lib
+from yapympi import hierarchical
+from yapympi.hierarchical import HierarchicalComm
+
+MSG = b"hello world"
+
+
+def check(hcomm, rank, size):
+    for root in range(size):
+        buf = bytearray(MSG) if rank == root else bytearray(len(MSG))
+        hcomm.bcast(buf, root)
+        assert buf == MSG
+
+    sendbuf = array("d", [rank, 1.0])
+    recvbuf = array("d", [0.0, 0.0])
+    hcomm.allreduce(sendbuf, recvbuf)
+    assert list(recvbuf) == [sum(range(size)), size]
+
+    sendbuf = array("i", [rank, -rank])
+    recvbuf = array("i", [0] * (2 * size))
+    hcomm.allgather(sendbuf, recvbuf)
+    assert list(recvbuf) == [x for r in range(size) for x in (r, -r)]
+
+
+def main():
+    mpi.init()
+
+    rank = mpi.comm_rank()
+    size = mpi.comm_size()
+
+    for ranks_per_node in (None, 1, 2, 3):
+        hcomm = HierarchicalComm(ranks_per_node=ranks_per_node)
+        if ranks_per_node is not None:
+            assert hcomm.node_size == len([r for r in range(size) if r // ranks_per_node == rank // ranks_per_node])
+        check(hcomm, rank, size)
+        hcomm.free()
+
+    for method in ("flat", "hierarchical"):
+        buf = bytearray(MSG) if rank == 0 else bytearray(len(MSG))
+        hierarchical.bcast(buf, 0, method=method)
+        assert buf == MSG
+
+        recvbuf = array("l", [0])
+        hierarchical.allreduce(array("l", [1]), recvbuf, lib.MPI_SUM, method=method)
+        assert recvbuf[0] == size
+
+        recvbuf = array("d", [0.0] * size)
+        hierarchical.allgather(array("d", [rank]), recvbuf, method=method)
+        assert list(recvbuf) == list(range(size))
+
+    hcomm = hierarchical.get_hierarchical_comm()
+    hierarchical.free_hierarchical_comm()
+    hierarchical.free_hierarchical_comm()
+    assert hierarchical.get_hierarchical_comm() is not hcomm
+    assert hcomm.node_comm == lib.MPI_COMM_NULL
+    hierarchical.free_hierarchical_comm()
+
+    # Freeing a communicator frees its cached node and leader communicators
+    comm = mpi.comm_dup()
+    hcomm = hierarchical.get_hierarchical_comm(comm)
+    assert hierarchical.get_hierarchical_comm(comm) is hcomm
+    mpi.comm_free(comm)
+    assert hcomm.node_comm == lib.MPI_COMM_NULL
+    assert hcomm.leader_comm == lib.MPI_COMM_NULL
+
+    # A cached HierarchicalComm of MPI_COMM_WORLD is released at finalize
+    hierarchical.get_hierarchical_comm()
+
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Test file broadcast and scatter through memory maps."""
+
+import os
+import random
+import shutil
+import tempfile
+
+import yapympi.base as mpi
+from yapympi.mmapfile import bcast_file, scatter_file, split_file
+
+CHUNK_SIZE = 4096
+NBYTES = 10 * CHUNK_SIZE + 123
+
+
+def main():
+    mpi.init()
+    rank, size = mpi.comm_rank(), mpi.comm_size()
+
+    assert split_file(10, 3) == [4, 3, 3]
+    assert split_file(10, 3, align=4) == [4, 4, 2]
+    assert split_file(2, 3) == [1, 1, 0]
+
+    # Share a scratch directory created by rank 0
+    name = bytearray(4096)
+    if rank == 0:
+        name[:] = tempfile.mkdtemp().encode().ljust(len(name), b"\0")
+    mpi.bcast(name, 0)
+    tmpdir = name.rstrip(b"\0").decode()
+
+    data = random.Random(0).randbytes(NBYTES)
+    path = os.path.join(tmpdir, "input")
+    empty = os.path.join(tmpdir, "empty")
+    if rank == 0:
+        with open(path, "wb") as f:
+            f.write(data)
+        open(empty, "wb").close()
+    mpi.barrier()
+
+    out_path = os.path.join(tmpdir, "bcast-%d" % rank)
+    assert bcast_file(path, out_path, 0, chunk_size=CHUNK_SIZE) == NBYTES
+    if rank != 0:
+        with open(out_path, "rb") as f:
+            assert f.read() == data
+    assert bcast_file(empty, out_path, 0) == 0
+
+    out_path = os.path.join(tmpdir, "scatter-%d" % rank)
+    offset, count = scatter_file(path, out_path, 0, align=100, chunk_size=CHUNK_SIZE)
+    assert count == split_file(NBYTES, size, 100)[rank]
+    with open(out_path, "rb") as f:
+        assert f.read() == data[offset : offset + count]
+
+    # Explicit counts, root not at rank 0
+    counts = [0] * size
+    counts[-1] = NBYTES
+    offset, count = scatter_file(path, out_path, size - 1, counts=counts, chunk_size=CHUNK_SIZE)
+    assert (offset, count) == (0, counts[rank])
+    with open(out_path, "rb") as f:
+        assert f.read() == data[:count]
+
+    try:
+        scatter_file(path, out_path, 0, counts=[1] * size)
+    except ValueError:
+        pass
+    else:
+        assert False, "ValueError not raised"
+
+    mpi.barrier()
+    if rank == 0:
+        shutil.rmtree(tmpdir)
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Test the native request and status helpers."""
+
+import yapympi.base as mpi
+from yapympi.cmpi import ffi, lib
+from yapympi.request_array import RequestArray
+from yapympi.status import get_counts, status_table
+
+NMSGS = 20
+
+
+def drain(reqs, expected):
+    """Remove completed requests until the expected handles are gone."""
+    removed = []
+    while len(removed) < expected:
+        retcode, handles = reqs.testsome_remove()
+        assert retcode == lib.MPI_SUCCESS
+        table = status_table(reqs.statuses, len(handles))
+        for handle, (source, tag, error, count) in zip(handles, table):
+            assert tag == handle
+            assert error == lib.MPI_SUCCESS
+            assert count == handle + 1
+            assert source in (0, 1)
+        removed.extend(handles)
+
+        # The handle and buffer slots must have moved with their requests
+        assert len(reqs.handles) == len(reqs.buffers) == len(reqs)
+        for handle, buf in zip(reqs.handles, reqs.buffers):
+            assert len(buf) == handle + 1
+        for i in range(len(reqs), reqs.capacity):
+            assert reqs.requests[i] == lib.MPI_REQUEST_NULL
+    return removed
+
+
+def main():
+    mpi.init()
+    mpi.barrier()
+
+    rank = mpi.comm_rank()
+    peer = 1 - rank
+
+    # Receives from self with holes: only the even tags complete first
+    bufs = [bytearray(i + 1) for i in range(NMSGS)]
+    reqs = mpi.irecv_batch(bufs, sources=rank, tags=list(range(NMSGS)), handles=list(range(NMSGS)))
+    evens = mpi.isend_batch([bytearray(i + 1) for i in range(0, NMSGS, 2)], rank, list(range(0, NMSGS, 2)))
+    removed = drain(reqs, NMSGS // 2)
+    mpi.waitall(evens)
+    assert sorted(removed) == list(range(0, NMSGS, 2))
+    assert sorted(reqs.handles) == list(range(1, NMSGS, 2))
+
+    odds = mpi.isend_batch([bytearray(i + 1) for i in range(1, NMSGS, 2)], rank, list(range(1, NMSGS, 2)))
+    removed = drain(reqs, NMSGS // 2)
+    mpi.waitall(odds)
+    assert sorted(removed) == list(range(1, NMSGS, 2))
+    assert len(reqs) == 0
+    assert reqs.testsome_remove() == (lib.MPI_SUCCESS, [])
+
+    # Between processes, sent in reverse order
+    reqs = RequestArray(4)
+    mpi.irecv_batch(bufs, sources=peer, tags=list(range(NMSGS)), requests=reqs, handles=list(range(NMSGS)))
+    assert reqs.capacity >= NMSGS
+    sends = mpi.isend_batch(
+        [bytearray(range(i + 1)) for i in reversed(range(NMSGS))],
+        peer,
+        list(reversed(range(NMSGS))),
+    )
+    removed = drain(reqs, NMSGS)
+    mpi.waitall(sends)
+    assert sorted(removed) == list(range(NMSGS))
+    for i, buf in enumerate(bufs):
+        assert buf == bytes(range(i + 1))
+
+    # get_counts agrees with the table
+    statuses = ffi.new("MPI_Status[]", NMSGS)
+    reqs = mpi.irecv_batch(bufs, sources=peer, tags=list(range(NMSGS)))
+    sends = mpi.isend_batch(bufs, peer, list(range(NMSGS)))
+    mpi.waitall(reqs, statuses)
+    mpi.waitall(sends)
+    assert get_counts(statuses) == [i + 1 for i in range(NMSGS)]
+    assert [row[3] for row in status_table(statuses)] == get_counts(statuses)
+    assert status_table(statuses, 0) == []
+
+    mpi.barrier()
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Test partitioned send recv."""
+
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import yapympi.base as mpi
+from yapympi.cmpi import lib
+from yapympi.partitioned import PartitionedRequest
+
+PARTITIONS = 4
+PARTSIZE = 1024
+NROUNDS = 3
+
+
+def main():
+    provided = mpi.init_thread(lib.MPI_THREAD_MULTIPLE)
+    mpi.barrier()
+
+    rank = mpi.comm_rank()
+    buf = bytearray(PARTITIONS * PARTSIZE)
+    if rank == 0:
+        req = mpi.psend_init(buf, PARTITIONS, dest=1, tag=0)
+    else:
+        req = mpi.precv_init(buf, PARTITIONS, source=0, tag=0)
+    print("native partitioned:", req.native, flush=True)
+
+    for rnd in range(NROUNDS):
+        req.start()
+        if rank == 0:
+
+            def fill(part):
+                start = part * PARTSIZE
+                buf[start : start + PARTSIZE] = bytes([rnd * PARTITIONS + part]) * PARTSIZE
+                mpi.pready(part, req)
+
+            if provided == lib.MPI_THREAD_MULTIPLE:
+                with ThreadPoolExecutor(PARTITIONS) as executor:
+                    list(executor.map(fill, reversed(range(PARTITIONS))))
+            else:
+                for part in reversed(range(PARTITIONS)):
+                    fill(part)
+            req.wait()
+        else:
+            arrived = set()
+            while len(arrived) < PARTITIONS:
+                for part in range(PARTITIONS):
+                    if part not in arrived and mpi.parrived(req, part):
+                        start = part * PARTSIZE
+                        expected = bytes([rnd * PARTITIONS + part]) * PARTSIZE
+                        assert buf[start : start + PARTSIZE] == expected
+                        arrived.add(part)
+            req.wait()
+        mpi.barrier()
+
+    req.free()
+
+    # Partitions of a typed buffer are counted in elements
+    values = array("d", range(PARTITIONS * 8))
+    if rank == 0:
+        req = mpi.psend_init(values, PARTITIONS, dest=1, tag=100, datatype=lib.MPI_DOUBLE)
+    else:
+        values = array("d", [0.0]) * len(values)
+        req = mpi.precv_init(values, PARTITIONS, source=0, tag=100, datatype=lib.MPI_DOUBLE)
+    req.start()
+    if rank == 0:
+        for part in range(PARTITIONS):
+            mpi.pready(part, req)
+    req.wait()
+    assert list(values) == list(range(PARTITIONS * 8))
+    req.free()
+
+    # A fallback init failing partway (here the last tag overflows an int)
+    # frees the requests it created and raises
+    try:
+        PartitionedRequest(True, buf, PARTITIONS, 1 - rank, 2**31 - 2, lib.MPI_COMM_WORLD, lib.MPI_BYTE, native=False)
+    except OverflowError:
+        pass
+    else:
+        assert False, "OverflowError not raised"
+
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Test the profiling hooks."""
+
+import io
+
+import yapympi.base as mpi
+from yapympi import profiling
+from yapympi.request_manager import RequestManager
+
+MSG = "hello".encode("utf-8")
+NMSGS = 4
+
+
+def main():
+    orig_send = mpi.send
+    output = io.StringIO()
+    profiler = profiling.enable(output)
+    assert mpi.send is not orig_send
+
+    mpi.init()
+    mpi.barrier()
+
+    rank = mpi.comm_rank()
+    rm = RequestManager(NMSGS)
+    if rank == 0:
+        mpi.send(MSG, dest=1, tag=7)
+        for i in range(NMSGS):
+            rm.send(MSG, dest=1, tag=i, handle=i)
+    else:
+        buf = bytearray(10)
+        mpi.recv(buf)
+        for i in range(NMSGS):
+            rm.recv(bytearray(10), source=0, tag=i, handle=i)
+
+    done = []
+    while len(done) < NMSGS:
+        handles, statuses = rm.test()
+        if handles is not None:
+            done.extend(handles)
+    assert sorted(done) == list(range(NMSGS))
+
+    mpi.barrier()
+    mpi.finalize()
+    profiling.disable(profiler)
+    assert mpi.send is orig_send
+
+    stats = profiler.stats
+    assert stats["barrier"].count == 2
+    assert stats["RequestManager.test"].count >= 1
+    if rank == 0:
+        assert stats["send"].count == 1
+        assert stats["send"].nbytes == len(MSG)
+        assert stats["RequestManager.send"].count == NMSGS
+        assert profiler.peers[("send", 1, 7)].count == 1
+    else:
+        assert stats["recv"].count == 1
+        assert profiler.peers[("recv", 0, 7)].count == 1
+        assert stats["RequestManager.recv"].count == NMSGS
+    for s in stats.values():
+        assert 0.0 <= s.mpi_time <= s.total_time
+
+    summary = output.getvalue()
+    assert "rank %d" % rank in summary
+    print(summary, flush=True)
+
+
+if __name__ == "__main__":
+    main()
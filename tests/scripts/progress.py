@@ -0,0 +1,56 @@
+"""Test the background progress engine."""
+
+import threading
+
+import yapympi.base as mpi
+from yapympi.cmpi import lib
+from yapympi.request_manager import RequestManager, ProgressEngine
+
+NBYTES = 1 << 20
+
+
+def main():
+    provided = mpi.init_thread(lib.MPI_THREAD_MULTIPLE)
+    if provided != lib.MPI_THREAD_MULTIPLE:
+        print("MPI_THREAD_MULTIPLE not available; skipping", flush=True)
+        mpi.finalize()
+        return
+
+    rank = mpi.comm_rank()
+    rm = RequestManager(4)
+
+    done = []
+    all_done = threading.Event()
+
+    def callback(handle, status):
+        done.append(handle)
+        if len(done) == 2:
+            all_done.set()
+
+    with ProgressEngine(rm, callback, interval=0.0001):
+        if rank == 0:
+            sbuf = bytearray(b"x" * NBYTES)
+            rm.send(sbuf, dest=1, tag=0, handle="p2p")
+            bbuf = bytearray(b"y" * NBYTES)
+        else:
+            rbuf = bytearray(NBYTES)
+            rm.recv(rbuf, source=0, tag=0, handle="p2p")
+            bbuf = bytearray(NBYTES)
+        rm.bcast(bbuf, root=0, handle="bcast")
+
+        # Compute while the engine completes the requests
+        total = 0
+        while not all_done.wait(0):
+            total += sum(range(1000))
+
+    assert sorted(done) == ["bcast", "p2p"]
+    assert bbuf == b"y" * NBYTES
+    if rank == 1:
+        assert rbuf == b"x" * NBYTES
+
+    mpi.barrier()
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
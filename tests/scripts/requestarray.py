@@ -0,0 +1,47 @@
+"""Test completion handling with a compacting RequestArray."""
+
+import yapympi.base as mpi
+from yapympi.request_array import RequestArray
+from yapympi.status import MPIStatus
+
+NMSGS = 10
+
+
+def main():
+    mpi.init()
+    mpi.barrier()
+
+    rank = mpi.comm_rank()
+    if rank == 0:
+        reqs = RequestArray(2)
+        for i in range(NMSGS):
+            mpi.isend_batch([bytes([i])], dests=1, tags=i, requests=reqs)
+        assert len(reqs) == NMSGS and reqs.capacity >= NMSGS
+        mpi.waitall(reqs)
+        reqs.clear()
+        assert len(reqs) == 0
+    else:
+        reqs = RequestArray(2)
+        for i in range(NMSGS):
+            buf = bytearray(2)
+            mpi.irecv(buf, source=0, tag=i, request=reqs.add(handle=(i, buf), buffer=buf))
+        capacity = reqs.capacity
+
+        done = []
+        while len(reqs):
+            indices, statuses = mpi.waitsome(reqs)
+            for i, (tag, buf) in enumerate(reqs.remove(indices)):
+                status = MPIStatus(statuses[i])
+                assert status.tag == tag
+                assert buf[0] == tag
+                done.append(tag)
+
+        assert sorted(done) == list(range(NMSGS))
+        assert reqs.capacity == capacity
+
+    mpi.barrier()
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
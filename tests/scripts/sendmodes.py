@@ -0,0 +1,153 @@
+"""Test the synchronous, ready and buffered send modes."""
+
+from array import array
+
+import yapympi.base as mpi
+from yapympi.cmpi import lib
+from yapympi.request_manager import RequestManager
+
+MSG = b"hello world"
+
+
+def check_blocking(rank):
+    # Synchronous
+    if rank == 0:
+        mpi.ssend(MSG, 1, 0)
+    else:
+        buf = bytearray(len(MSG))
+        mpi.recv(buf, 0, 0)
+        assert buf == MSG
+
+    # Ready: the receive is posted before the barrier
+    buf = bytearray(len(MSG))
+    if rank == 1:
+        req = mpi.irecv(buf, 0, 1)
+    mpi.barrier()
+    if rank == 0:
+        mpi.rsend(MSG, 1, 1)
+    else:
+        mpi.wait(req)
+        assert buf == MSG
+
+    # Buffered
+    if rank == 0:
+        mpi.buffer_attach(4 * (len(MSG) + lib.MPI_BSEND_OVERHEAD))
+        for i in range(4):
+            mpi.bsend(MSG, 1, 10 + i)
+        assert mpi.buffer_detach() == 4 * (len(MSG) + lib.MPI_BSEND_OVERHEAD)
+    else:
+        for i in range(4):
+            buf = bytearray(len(MSG))
+            mpi.recv(buf, 0, 10 + i)
+            assert buf == MSG
+
+
+def check_nonblocking(rank):
+    bufs = [bytearray(len(MSG)) for _ in range(3)]
+    if rank == 1:
+        reqs = [mpi.irecv(b, 0, 20 + i) for i, b in enumerate(bufs)]
+    mpi.barrier()
+    if rank == 0:
+        mpi.buffer_attach(len(MSG) + lib.MPI_BSEND_OVERHEAD)
+        reqs = [
+            mpi.issend(MSG, 1, 20),
+            mpi.irsend(MSG, 1, 21),
+            mpi.ibsend(MSG, 1, 22),
+        ]
+    for req in reqs:
+        mpi.wait(req)
+    if rank == 0:
+        mpi.buffer_detach()
+    else:
+        assert all(b == MSG for b in bufs)
+
+
+def check_manager(rank):
+    rm = RequestManager(4)
+    modes = ["standard", "synchronous", "ready", "buffered"]
+    bufs = [bytearray(len(MSG)) for _ in modes]
+    if rank == 1:
+        for i, buf in enumerate(bufs):
+            rm.recv(buf, 0, 30 + i, handle=i)
+    mpi.barrier()
+    if rank == 0:
+        mpi.buffer_attach(len(MSG) + lib.MPI_BSEND_OVERHEAD)
+        for i, mode in enumerate(modes):
+            rm.send(bytearray(MSG), 1, 30 + i, handle=i, mode=mode)
+        try:
+            rm.send(bytearray(MSG), 1, 0, mode="bogus")
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+
+    done = set()
+    while len(done) < len(modes):
+        handles, _ = rm.test()
+        if handles is not None:
+            done.update(handles)
+    if rank == 0:
+        mpi.buffer_detach()
+    else:
+        assert all(b == MSG for b in bufs)
+
+
+def check_datatype(rank):
+    # Counts are in elements of the datatype in every mode
+    values = array("i", range(5))
+    sends = [mpi.send, mpi.ssend, lambda *args, **kwargs: mpi.wait(mpi.isend(*args, **kwargs))]
+    for i, send in enumerate(sends):
+        if rank == 0:
+            send(values, 1, 40 + i, datatype=lib.MPI_INT)
+        else:
+            buf = array("i", [0] * 5)
+            status = mpi.recv(buf, 0, 40 + i, datatype=lib.MPI_INT)
+            assert buf == values and mpi.get_count(status, lib.MPI_INT) == 5
+
+    # Bytes payloads are sent without a terminator
+    if rank == 0:
+        mpi.send(values.tobytes(), 1, 45, datatype=lib.MPI_INT)
+    else:
+        buf = array("i", [0] * 5)
+        mpi.recv(buf, 0, 45, datatype=lib.MPI_INT)
+        assert buf == values
+
+    # Buffers that are not a whole number of elements are rejected
+    for send in (mpi.send, mpi.isend):
+        try:
+            send(bytearray(7), 1 - rank, 46, datatype=lib.MPI_INT)
+        except ValueError:
+            pass
+        else:
+            assert False, "ValueError not raised"
+
+    rm = RequestManager(1, datatype=lib.MPI_INT)
+    buf = array("i", [0] * 5)
+    if rank == 0:
+        rm.send(values, 1, 50)
+    else:
+        rm.recv(buf, 0, 50)
+    _, statuses = rm.wait()
+    try:
+        rm.send(bytearray(7), 1 - rank, 51)
+    except ValueError:
+        assert rm.size == 0
+    else:
+        assert False, "ValueError not raised"
+    if rank == 1:
+        assert buf == values and statuses[0].count == 5
+
+
+def main():
+    mpi.init()
+    rank = mpi.comm_rank()
+
+    check_blocking(rank)
+    check_nonblocking(rank)
+    check_manager(rank)
+    check_datatype(rank)
+
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Test combined send and receive in a ring shift."""
+
+from array import array
+
+import yapympi.base as mpi
+from yapympi.cmpi import lib
+
+
+def main():
+    mpi.init()
+
+    rank = mpi.comm_rank()
+    size = mpi.comm_size()
+    right = (rank + 1) % size
+    left = (rank - 1) % size
+
+    # Blocking, every process sends right and receives from left
+    recvbuf = array("i", [0, 0])
+    status = mpi.sendrecv(array("i", [rank, -rank]), right, 1, recvbuf, left, 1, datatype=lib.MPI_INT)
+    assert list(recvbuf) == [left, -left]
+    assert status.MPI_SOURCE == left
+    assert mpi.get_count(status, lib.MPI_INT) == 2
+
+    buf = array("d", [rank] * 3)
+    mpi.sendrecv_replace(buf, right, 2, left, 2, datatype=lib.MPI_DOUBLE)
+    assert list(buf) == [left] * 3
+
+    # Nonblocking, several steps in flight in one request array
+    recvbufs = [bytearray(8) for _ in range(size)]
+    requests = None
+    for step in range(size):
+        msg = ("%d:%d" % (rank, step)).encode().ljust(8)
+        requests = mpi.isendrecv(msg, right, 10 + step, recvbufs[step], left, 10 + step, requests=requests)
+    mpi.waitall(requests)
+    for step in range(size):
+        assert recvbufs[step] == ("%d:%d" % (left, step)).encode().ljust(8)
+
+    buf = bytearray(("%4d" % rank).encode())
+    for _ in range(size):
+        mpi.waitall(mpi.isendrecv_replace(buf, right, 20, left, 20))
+    assert buf == ("%4d" % rank).encode()
+
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
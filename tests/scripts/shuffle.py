@@ -0,0 +1,86 @@
+"""Test distributed sort and shuffle."""
+
+import numpy as np
+
+import yapympi.base as mpi
+from yapympi import shuffle
+
+
+def gather_all(arr):
+    """Return the concatenation of arr over all ranks, in rank order."""
+    size = mpi.comm_size()
+    counts = np.empty(size, dtype=np.intc)
+    mpi.allgather(np.array([len(arr)], dtype=np.intc), counts)
+    out = np.empty(int(counts.sum()), dtype=arr.dtype)
+    itemsize = arr.dtype.itemsize
+    mpi.allgatherv(
+        np.ascontiguousarray(arr).view(np.uint8), out.view(np.uint8), (counts * itemsize).tolist()
+    )
+    return out
+
+
+def main():
+    mpi.init()
+
+    rank = mpi.comm_rank()
+    size = mpi.comm_size()
+    rng = np.random.default_rng(rank)
+
+    # alltoall / alltoallv
+    sendbuf = np.array([rank * 100 + r for r in range(size)], dtype=np.int64)
+    recvbuf = np.empty_like(sendbuf)
+    mpi.alltoall(sendbuf, recvbuf)
+    assert recvbuf.tolist() == [r * 100 + rank for r in range(size)]
+
+    # exchange to explicit destinations
+    data = np.arange(10, dtype=np.int64) + 10 * rank
+    out = shuffle.exchange(data, data % size)
+    assert np.all(out % size == rank)
+    assert sorted(gather_all(out).tolist()) == list(range(10 * size))
+    for dests in (data % size + size, data % size - size, data[:5] % size):
+        try:
+            shuffle.exchange(data, dests)
+        except ValueError:
+            pass
+        else:
+            assert False, "ValueError not raised"
+
+    # Invalid destinations on one process raise on all of them
+    try:
+        shuffle.exchange(data, data % size + (size if rank == 0 else 0))
+    except ValueError as e:
+        assert rank == 0 or "another process" in str(e)
+    else:
+        assert False, "ValueError not raised"
+    assert sorted(gather_all(shuffle.exchange(data, data % size)).tolist()) == list(range(10 * size))
+
+    # sample sort, including a rank with no data
+    n = 0 if rank == 1 else 1000 + 17 * rank
+    keys = rng.integers(0, 500, n)
+    total = gather_all(keys)
+    out = shuffle.sample_sort(keys)
+    assert np.all(np.diff(out) >= 0)
+    assert np.array_equal(gather_all(out), np.sort(total))
+
+    # sample sort of a record array by a field
+    recs = np.empty(n, dtype=[("key", np.float64), ("val", np.int32)])
+    recs["key"] = rng.random(n)
+    recs["val"] = rank
+    out = shuffle.sample_sort(recs, key="key")
+    assert np.all(np.diff(out["key"]) >= 0)
+    everything = gather_all(out)
+    assert np.array_equal(everything["key"], np.sort(gather_all(recs)["key"]))
+
+    # hash shuffle sends equal keys to the same rank
+    keys = rng.integers(0, 50, 300)
+    out = shuffle.hash_shuffle(keys)
+    mine = set(out.tolist())
+    owners = gather_all(np.array(sorted(mine), dtype=np.int64))
+    assert len(owners) == len(set(owners.tolist()))
+    assert len(gather_all(out)) == 300 * size
+
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Test sparse data exchange with NBX."""
+
+import random
+
+import yapympi.base as mpi
+from yapympi.sparse import sparse_exchange, NBX_TAG
+
+
+def dests_of(rank, size, seed):
+    rng = random.Random(seed * 1000 + rank)
+    return sorted(rng.sample(range(size), rng.randrange(0, 3)))
+
+
+def main():
+    mpi.init()
+
+    rank = mpi.comm_rank()
+    size = mpi.comm_size()
+
+    for seed in range(10):
+        sends = {d: ("%d->%d" % (rank, d)).encode() * (seed + 1) for d in dests_of(rank, size, seed)}
+        received = sparse_exchange(sends, tag=NBX_TAG + seed)
+
+        expected = {r for r in range(size) if rank in dests_of(r, size, seed)}
+        assert set(received) == expected
+        for source, msg in received.items():
+            assert msg == ("%d->%d" % (source, rank)).encode() * (seed + 1)
+
+    # Nothing to send anywhere
+    assert sparse_exchange({}) == {}
+
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Test status wrappers and bulk status access."""
+
+import yapympi.base as mpi
+from yapympi.cmpi import ffi
+from yapympi.status import MPIStatus, get_counts, status_array
+
+NMSGS = 5
+
+
+def main():
+    mpi.init()
+    mpi.barrier()
+
+    rank = mpi.comm_rank()
+    if rank == 0:
+        bufs = [bytearray(i + 1) for i in range(NMSGS)]
+        reqs = mpi.isend_batch(bufs, dests=1, tags=list(range(NMSGS)))
+        mpi.waitall(reqs)
+    else:
+        bufs = [bytearray(NMSGS) for _ in range(NMSGS)]
+        reqs = mpi.irecv_batch(bufs, sources=0, tags=list(range(NMSGS)))
+        statuses = ffi.new("MPI_Status[]", NMSGS)
+        mpi.waitall(reqs, statuses)
+
+        assert get_counts(statuses) == [i + 1 for i in range(NMSGS)]
+
+        status = MPIStatus(statuses[2])
+        assert not hasattr(status, "__dict__")
+        assert status._count is None
+        statuses[2].MPI_TAG = -1
+        assert status.tag == 2
+        assert status.count == 3
+
+        try:
+            import numpy as np
+        except ImportError:
+            print("NumPy not available; skipping status_array", flush=True)
+        else:
+            arr = status_array(statuses)
+            assert arr["source"].tolist() == [0] * NMSGS
+            assert arr["tag"].tolist() == [0, 1, -1, 3, 4]
+            assert np.all(arr["error"] == 0)
+
+    mpi.barrier()
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Test thread support and a RequestManager shared between threads."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import yapympi.base as mpi
+from yapympi.cmpi import lib
+from yapympi.request_manager import RequestManager
+
+NTHREADS = 4
+NMSGS = 8
+
+
+def main():
+    assert not mpi.initialized()
+    provided = mpi.init_thread(lib.MPI_THREAD_MULTIPLE)
+    assert mpi.initialized()
+    assert mpi.query_thread() == provided
+    assert mpi.is_thread_main()
+    print("provided thread level", provided, flush=True)
+
+    rank = mpi.comm_rank()
+    rm = RequestManager(NTHREADS * NMSGS)
+
+    def post(thread):
+        for i in range(NMSGS):
+            tag = thread * NMSGS + i
+            if rank == 0:
+                rm.send(bytearray([tag]), dest=1, tag=tag, handle=tag)
+            else:
+                rm.recv(bytearray(1), source=0, tag=tag, handle=tag)
+
+    if provided == lib.MPI_THREAD_MULTIPLE:
+        with ThreadPoolExecutor(NTHREADS) as executor:
+            assert not executor.submit(mpi.is_thread_main).result()
+            futures = [executor.submit(post, t) for t in range(NTHREADS)]
+            done = []
+            while len(done) < NTHREADS * NMSGS:
+                handles, _ = rm.test()
+                if handles is not None:
+                    done.extend(handles)
+            for f in futures:
+                f.result()
+    else:
+        for t in range(NTHREADS):
+            post(t)
+        done = []
+        while len(done) < NTHREADS * NMSGS:
+            handles, _ = rm.test()
+            if handles is not None:
+                done.extend(handles)
+
+    assert sorted(done) == list(range(NTHREADS * NMSGS))
+
+    mpi.barrier()
+    mpi.finalize()
+    assert mpi.finalized()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Test wtime, clock offsets and the Timer."""
+
+import time
+
+import yapympi.base as mpi
+from yapympi import timing
+from yapympi.timing import Timer
+
+
+def main():
+    mpi.init()
+
+    rank = mpi.comm_rank()
+    size = mpi.comm_size()
+
+    t0 = mpi.wtime()
+    assert 0 < mpi.wtick() < 1
+    time.sleep(0.01)
+    assert mpi.wtime() - t0 >= 0.009
+
+    # The ping-pongs run on a private communicator, so a pending
+    # message with their tag is left alone
+    if rank == 0:
+        mpi.send(bytearray(b"user"), size - 1, timing.TIMING_TAG)
+    offsets = timing.clock_offsets()
+    assert len(offsets) == size
+    assert offsets[0] == 0.0
+    if rank == size - 1:
+        buf = bytearray(4)
+        mpi.recv(buf, 0, timing.TIMING_TAG)
+        assert buf == b"user"
+    offset = timing.synchronize(root=size - 1)
+    # All processes share one host clock here
+    assert abs(offset) < 0.01
+
+    mpi.barrier()
+    now = timing.global_wtime()
+    stamps = timing.reduce_times(now)
+    assert stamps[1] - stamps[0] < 0.5
+
+    with Timer(barrier=True) as t:
+        time.sleep(0.01 * (rank + 1))
+    assert t.elapsed >= 0.01 * (rank + 1) * 0.9
+    assert t.min <= t.mean <= t.max
+    assert t.max >= 0.01 * size * 0.9
+    assert t.min < t.max
+
+    with Timer(reduce=False) as t:
+        pass
+    assert t.elapsed >= 0 and t.max is None
+
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
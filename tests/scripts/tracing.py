@@ -0,0 +1,52 @@
+"""Test the timeline tracer."""
+
+import yapympi.base as mpi
+from yapympi import tracing
+
+MSG = "hello".encode("utf-8")
+
+
+def main():
+    tracer = tracing.enable(output=None)
+
+    mpi.init()
+    mpi.barrier()
+
+    rank = mpi.comm_rank()
+    if rank == 0:
+        req = mpi.isend(MSG, dest=1, tag=3)
+        mpi.wait(req)
+    else:
+        buf = bytearray(10)
+        req = mpi.irecv(buf, source=0, tag=3)
+        mpi.wait(req)
+
+    buf = bytearray(MSG) if rank == 0 else bytearray(len(MSG))
+    mpi.bcast(buf, root=0)
+
+    mpi.finalize()
+    tracing.disable(tracer)
+
+    if rank != 0:
+        assert tracer.trace is None
+        return
+
+    events = tracer.trace["traceEvents"]
+    calls = [e for e in events if e["ph"] == "X"]
+    assert {e["pid"] for e in calls} == {0, 1}
+
+    names = {(e["pid"], e["name"]) for e in calls}
+    assert (0, "isend") in names
+    assert (1, "irecv") in names
+    assert (0, "bcast") in names and (1, "bcast") in names
+
+    isend = [e for e in calls if e["name"] == "isend"][0]
+    assert isend["args"]["peer"] == 1
+    assert isend["args"]["tag"] == 3
+    assert isend["args"]["nbytes"] == len(MSG)
+    assert all(e["ts"] >= 0 and e["dur"] >= 0 for e in calls)
+    print(len(calls), "events traced", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Test the work stealing scheduler."""
+
+import time
+from array import array
+
+import yapympi.base as mpi
+from yapympi.cmpi import lib
+from yapympi import workstealing
+from yapympi.workstealing import WorkStealingScheduler
+
+
+def tree(depth):
+    """Spawn a binary tree of tasks; every task returns 1."""
+    time.sleep(0.0002)
+    if depth > 0:
+        workstealing.submit(tree, depth - 1)
+        workstealing.submit(tree, depth - 1)
+    return 1
+
+
+def total(value):
+    result = array("l", [0])
+    mpi.allreduce(array("l", [value]), result, lib.MPI_SUM)
+    return result[0]
+
+
+def main():
+    mpi.init()
+
+    rank = mpi.comm_rank()
+    size = mpi.comm_size()
+
+    sched = WorkStealingScheduler(seed=42)
+
+    # All work starts on rank 0
+    depth = 9
+    if rank == 0:
+        sched.submit(tree, depth)
+    results = sched.run()
+    assert total(sum(results)) == 2 ** (depth + 1) - 1
+    assert total(sched.executed) == 2 ** (depth + 1) - 1
+    # Every rank took part
+    assert total(1 if sched.executed else 0) == size
+
+    # Empty run terminates, and the scheduler can be reused
+    assert sched.run() == []
+    sched.submit(tree, 3)
+    results = sched.run()
+    assert total(len(results)) == size * (2 ** 4 - 1)
+
+    sched.free()
+    mpi.finalize()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Test that importing the package is lazy.
+
+Laziness is checked through sys.modules, which does not depend on the
+machine; import times are only reported (run pytest with -s to see them,
+or benchmarks/import_time.py for details).
+"""
+
+import sys
+from subprocess import run
+
+IMPORTED_MODULES_CODE = """
+import sys
+%s
+print(" ".join(sorted(sys.modules)))
+"""
+
+# Modules only loaded by the submodules that need them
+OPTIONAL_MODULES = ["numpy", "zlib", "lzma", "bz2", "mmap", "concurrent.futures", "yapympi.profiling"]
+
+
+IMPORT_TIME_CODE = """
+import time
+start = time.perf_counter()
+import %s
+print(time.perf_counter() - start)
+"""
+
+
+def imported_modules(code):
+    """Return the names in sys.modules after running code in a fresh interpreter."""
+    cmd = [sys.executable, "-c", IMPORTED_MODULES_CODE % code]
+    cp = run(cmd, check=True, capture_output=True, text=True)
+    return set(cp.stdout.split())
+
+
+def test_package_import_is_lazy():
+    modules = imported_modules("import yapympi")
+    assert "yapympi" in modules
+    assert not {m for m in modules if m.startswith("yapympi.")}
+    assert "cffi" not in modules
+    for name in OPTIONAL_MODULES:
+        assert name not in modules
+
+
+def test_base_import_loads_only_the_core():
+    modules = imported_modules("import yapympi.base")
+    assert "yapympi.cmpi" in modules
+    for name in OPTIONAL_MODULES:
+        assert name not in modules
+
+
+def test_attribute_access_loads_the_submodule():
+    modules = imported_modules("import yapympi; yapympi.timing")
+    assert "yapympi.timing" in modules
+    assert "yapympi.profiling" not in modules
+
+
+def test_import_time_report():
+    for module in ("yapympi", "yapympi.base"):
+        cmd = [sys.executable, "-c", IMPORT_TIME_CODE % module]
+        cp = run(cmd, check=True, capture_output=True, text=True)
+        print("import %s: %.6f s" % (module, float(cp.stdout)))
+
+
+def test_single_exception_hierarchy():
+    import yapympi
+    import yapympi.base
+    import yapympi.error
+
+    assert yapympi.MPIError is yapympi.error.MPIError
+    assert yapympi.base.MPIStatusErrors is yapympi.error.MPIStatusErrors
+    assert yapympi.status.MPIStatus.__module__ == "yapympi.status"
@@ -28,3 +28,75 @@ def test_waitanyall():
 
 def test_waitsomeall():
     mpirun("waitsomeall.py", 2)
+
+def test_profiling():
+    mpirun("profiling.py", 2)
+
+def test_tracing():
+    mpirun("tracing.py", 2)
+
+def test_commmatrix():
+    mpirun("commmatrix.py", 3)
+
+def test_threads():
+    mpirun("threads.py", 2)
+
+def test_progress():
+    mpirun("progress.py", 2)
+
+def test_gil():
+    mpirun("gil.py", 2)
+
+def test_batch():
+    mpirun("batch.py", 2)
+
+def test_requestarray():
+    mpirun("requestarray.py", 2)
+
+def test_statuses():
+    mpirun("statuses.py", 2)
+
+def test_partitioned():
+    mpirun("partitioned.py", 2)
+
+def test_hierarchical():
+    mpirun("hierarchical.py", 4)
+
+def test_distarray():
+    mpirun("distarray.py", 3)
+
+def test_executor():
+    mpirun("executor.py", 4)
+
+def test_shuffle():
+    mpirun("shuffle.py", 3)
+
+def test_workstealing():
+    mpirun("workstealing.py", 4)
+
+def test_sparse():
+    mpirun("sparse.py", 4)
+
+def test_sendmodes():
+    mpirun("sendmodes.py", 2)
+
+def test_shift():
+    mpirun("shift.py", 3)
+
+def test_timing():
+    mpirun("timing.py", 3)
+
+def test_errors():
+    mpirun("errors.py", 2)
+
+def test_native():
+    mpirun("native.py", 2)
+
+def test_activemessage():
+    mpirun("activemessage.py", 3)
+
+def test_compression():
+    mpirun("compression.py", 3)
+
+def test_mmapfile():
+    mpirun("mmapfile.py", 3)